@@ -1,57 +1,91 @@
-from flask import Flask, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context, url_for
 import os
-import re
-from pdf2image import convert_from_path
+import json
+import secrets
+import threading
+from werkzeug.middleware.proxy_fix import ProxyFix
+from chart_cache import build_chart_cache
+from story_store import StoryStore
+from generation_queue import GenerationQueue, QueueFull
+import http_cache
+from search_index import SearchIndex
 
-app = Flask(__name__)
+# static files go through http_cache.send_static (validators + .br/.gz)
+app = Flask(__name__, static_folder=None)
 
-CHART_DIR = os.path.join("static", "charts")
+# Behind a reverse proxy, set STORYLAB_PROXIES to the number of proxies in
+# front of the app so request.remote_addr is the browser's (X-Forwarded-For).
+PROXIES = int(os.environ.get("STORYLAB_PROXIES", 0))
+if PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXIES, x_proto=PROXIES, x_host=PROXIES)
 
+STATIC_DIR = "static"
+CHART_DIR = os.path.join(STATIC_DIR, "charts")
+THUMB_DIR = os.path.join(CHART_DIR, http_cache.THUMB_DIR)
+COMPARE_DIR = os.path.join("data", "compare-20250706T225351Z-1-001", "compare")
 
 
 
-# Load single-category stories from 9 text files
-def load_stories():
-    base_path = "data"
-    story_files = [
-        "story_Construction.txt", "story_Economic Recovery.txt", "story_Energy.txt",
-        "story_Finance.txt", "story_Industry.txt", "story_Labour.txt",
-        "story_Other.txt", "story_Policy.txt", "story_Trade.txt", "story_Climate.txt"
-    ]
-    stories = {}
-    for file in story_files:
-        path = os.path.join(base_path, file)
-        if os.path.exists(path):
-            with open(path, encoding="utf-8") as f:
-                stories[file.replace("story_", "").replace(".txt", "").strip()] = f.read()
-    return stories
-
-# Convert chart PDFs to PNGs for inline display
-def convert_charts():
-    os.makedirs(CHART_DIR, exist_ok=True)
-    for file in os.listdir(CHART_DIR):
-        if file.endswith("_charts.pdf"):
-            pdf_path = os.path.join(CHART_DIR, file)
-            base_name = file.replace(".pdf", "")
-            try:
-                images = convert_from_path(pdf_path, dpi=150)
-                for i, image in enumerate(images):
-                    image_path = os.path.join(CHART_DIR, f"{base_name}_page_{i+1}.png")
-                    if not os.path.exists(image_path):
-                        image.save(image_path, "PNG")
-            except Exception as e:
-                print(f"Error converting {file}: {e}")
-
-# Robust story splitter
-def split_story(story):
-    try:
-        past = re.split(r'(?i)paragraph\s*2', story)[0]
-        middle = re.split(r'(?i)paragraph\s*2', story)[1]
-        present = re.split(r'(?i)paragraph\s*3', middle)[0]
-        future = re.split(r'(?i)paragraph\s*3', story)[1].split("**References")[0]
-        return past.strip(), present.strip(), future.strip()
-    except Exception:
-        return "Could not split story", "Could not split story", "Could not split story"
+
+# Single-category stories (data/story_*.txt) and pairwise comparisons are
+# loaded and split once; the store reloads a file only when its mtime changes.
+STORIES = StoryStore("data", COMPARE_DIR).start()
+
+# Full-text index over the timeline sentences and stories (python story.py index).
+SEARCH = SearchIndex(os.path.join("out", "search.sqlite"))
+
+# Live generation: one model thread behind a bounded FIFO queue.  The
+# one-job-per-client limit is keyed on a browser cookie – behind a proxy
+# every user arrives from the same address – and on the address for clients
+# that send no cookie.
+GENERATOR = GenerationQueue(maxsize=int(os.environ.get("STORYLAB_QUEUE_SIZE", 8)))
+CLIENT_COOKIE = "storylab_client"
+
+CATEGORIES = [
+    "Climate", "Construction", "Economic Recovery", "Energy",
+    "Finance", "Industry", "Labour", "Other", "Policy", "Trade"
+]
+
+# Rendered pages, keyed by their inputs + the data version (see http_cache.py).
+PAGES = http_cache.PageCache()
+
+# Newest mtime of the chart + thumbnail folders (adds/deletes), kept current by
+# a poller and by convert_charts, so page requests never stat the folders.
+CHARTS = http_cache.FolderStamp(CHART_DIR, THUMB_DIR).start()
+
+# Convert chart PDFs to PNGs for inline display, then write the thumbnails and
+# pre-compressed copies of static/.
+# Runs once at startup / deploy time (see chart_cache.py) – never per request.
+def convert_charts(force=False):
+    report = build_chart_cache(CHART_DIR, force=force)
+    print(f"charts: {len(report['rendered'])} rendered, "
+          f"{len(report['skipped'])} up to date, {len(report['failed'])} failed")
+    assets = http_cache.build_assets(STATIC_DIR, CHART_DIR, force=force)
+    print(f"assets: {len(assets['thumbs'])} thumbnails, "
+          f"{len(assets['compressed'])} compressed files written")
+    CHARTS.refresh()
+    return report
+
+@app.cli.command("build-charts")
+def build_charts_command():
+    """Rasterise new or changed chart PDFs in static/charts."""
+    convert_charts()
+
+@app.route("/static/<path:filename>", endpoint="static")
+def static_file(filename):
+    return http_cache.send_static(request, STATIC_DIR, filename)
+
+@app.template_global()
+def chart_src(filename):
+    """URL of a chart page's thumbnail, or of the page itself if there is none."""
+    if os.path.exists(os.path.join(THUMB_DIR, filename)):
+        return url_for("static", filename=f"charts/{http_cache.THUMB_DIR}/{filename}")
+    return url_for("static", filename=f"charts/{filename}")
+
+def chart_stamp():
+    """Changes whenever a chart or thumbnail file is added or removed."""
+    return CHARTS.value
+
 #load graph (visulazation)
 @app.route("/view-chart", methods=["GET", "POST"])
 def view_chart():
@@ -66,59 +100,47 @@ def view_chart():
         "Line Chart": "page_3"
     }
 
-    chart_files = []
-    selected_topic = None
-    selected_chart_type = None
-
-    if request.method == "POST":
-        selected_topic = request.form.get("topic")
-        selected_chart_type = request.form.get("chart")
+    # the form submits with GET so the page can be cached; POST still works
+    selected_topic = request.values.get("topic")
+    selected_chart_type = request.values.get("chart")
 
+    def render():
+        chart_files = []
         if selected_topic:
             if selected_chart_type == "All":
                 for label, page_suffix in chart_type_map.items():
-                    filename = f"story_{selected_topic}_charts_{page_suffix}.png"
+                    filename = f"story_{selected_topic.replace(' ', '_')}_charts_{page_suffix}.png"
                     file_path = os.path.join(CHART_DIR, filename)
                     if os.path.exists(file_path):
                         chart_files.append((label, filename))
             else:
                 page_suffix = chart_type_map.get(selected_chart_type)
                 if page_suffix:
-                    filename = f"story_{selected_topic}_charts_{page_suffix}.png"
+                    filename = f"story_{selected_topic.replace(' ', '_')}_charts_{page_suffix}.png"
                     file_path = os.path.join(CHART_DIR, filename)
                     if os.path.exists(file_path):
                         chart_files.append((selected_chart_type, filename))
 
-    return render_template("visulazation.html",
-                           topics=categories,
-                           chart_types=["Bar Chart", "Pie Chart", "Line Chart", "All"],
-                           selected=selected_topic,
-                           selected_chart_type=selected_chart_type,
-                           chart_files=chart_files)
+        return render_template("visulazation.html",
+                               topics=categories,
+                               chart_types=["Bar Chart", "Pie Chart", "Line Chart", "All"],
+                               selected=selected_topic,
+                               selected_chart_type=selected_chart_type,
+                               chart_files=chart_files)
+
+    stamp = chart_stamp()
+    page = PAGES.get(("view-chart", selected_topic, selected_chart_type, stamp), render)
+    return http_cache.page_response(request, page, stamp)
 
 
-# Load combined story for selected categories (no args, read from request.form)
+# Load combined story for selected categories (no args, read from the query / form)
 def load_combined_story():
-    base_dir = "./data/compare-20250706T225351Z-1-001/compare"
-    cat1 = request.form.get("category1")
-    cat2 = request.form.get("category2")
+    cat1 = request.values.get("category1")
+    cat2 = request.values.get("category2")
 
     if not cat1 or not cat2 or cat1 == cat2:
         return None
-
-    filenames = [
-        f"{cat1}_vs_{cat2}.txt",
-        f"{cat2}_vs_{cat1}.txt"
-    ]
-    for fname in filenames:
-        fpath = os.path.join(base_dir, fname)
-        if os.path.exists(fpath):
-            with open(fpath, encoding="utf-8") as f:
-                content = f.read()
-                # Remove everything after **References**
-                content = re.split(r"\*\*References", content, flags=re.IGNORECASE)[0].strip()
-                return content
-    return None
+    return STORIES.combined(cat1, cat2)
 
 
 @app.route("/")
@@ -131,27 +153,125 @@ def generating_stories():
 
 @app.route("/complete-stories")
 def complete_stories():
-    convert_charts()
-    stories = load_stories()
+    stories = STORIES.stories()
     all_categories = sorted(stories.keys())
 
     selected_categories = request.args.getlist("category") or all_categories
 
-    filtered_stories = {cat: story for cat, story in stories.items() if cat in selected_categories}
+    def render():
+        structured_stories = {cat: sections for cat, sections in stories.items()
+                              if cat in selected_categories}
+        return render_template("complete_stories.html",
+                               categories=all_categories,
+                               selected_categories=selected_categories,
+                               filtered_stories=structured_stories)
+
+    key = ("complete-stories", frozenset(selected_categories), STORIES.version, chart_stamp())
+    return http_cache.page_response(request, PAGES.get(key, render),
+                                    max(STORIES.modified, chart_stamp()))
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def client_id():
+    """
+    (queue key, cookie to set or None).  A request without a client cookie
+    (curl, scripts, a browser's first visit) is keyed on its address, so it
+    can't dodge the per-client limit, and is handed a cookie for next time.
+    """
+    cid = request.cookies.get(CLIENT_COOKIE, "")
+    if len(cid) == 32 and all(c in "0123456789abcdef" for c in cid):
+        return cid, None
+    return request.remote_addr, secrets.token_hex(16)
+
+def with_client(response, cookie):
+    if cookie:
+        response.set_cookie(CLIENT_COOKIE, cookie, httponly=True, samesite="Lax")
+    return response
 
-    structured_stories = {}
-    for cat, story in filtered_stories.items():
-        past, present, future = split_story(story)
-        structured_stories[cat] = {
-            "past": past,
-            "present": present,
-            "future": future
-        }
+@app.route("/live-story")
+def live_story():
+    return with_client(app.make_response(
+        render_template("live_story.html", categories=CATEGORIES)), client_id()[1])
 
-    return render_template("complete_stories.html",
-                           categories=all_categories,
-                           selected_categories=selected_categories,
-                           filtered_stories=structured_stories)
+# Stream a story (?topic=X) or a comparison (?category1=A&category2=B) token by
+# token as server-sent events: queued → token… → done (or failed).
+@app.route("/stream-story")
+def stream_story():
+    topic = request.args.get("topic")
+    cat1, cat2 = request.args.get("category1"), request.args.get("category2")
+    if any(c is not None and c not in CATEGORIES for c in (topic, cat1, cat2)):
+        return sse_response([("failed", "unknown category")], [])
+    if not topic and not (cat1 and cat2 and cat1 != cat2):
+        return sse_response([("failed", "choose a topic or two different categories")], [])
+
+    # story imports numpy/pandas/pyarrow (~0.6 s); only a real request pays for it
+    import story
+    try:
+        if topic:
+            prompt, params, refs = story.story_prompt(topic)
+        else:
+            built = story.compare_prompt(cat1, cat2)
+            if built is None:
+                return sse_response([("token", story.nothing_to_match(cat1, cat2)),
+                                     ("done", None)], [])
+            prompt, params, refs = built
+    except FileNotFoundError:
+        return sse_response([("failed", "no timeline data – run 'python story.py' first")], [])
+
+    # already generated once → no need to wait for the model at all
+    cached = story.cached_generation(prompt, **params)
+    if cached is not None:
+        return sse_response([("token", cached.strip()), ("done", None)], refs)
+
+    cid, cookie = client_id()
+    try:
+        job = GENERATOR.submit(cid, lambda: story.generate_stream(prompt, **params))
+    except QueueFull as e:
+        return Response(sse("failed", {"message": str(e)}), status=503,
+                        mimetype="text/event-stream", headers={"Retry-After": "10"})
+    return with_client(sse_response(job.stream(), refs, position=job.position), cookie)
+
+def references(refs) -> str:
+    if not refs:
+        return ""
+    from story import reference_list   # already loaded: refs come from story
+    return reference_list(refs)
+
+def sse_response(events, refs, position=0):
+    def body():
+        yield sse("queued", {"position": position})
+        for kind, payload in events:
+            if kind == "token":
+                yield sse("token", {"text": payload})
+            elif kind == "done":
+                yield sse("done", {"references": references(refs)})
+            else:
+                yield sse("failed", {"message": payload})
+
+    return Response(stream_with_context(body()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Ranked sentence hits with citations (?q=…&topic=…&time_bin=…&file=…);
+# ?format=json returns the same results as JSON.
+@app.route("/search")
+def search():
+    q = request.args.get("q", "").strip()
+    chosen = {name: request.args.get(name) or None for name in ("topic", "time_bin", "file")}
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))   # LIMIT -1 = all
+    facets, results, error = {}, None, None
+    if not SEARCH.exists():
+        error = "no search index – run 'python story.py index' first"
+    else:
+        facets = SEARCH.facets()
+        if q:
+            results = SEARCH.search(q, limit=limit, **chosen)
+
+    if request.args.get("format") == "json":
+        return jsonify(results or {"error": error, "hits": [], "stories": []}), \
+            503 if error else 200
+    return render_template("search.html", q=q, chosen=chosen, facets=facets,
+                           results=results, error=error)
 
 @app.route("/compare-stories", methods=["GET", "POST"])
 def compare_stories():
@@ -160,15 +280,34 @@ def compare_stories():
         "Finance", "Industry", "Labour", "Other", "Policy", "Trade"
     ]
 
-    selected_1 = request.form.get("category1")
-    selected_2 = request.form.get("category2")
-    story_text = load_combined_story()
+    selected_1 = request.values.get("category1")
+    selected_2 = request.values.get("category2")
+
+    def render():
+        return render_template("combine_stories.html",
+                               categories=categories,
+                               selected_1=selected_1,
+                               selected_2=selected_2,
+                               story=load_combined_story())
 
-    return render_template("combine_stories.html",
-                           categories=categories,
-                           selected_1=selected_1,
-                           selected_2=selected_2,
-                           story=story_text)
+    key = ("compare-stories", selected_1, selected_2, STORIES.version)
+    return http_cache.page_response(request, PAGES.get(key, render),
+                                    STORIES.modified)
+
+# Rank the timeline snippets once at startup (cut the partition tree, or rank
+# in memory) so the first /stream-story doesn't do it in the request thread.
+def warm_story_ranking():
+    def warm():
+        import story
+        try:
+            story.warm_ranking()
+        except OSError as e:
+            print(f"⚠️  story ranking not warmed: {e}")
+    thread = threading.Thread(target=warm, name="warm-ranking", daemon=True)
+    thread.start()
+    return thread
 
 if __name__ == "__main__":
+    convert_charts()
+    warm_story_ranking()
     app.run(debug=True)
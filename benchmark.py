@@ -0,0 +1,790 @@
+#!/usr/bin/env python
+# ---------------------------------------------------------------------------
+#  DIW-StoryLab  –  micro-benchmarks
+# ---------------------------------------------------------------------------
+#  Usage examples
+#  --------------
+#     python benchmark.py classify                # 1M synthetic sentences
+#     python benchmark.py classify --rows 100000
+#     python benchmark.py transforms              # clean + time-bin equivalence
+#     python benchmark.py facts                   # numeric facts → chart data
+#     python benchmark.py layout                  # parquet encoding + partitions
+#     python benchmark.py prompts                 # ranked snippet selection
+#     python benchmark.py export                  # streamed vs in-memory export
+#     python benchmark.py suite --sizes 10k,100k  # end-to-end, see below
+#     python benchmark.py search                  # FTS5 build + query latency
+#     python benchmark.py extract                 # pdfplumber vs fitz + parity
+#     python benchmark.py imports --against HEAD~1   # -X importtime cold start
+#
+#  Every micro-benchmark checks that the fast path returns exactly what the
+#  reference implementation returns before it reports any timing.
+#
+#  The suite generates synthetic PDF corpora (cached in bench/corpus_<n>/),
+#  runs every pipeline stage, the chart build and the Flask routes against
+#  them – each step in a fresh process so its peak RSS is its own – and
+#  writes bench/results.json.  With a saved baseline (--save-baseline) later
+#  runs flag every step that got slower or fatter than --tolerance allows
+#  and exit non-zero.
+# ---------------------------------------------------------------------------
+
+import os, sys, json, time, random, shutil, argparse, platform, tempfile, subprocess
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import story
+
+# vocabulary for synthetic report-like sentences: a mix of topic keywords,
+# numbers/years and filler so that every branch of the classifiers is hit
+FILLER = ("the of and in to a is has will be by for on with that as rose fell "
+          "percent quarter compared previous year Germany economy DIW report "
+          "Ökonomie Exportüberschuss target").split()
+NUMBERS = ["18,3", "1,234", "2.5", "0.4", "12", "2019", "2022", "2023", "2024",
+           "2030", "by 2035", "1,5 GW"]
+KEYWORD_WORDS = ("GW renewable solar wind electricity PV power CO2 emission GHG "
+                 "construction housing dwelling unemployment employment wage export "
+                 "import sanction tariff debt fiscal recovery rebound stimulus policy "
+                 "regulation law strategy industry manufacturing factory plant").split()
+
+
+def synthetic_sentences(n: int, seed: int = 42) -> pd.Series:
+    """n pseudo-random sentences, identical for the same (n, seed)."""
+    rnd   = random.Random(seed)
+    vocab = FILLER * 4 + NUMBERS + KEYWORD_WORDS
+    out   = []
+    for _ in range(n):
+        words = rnd.choices(vocab, k=rnd.randint(6, 24))
+        out.append(" ".join(words).capitalize() + ".")
+    return pd.Series(out, name="text")
+
+
+def timed(fn, *args, **kw):
+    t0 = time.perf_counter()
+    res = fn(*args, **kw)
+    return res, time.perf_counter() - t0
+
+
+def report(name: str, rows: int, seconds: float, baseline: float = None):
+    line = f"  {name:<28} {seconds:8.2f} s   {rows / seconds:>12,.0f} rows/s"
+    if baseline:
+        line += f"   ×{baseline / seconds:.1f}"
+    print(line)
+
+
+# ---------------------------------------------------------------------------
+#  classify : per-row label() loop vs vectorised classify_series()
+# ---------------------------------------------------------------------------
+def bench_classify(rows: int):
+    texts = synthetic_sentences(rows)
+    print(f"classify · {rows:,} sentences")
+    ref, t_loop = timed(texts.map, story.label)
+    vec, t_vec  = timed(story.classify_series, texts)
+    if not ref.equals(vec):
+        bad = (ref != vec).sum()
+        sys.exit(f"❌ vectorised classifier disagrees on {bad:,} rows")
+    _, t_multi = timed(story.classify_series, texts, multi_label=True)
+    report("label() loop", rows, t_loop)
+    report("classify_series()", rows, t_vec, t_loop)
+    report("classify_series(multi)", rows, t_multi, t_loop)
+    return {"loop": t_loop, "vectorised": t_vec, "multi_label": t_multi}
+
+
+# ---------------------------------------------------------------------------
+#  transforms : fix_commas / time_bin loops vs clean_series / time_bins
+# ---------------------------------------------------------------------------
+EDGE_CASES = [
+    "Output rose by 1,234 units and 18,3 percent.", "1,2345 and 12,34,567",
+    "In 2019 and 2031 prices fell.", "By 2030 the target is 80 %.",
+    "It will rise.", "The plan has stalled.", "This is it.", "Nothing here.",
+    "Founded 1899, closed 2101.", "é2021 is not a year here", "Année 2023.",
+    "WILL it?", "This island is big.", "His car.", "", "2022", "2023 and 2025",
+]
+
+def bench_transforms(rows: int, past_until: int, present_until: int):
+    texts = pd.concat([pd.Series(EDGE_CASES, name="text"), synthetic_sentences(rows)],
+                      ignore_index=True)
+    n = len(texts)
+    print(f"transforms · {n:,} sentences  (Past ≤ {past_until} < Present ≤ {present_until})")
+
+    ref_clean, t_loop_c = timed(texts.map, story.fix_commas)
+    vec_clean, t_vec_c  = timed(story.clean_series, texts)
+    ref_time,  t_loop_t = timed(texts.map, lambda s: story.time_bin(s, past_until, present_until))
+    vec_time,  t_vec_t  = timed(story.time_bins, texts, past_until, present_until)
+
+    for name, ref, vec in (("clean", ref_clean, vec_clean), ("time-bin", ref_time, vec_time)):
+        bad = ref.astype(object) != vec.astype(object)
+        if bad.any():
+            i = bad.idxmax()
+            sys.exit(f"❌ vectorised {name} differs on {bad.sum():,} rows, "
+                     f"e.g. {texts[i]!r}: {ref[i]!r} ≠ {vec[i]!r}")
+    print("  ✔ vectorised output identical to the per-row functions")
+    report("fix_commas() loop", n, t_loop_c)
+    report("clean_series()", n, t_vec_c, t_loop_c)
+    report("time_bin() loop", n, t_loop_t)
+    report("time_bins()", n, t_vec_t, t_loop_t)
+    return {"clean_loop": t_loop_c, "clean_vectorised": t_vec_c,
+            "time_loop": t_loop_t, "time_vectorised": t_vec_t}
+
+
+# ---------------------------------------------------------------------------
+#  facts : numeric_facts() loop vs vectorised fact_table() + chart_rows()
+# ---------------------------------------------------------------------------
+FACT_CASES = [
+    "Output fell by 3,5 % in 2019 and 2021.", "Capacity: 1.5 GW, 300 MW by 2030.",
+    "€ 12 bn and 5 billion euros, but 2 million people.", "EUR 3.5 bn (2023)",
+    "Prices rose 4 percent, i.e. 2 percentage points.", "−2 % in 2019", "a-5 % x",
+    "5%,6%", "v2.5 GW", "80 % by 2045", "12 per cent", "3 gwh", "2019 GW",
+]
+
+def bench_facts(rows: int):
+    texts = story.clean_series(pd.concat(
+        [pd.Series(EDGE_CASES + FACT_CASES, name="text"), synthetic_sentences(rows)],
+        ignore_index=True))
+    n = len(texts)
+    print(f"facts · {n:,} sentences")
+    loop = lambda: [(i, *f) for i, s in enumerate(texts) for f in story.numeric_facts(s)]
+    ref, t_loop = timed(loop)
+    vec, t_vec  = timed(story.fact_table, texts)
+    got = [(r.row, r.value, r.unit, None if pd.isna(r.year) else r.year)
+           for r in vec.itertuples(index=False)]
+    if got != ref:
+        i = next(k for k, (a, b) in enumerate(zip(got + [None], ref + [None])) if a != b)
+        bad = (got + [None])[i] or (ref + [None])[i]
+        sys.exit(f"❌ vectorised facts differ, e.g. {texts[bad[0]]!r}: "
+                 f"{(got + [None])[i]} ≠ {(ref + [None])[i]}")
+    print(f"  ✔ {len(ref):,} facts, identical to numeric_facts()")
+    topics = story.classify_series(texts).to_numpy(dtype=object)
+    bins   = story.time_bins(texts).to_numpy(dtype=object)
+    data, t_agg = timed(story.chart_rows, vec, topics, bins)
+    report("numeric_facts() loop", n, t_loop)
+    report("fact_table()", n, t_vec, t_loop)
+    report("chart_rows()", n, t_agg)
+    print(f"  {len(data)} chart rows for {data.topic.nunique()} topics")
+    return {"loop": t_loop, "vectorised": t_vec, "aggregate": t_agg}
+
+
+# ---------------------------------------------------------------------------
+#  layout : plain string/int64 parquet vs dictionary-encoded + topic partitions
+# ---------------------------------------------------------------------------
+PLAIN_SCHEMA = pa.schema([("file", pa.string()), ("page", pa.int64()), ("text", pa.string()),
+                          ("topic", pa.string()), ("time_bin", pa.string())])
+
+def synthetic_timeline(rows: int, files: int = 300, seed: int = 42) -> pd.DataFrame:
+    rnd   = np.random.default_rng(seed)
+    texts = synthetic_sentences(rows, seed)
+    df = pd.DataFrame({"file": [f"report_{i:04d}.pdf" for i in rnd.integers(0, files, rows)],
+                       "page": rnd.integers(1, 400, rows), "text": texts})
+    df["topic"]    = story.classify_series(texts)
+    df["time_bin"] = story.time_bins(texts)
+    return df.sort_values("file", kind="stable").reset_index(drop=True)
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.astype({c: str for c in ("file", "topic", "time_bin")})
+    return df.astype({"page": "int64"})
+
+def best_of(n, fn, *args, **kw):
+    res, best = None, float("inf")
+    for _ in range(n):
+        res, sec = timed(fn, *args, **kw)
+        best = min(best, sec)
+    return res, best
+
+def bench_layout(rows: int):
+    df = synthetic_timeline(rows)
+    print(f"layout · {rows:,} timeline rows, {df.topic.nunique()} topics")
+    with tempfile.TemporaryDirectory() as tmp:
+        story.OUT = Path(tmp)
+        fp_plain  = story.OUT / "plain.parquet"
+        fp_narrow = story.OUT / "sentences_time.parquet"
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False).cast(PLAIN_SCHEMA), fp_plain)
+        story._write_table(story._frame_table(df), fp_narrow)
+        story.write_partitions()
+
+        plain,  t_plain  = best_of(3, pd.read_parquet, fp_plain)
+        narrow, t_narrow = best_of(3, pd.read_parquet, fp_narrow)
+        if not _plain(narrow).equals(plain):
+            sys.exit("❌ dictionary-encoded table differs from the plain one")
+
+        topics = sorted(plain.topic.unique())
+        def by_filter():
+            text = pd.read_parquet(fp_plain)
+            return {t: text[text.topic == t] for t in topics}
+        def by_partition():
+            story.TEXT = None
+            return {t: story.topic_rows(t) for t in topics}
+        ref, t_filter = best_of(3, by_filter)
+        got, t_part   = best_of(3, by_partition)
+        for t in topics:
+            a = ref[t].sort_values(["file", "page", "text"]).reset_index(drop=True)
+            b = _plain(got[t]).sort_values(["file", "page", "text"]).reset_index(drop=True)
+            if not a.equals(b[a.columns]):
+                sys.exit(f"❌ partition of {t!r} differs from the filtered rows")
+        print("  ✔ same rows from every layout")
+
+        mb = lambda n: f"{n / 2**20:8.1f} MB"
+        print(f"  {'file size':<28} plain {mb(fp_plain.stat().st_size)}   "
+              f"dictionary {mb(fp_narrow.stat().st_size)}")
+        print(f"  {'memory (deep)':<28} plain {mb(plain.memory_usage(deep=True).sum())}   "
+              f"dictionary {mb(narrow.memory_usage(deep=True).sum())}")
+        report("load plain", rows, t_plain)
+        report("load dictionary", rows, t_narrow, t_plain)
+        report("all topics: load + filter", rows, t_filter)
+        report("all topics: partitions", rows, t_part, t_filter)
+    return {"load_plain": t_plain, "load_dictionary": t_narrow,
+            "topics_filter": t_filter, "topics_partitions": t_part}
+
+
+# ---------------------------------------------------------------------------
+#  prompts : nlargest(3, "page") over the full table vs the ranked partitions
+# ---------------------------------------------------------------------------
+def _page_prompts(text: pd.DataFrame, topics) -> dict:
+    """The old selection: highest page numbers, walked with iterrows()."""
+    out = {}
+    for topic in topics:
+        sub = text[text.topic == topic]
+        for t in ("Past", "Present", "Future"):
+            out[topic, t] = [f"{r.text} ({r.file} p.{r.page})"
+                             for _, r in sub[sub.time_bin == t].nlargest(3, "page").iterrows()]
+    return out
+
+def bench_prompts(rows: int):
+    df = synthetic_timeline(rows)
+    topics = sorted(df.topic.unique())
+    print(f"prompts · {rows:,} timeline rows, {len(topics)} topics, "
+          f"{story.snippet_budget() or f'{story.SNIPPETS_PER_BUCKET} snippets'} per bucket")
+    with tempfile.TemporaryDirectory() as tmp:
+        story.OUT, story.TEXT = Path(tmp), None
+        story._write_table(story._frame_table(df), story.OUT / "sentences_time.parquet")
+        _, t_build = timed(story.write_partitions)
+
+        def page_based():
+            return _page_prompts(pd.read_parquet(story.OUT / "sentences_time.parquet"), topics)
+        def ranked():
+            story.TEXT = None
+            return {t: story.story_prompt(t) for t in topics}
+        _, t_old = best_of(3, page_based)
+        got, t_new = best_of(3, ranked)
+
+        # same prompts from the in-memory fallback ranking
+        story.TEXT = None
+        story.load_timeline()
+        (story._partition_dir() / "_source.json").unlink()
+        if {t: story.story_prompt(t) for t in topics} != got:
+            sys.exit("❌ partition and in-memory rankings disagree")
+        print("  ✔ partition and in-memory rankings agree")
+        report("build ranked partitions", rows, t_build)
+        print(f"  {'load + nlargest(page)':<28} {t_old * 1000:8.1f} ms")
+        print(f"  {'ranked partitions':<28} {t_new * 1000:8.1f} ms   ×{t_old / t_new:.1f}")
+    return {"build": t_build, "page_based": t_old, "ranked": t_new}
+
+
+# ---------------------------------------------------------------------------
+#  export : pd.read_parquet(...).to_csv() vs file_to_csv's streamed export
+# ---------------------------------------------------------------------------
+def _export_run(how: str, src: str, dest: str, fmt: str = "csv") -> dict:
+    """Runs in a fresh process, so the peak RSS is the export's own."""
+    import file_to_csv
+    t0 = time.perf_counter()
+    if how == "pandas":
+        pd.read_parquet(src).to_csv(Path(dest) / f"{Path(src).stem}.{fmt}", index=False)
+    else:
+        file_to_csv.export_table(src, dest, fmt)
+    return {"seconds": time.perf_counter() - t0, "peak_rss_mb": _peak_rss_mb()}
+
+def _peak_rss_mb() -> float:
+    # VmHWM starts afresh at exec; ru_maxrss keeps the forking parent's peak
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_export(rows: int):
+    df = synthetic_timeline(rows)
+    print(f"export · {rows:,} timeline rows")
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = tmp / "sentences_time.parquet"
+        story._write_table(story._frame_table(df), src)
+        del df
+        runs = {}
+        for how, fmt in (("pandas", "csv"), ("stream", "csv"), ("stream", "csv.gz"),
+                         ("stream", "jsonl")):
+            dest = tmp / f"{how}_{fmt}"
+            dest.mkdir()
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                runs[how, fmt] = r = pool.submit(_export_run, how, str(src), str(dest), fmt).result()
+            size = _size_mb(dest)
+            print(f"  {how + ' ' + fmt:<16} {r['seconds']:8.2f} s  {r['peak_rss_mb']:7.0f} MB peak"
+                  f"  {size:8.1f} MB written")
+        ref = pd.read_csv(tmp / "pandas_csv" / "sentences_time.csv", keep_default_na=False)
+        for fmt in ("csv", "csv.gz"):
+            got = pd.read_csv(tmp / f"stream_{fmt}" / f"sentences_time.{fmt}", keep_default_na=False)
+            if not ref.equals(got):
+                sys.exit(f"❌ streamed {fmt} differs from pandas' to_csv")
+        print("  ✔ streamed CSV reads back identical to pandas' to_csv")
+    return {f"{how} {fmt}": r for (how, fmt), r in runs.items()}
+
+def _size_mb(folder: Path) -> float:
+    return sum(p.stat().st_size for p in folder.iterdir()) / 2**20
+
+
+# ---------------------------------------------------------------------------
+#  suite : end-to-end timings on synthetic corpora + regression check
+# ---------------------------------------------------------------------------
+BENCH_DIR          = story.ROOT / "bench"
+SENTENCES_PER_PAGE = 40
+PAGES_PER_PDF      = 50
+SUITE_STAGES = ("extract", "clean", "classify", "timeline", "facts", "story", "compare-all",
+                "charts-pdf", "charts-png", "routes")
+
+def parse_size(text: str) -> int:
+    """'10k' → 10000, '1M' → 1000000"""
+    mult = {"k": 1_000, "m": 1_000_000}.get(text[-1].lower(), 1)
+    return int(float(text.rstrip("kKmM")) * mult)
+
+def synthetic_corpus(sentences: int, seed: int = 42) -> Path:
+    """bench/corpus_<n>/*.pdf with ≈ *sentences* sentences; built once, then reused."""
+    import pymupdf as fitz
+    corpus = BENCH_DIR / f"corpus_{sentences}"
+    done   = corpus / ".complete"
+    if done.exists():
+        return corpus
+    shutil.rmtree(corpus, ignore_errors=True)
+    corpus.mkdir(parents=True)
+    texts = synthetic_sentences(sentences, seed).tolist()
+    per_pdf = SENTENCES_PER_PAGE * PAGES_PER_PDF
+    for n, start in enumerate(range(0, len(texts), per_pdf)):
+        doc = fitz.open()
+        chunk = texts[start:start + per_pdf]
+        for p in range(0, len(chunk), SENTENCES_PER_PAGE):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36),
+                                " ".join(chunk[p:p + SENTENCES_PER_PAGE]), fontsize=7)
+        doc.save(corpus / f"synthetic_{n:04d}.pdf")
+        doc.close()
+    done.write_text(json.dumps({"sentences": sentences, "seed": seed}), encoding="utf-8")
+    return corpus
+
+def _rows(fp: Path) -> int:
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(fp).metadata.num_rows if fp.exists() else 0
+
+def _route_timings(out: Path, requests: int) -> dict:
+    import app
+    import http_cache
+    from story_store import StoryStore
+    app.STORIES.stop()
+    app.STORIES   = StoryStore(str(out), str(out / "compare")).start(interval=0)
+    app.CHART_DIR = str(out / "charts")
+    app.THUMB_DIR = str(out / "charts" / "thumbs")
+    app.CHARTS.stop()
+    app.CHARTS    = http_cache.FolderStamp(app.CHART_DIR, app.THUMB_DIR).start(interval=0)
+    client = app.app.test_client()
+    topics = list(app.STORIES.stories())
+    pair   = next(iter(app.STORIES._compare), (topics[0], topics[-1]))
+    etag   = client.get("/complete-stories").headers["ETag"]
+    calls = {
+        "GET /complete-stories": lambda: client.get("/complete-stories"),
+        "GET /complete-stories 304": lambda: client.get(
+            "/complete-stories", headers={"If-None-Match": etag}),
+        "GET /compare-stories":  lambda: client.get(
+            "/compare-stories", query_string={"category1": pair[0], "category2": pair[1]}),
+        "GET /view-chart":       lambda: client.get(
+            "/view-chart", query_string={"topic": topics[0], "chart": "All"}),
+    }
+    timings = {}
+    for name, call in calls.items():
+        assert call().status_code in (200, 304), name  # warm-up + sanity check
+        t0 = time.perf_counter()
+        for _ in range(requests):
+            call()
+        sec = time.perf_counter() - t0
+        timings[name] = {"requests": requests, "seconds": sec,
+                         "ms_per_request": 1000 * sec / requests}
+    return timings
+
+def _suite_step(step: str, data: str, out: str, workers: int, requests: int) -> dict:
+    """Runs in a fresh process: one step, its timings and its own peak RSS."""
+    import resource
+    import visulazation
+    data, out = Path(data), Path(out)
+    story.DATA, story.OUT = data, out
+    story.LLM_CONFIG["backend"] = "stub"
+    story.CACHE = None
+    stories = lambda: sorted(str(p) for p in out.glob("story_*.txt"))
+
+    sys.stdout = open(os.devnull, "w")          # keep the stages' progress lines quiet
+    t0, c0 = time.perf_counter(), time.process_time()
+    extra = {}
+    if step == "extract":
+        story.extract_text(workers, full=True)
+        rows = _rows(out / "sentences.parquet")
+    elif step == "clean":
+        story.clean_text(full=True)
+        rows = _rows(out / "sentences_clean.parquet")
+    elif step == "classify":
+        story.classify_text(full=True)
+        rows = _rows(out / "sentences_topic.parquet")
+    elif step == "timeline":
+        story.tag_timeline(full=True)
+        rows = _rows(out / "sentences_time.parquet")
+    elif step == "facts":
+        story.extract_facts(full=True)
+        rows = _rows(out / story.CHART_DATA)
+    elif step == "story":
+        story.write_stories()
+        rows = len(stories())
+    elif step == "compare-all":
+        story.compare_all()
+        rows = len(list((out / "compare").glob("*.txt")))
+    elif step == "charts-pdf":
+        (out / "charts").mkdir(exist_ok=True)
+        visulazation.generate_individual_pdfs(stories(), str(out / "charts"),
+                                              str(out / story.CHART_DATA))
+        rows = len(stories())
+    elif step == "charts-png":
+        rows = len(visulazation.build_charts(stories(), str(out / "charts"), workers,
+                                             force=True,
+                                             chart_data=str(out / story.CHART_DATA))["rendered"])
+    elif step == "routes":
+        extra["routes"] = _route_timings(out, requests)
+        rows = requests * len(extra["routes"])
+    sec, cpu = time.perf_counter() - t0, time.process_time() - c0
+
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {"seconds": sec, "cpu_seconds": cpu, "rows": rows,
+            "rows_per_s": rows / sec if sec else None,
+            "peak_rss_mb": peak_kb / 1024, **extra}
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=story.ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(sizes, workers: int = 1, requests: int = 50, steps=SUITE_STAGES) -> dict:
+    results = {"meta": {"commit": _git_commit(), "python": platform.python_version(),
+                        "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "workers": workers, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+               "sizes": {}}
+    ctx = mp.get_context("spawn")          # nothing inherited → honest peak RSS
+    for size in sizes:
+        corpus = synthetic_corpus(size)
+        out    = BENCH_DIR / f"out_{size}"
+        if "extract" in steps:              # a subset of steps reuses earlier outputs
+            shutil.rmtree(out, ignore_errors=True)
+        out.mkdir(parents=True, exist_ok=True)
+        print(f"suite · {size:,} sentences  ({len(list(corpus.glob('*.pdf')))} PDFs)")
+        results["sizes"][str(size)] = res = {}
+        for step in steps:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                res[step] = r = pool.submit(_suite_step, step, str(corpus), str(out),
+                                            workers, requests).result()
+            rate = f"{r['rows_per_s']:>12,.0f} rows/s" if r["rows_per_s"] else ""
+            print(f"  {step:<14} {r['seconds']:8.2f} s  {r['peak_rss_mb']:7.0f} MB  {rate}")
+            for name, t in r.get("routes", {}).items():
+                print(f"    {name:<24} {t['ms_per_request']:8.2f} ms/request")
+    return results
+
+def _metrics(results: dict) -> dict:
+    """Flatten to {'10000/extract': (seconds, peak MB, noise floor s), …}."""
+    flat = {}
+    for size, steps in results["sizes"].items():
+        for step, r in steps.items():
+            flat[f"{size}/{step}"] = (r["seconds"], r["peak_rss_mb"], 0.05)
+            for name, t in r.get("routes", {}).items():
+                flat[f"{size}/{name}"] = (t["ms_per_request"] / 1000, None, 0.0005)
+    return flat
+
+def regressions(results: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    """Steps that got slower (or used more memory) than baseline × (1 + tolerance)."""
+    new, old = _metrics(results), _metrics(baseline)
+    found = []
+    for key in sorted(set(new) & set(old)):
+        (sec, mb, floor), (sec0, mb0, _) = new[key], old[key]
+        # differences below the noise floor are never flagged
+        if sec > sec0 * (1 + tolerance) and sec - sec0 > floor:
+            found.append(f"{key}: {sec0:.3f} s → {sec:.3f} s  (+{100 * (sec / sec0 - 1):.0f}%)")
+        if mb and mb0 and mb > mb0 * (1 + tolerance):
+            found.append(f"{key}: peak RSS {mb0:.0f} MB → {mb:.0f} MB")
+    return found
+
+def suite(args) -> int:
+    sizes   = [parse_size(s) for s in args.sizes.split(",")]
+    steps   = args.steps.split(",") if args.steps else SUITE_STAGES
+    results = run_suite(sizes, args.workers, args.requests, steps)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=1), encoding="utf-8")
+    print(f"✅ results → {out}")
+
+    baseline = Path(args.baseline)
+    if args.save_baseline:
+        shutil.copy(out, baseline)
+        print(f"✅ saved as baseline → {baseline}")
+        return 0
+    if not baseline.exists():
+        print(f"   (no baseline at {baseline} – run with --save-baseline to create one)")
+        return 0
+    found = regressions(results, json.loads(baseline.read_text(encoding="utf-8")),
+                        args.tolerance)
+    for line in found:
+        print(f"⚠️  regression  {line}")
+    if not found:
+        print(f"✅ no regressions against {baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if found else 0
+
+# ---------------------------------------------------------------------------
+#  search : FTS5 index build + /search query latency on a synthetic timeline
+# ---------------------------------------------------------------------------
+SEARCH_QUERIES = [
+    ('"power plant"', {}), ("sanction tariff", {}), ("solar wind", {}),
+    ("solar wind", {"topic": "Energy", "time_bin": "Future"}),
+    ("debt fiscal", {"topic": "Finance"}), ("housing*", {"time_bin": "Past"}),
+    ("renewable", {}), ("gw", {}), ("gw", {"topic": "Climate"}),
+]
+
+def _exact_top(ix, q, facets, limit):
+    """Reference: bm25 over *every* match (what the candidate cut approximates)."""
+    import search_index
+    where = [f"text : ({search_index.fts_query(q)})"] + \
+            [f"{k} : {search_index._phrase(v)}" for k, v in facets.items()]
+    exact = " ".join(f"AND {k} = ?" for k in facets)
+    return [r[0] for r in ix.db.execute(
+        f"SELECT file || ' p.' || page FROM sentences WHERE sentences MATCH ? {exact} "
+        "ORDER BY bm25(sentences, 1, 0, 0, 0, 0), rowid LIMIT ?",
+        [" AND ".join(where), *facets.values(), limit])]
+
+def bench_search(rows: int, runs: int = 20):
+    import search_index
+    df = synthetic_timeline(rows)
+    print(f"search · {rows:,} timeline rows")
+    with tempfile.TemporaryDirectory() as tmp:
+        story.OUT = Path(tmp)
+        story._write_table(story._frame_table(df), story.OUT / "sentences_time.parquet")
+        del df
+        _, sec = timed(story.build_search_index)
+        size = story.search_db_path().stat().st_size / 2**20
+        print(f"  build {sec:8.2f} s   {rows / sec:>10,.0f} rows/s   {size:,.0f} MB")
+        ix = search_index.SearchIndex(story.search_db_path())
+        for q, facets in SEARCH_QUERIES:
+            res = ix.search(q, **facets)
+            times = sorted(ix.search(q, **facets)["ms"] for _ in range(runs))
+            ref = _exact_top(ix, q, facets, len(res["hits"]))
+            got = [h["cite"] for h in res["hits"]]
+            if not res["more"] and got != ref:
+                sys.exit(f"❌ {q!r} {facets}: ranking differs from a full bm25 sort")
+            agree = "exact" if got == ref else \
+                f"{len(set(got) & set(ref))}/{len(ref)} of full-sort top"
+            label = q + "".join(f" {k}={v}" for k, v in facets.items())
+            print(f"  {label:<40} p50 {times[len(times) // 2]:6.2f} ms   "
+                  f"p95 {times[int(len(times) * 0.95) - 1]:6.2f} ms   "
+                  f"{len(got):>2} hits{'+' if res['more'] else ' '}  {agree}")
+
+# ---------------------------------------------------------------------------
+#  extract : pdfplumber vs fitz backends on the same PDFs + text parity
+# ---------------------------------------------------------------------------
+def extract_pages(pdfs, backend: str) -> dict:
+    """{(file, page): [sentences]} exactly as the extract stage would split them."""
+    pages = {}
+    for shard in story._shards(pdfs, backend=backend):
+        cols = story._extract_shard(shard, backend=backend)
+        for file, page, text in zip(cols["file"], cols["page"], cols["text"]):
+            pages.setdefault((file, page), []).append(text)
+    return pages
+
+def text_parity(ref: dict, new: dict) -> dict:
+    """Page- and sentence-level agreement of two extract_pages() results."""
+    from collections import Counter
+    from difflib import SequenceMatcher
+    keys = sorted(set(ref) | set(new))
+    sims, worst = [], []
+    for key in keys:
+        a, b = ref.get(key, []), new.get(key, [])
+        sim = 1.0 if a == b else SequenceMatcher(None, " ".join(a).split(),
+                                                 " ".join(b).split(), autojunk=False).ratio()
+        sims.append(sim)
+        if sim < 1.0:
+            first = next((x, y) for x, y in zip(a + [""] * len(b), b + [""] * len(a)) if x != y)
+            worst.append({"file": key[0], "page": key[1], "similarity": round(sim, 4),
+                          "sentences": [len(a), len(b)], "first_difference": list(first)})
+    ref_s = Counter(s for v in ref.values() for s in v)
+    new_s = Counter(s for v in new.values() for s in v)
+    return {"pages": len(keys), "identical_pages": sims.count(1.0),
+            "mean_word_similarity": float(np.mean(sims)) if sims else 1.0,
+            "sentences": [sum(ref_s.values()), sum(new_s.values())],
+            "shared_sentences": sum((ref_s & new_s).values()),
+            "worst_pages": sorted(worst, key=lambda w: w["similarity"])[:10]}
+
+def bench_extract(pdf_dir: str = None, size: int = 10_000, out: str = None):
+    pdfs = sorted(Path(pdf_dir or story.DATA).glob("*.pdf"))
+    if not pdfs:
+        pdfs = sorted(synthetic_corpus(size).glob("*.pdf"))
+    print(f"extract · {len(pdfs)} PDFs from {pdfs[0].parent}")
+    results = {}
+    for backend in story.EXTRACT_BACKENDS:
+        pages, sec = timed(extract_pages, pdfs, backend)
+        n = sum(len(v) for v in pages.values())
+        results[backend] = pages
+        print(f"  {backend:<12} {sec:8.2f} s   {len(pages) / sec:>8,.0f} pages/s   {n:,} sentences")
+        results[f"{backend}_seconds"] = sec
+
+    par = text_parity(results["pdfplumber"], results["fitz"])
+    t0, t1 = results["pdfplumber_seconds"], results["fitz_seconds"]
+    print(f"  ⏱  fitz ×{t0 / t1:.1f} faster")
+    print(f"  parity: {par['identical_pages']}/{par['pages']} pages identical, "
+          f"mean word similarity {par['mean_word_similarity']:.3f}, "
+          f"{par['shared_sentences']:,} of {par['sentences'][0]:,} sentences shared")
+    for w in par["worst_pages"][:3]:
+        print(f"    {w['file']} p.{w['page']}  {w['similarity']:.3f}  "
+              f"{w['first_difference'][0][:60]!r} ≠ {w['first_difference'][1][:60]!r}")
+    out = Path(out or BENCH_DIR / "extract_parity.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"pdfs": [p.name for p in pdfs],
+                               "seconds": {"pdfplumber": t0, "fitz": t1}, **par},
+                              indent=1, ensure_ascii=False), encoding="utf-8")
+    print(f"✅ parity report → {out}")
+    return par
+
+# ---------------------------------------------------------------------------
+#  imports : cold-start import cost (python -X importtime) vs an older commit
+# ---------------------------------------------------------------------------
+IMPORT_TARGETS = {
+    "story.py timeline": "import story",     # every CLI step starts with this
+    "flask worker boot": "import app",       # what `flask run` / gunicorn load
+}
+
+def import_profile(code: str, cwd: Path) -> dict:
+    """One fresh interpreter: total import µs and the cost of each direct import."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    total, top = 0, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        total += int(self_us)
+        if name.startswith("   ") and not name.startswith("    "):
+            top[name.strip()] = int(cumulative)    # imported by the target itself
+    return {"us": total, "top": top}
+
+def median_profile(code: str, cwd: Path, runs: int) -> dict:
+    profiles = sorted((import_profile(code, cwd) for _ in range(runs)), key=lambda p: p["us"])
+    return profiles[len(profiles) // 2]
+
+def checkout(ref: str, dest: Path) -> Path:
+    """The *.py files of `ref` in dest/, sharing data/, static/ and templates/."""
+    names = subprocess.run(["git", "ls-tree", "--name-only", ref], cwd=story.ROOT,
+                           capture_output=True, text=True, check=True).stdout.split()
+    for name in names:
+        if name.endswith(".py"):
+            src = subprocess.run(["git", "show", f"{ref}:{name}"], cwd=story.ROOT,
+                                 capture_output=True, check=True).stdout
+            (dest / name).write_bytes(src)
+    for shared in ("data", "static", "templates"):
+        (dest / shared).symlink_to(story.ROOT / shared)
+    return dest
+
+def bench_imports(against: str = None, runs: int = 5, top: int = 6):
+    with tempfile.TemporaryDirectory() as tmp:
+        trees = {"current": story.ROOT}
+        if against:
+            trees = {against: checkout(against, Path(tmp)), **trees}
+        for label, code in IMPORT_TARGETS.items():
+            print(f"{label}  ({code})")
+            results = {}
+            for tree, cwd in trees.items():
+                try:
+                    results[tree] = r = median_profile(code, cwd, runs)
+                except RuntimeError as e:
+                    print(f"  {tree:<10} ⚠️  {e}")
+                    continue
+                heavy = sorted(r["top"].items(), key=lambda kv: -kv[1])[:top]
+                print(f"  {tree:<10} {r['us'] / 1000:8.1f} ms   "
+                      + "  ".join(f"{name} {us / 1000:.0f}" for name, us in heavy))
+            if against in results and "current" in results:
+                old, new = results[against]["us"], results["current"]["us"]
+                gone = sorted(set(results[against]["top"]) - set(results["current"]["top"]))
+                print(f"  ⏱  {old / 1000:.0f} ms → {new / 1000:.0f} ms "
+                      f"({100 * (new / old - 1):+.0f}%)"
+                      + (f"   no longer imported: {', '.join(gone)}" if gone else ""))
+
+
+def main():
+    ap  = argparse.ArgumentParser(prog="benchmark.py")
+    sub = ap.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("classify", help="keyword classifier throughput")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p = sub.add_parser("transforms", help="clean + time-bin equivalence and throughput")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--past-until", type=int, default=story.PAST_UNTIL)
+    p.add_argument("--present-until", type=int, default=story.PRESENT_UNTIL)
+    p = sub.add_parser("facts", help="numeric fact extraction equivalence and throughput")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p = sub.add_parser("layout", help="parquet encoding: memory, load time, partitions")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p = sub.add_parser("export", help="streamed export vs read_parquet + to_csv: time, peak RSS")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p = sub.add_parser("prompts", help="story prompt assembly from the ranked partitions")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p = sub.add_parser("suite", help="all stages, charts and routes on synthetic corpora")
+    p.add_argument("--sizes", default="10k,100k,1M",
+                   help="comma-separated corpus sizes in sentences")
+    p.add_argument("--steps", default=None,
+                   help=f"comma-separated subset of {','.join(SUITE_STAGES)}")
+    p.add_argument("--workers", type=int, default=1, help="extract / chart workers")
+    p.add_argument("--requests", type=int, default=50, help="requests per route")
+    p.add_argument("--out", default=str(BENCH_DIR / "results.json"))
+    p.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    p.add_argument("--save-baseline", action="store_true",
+                   help="store this run as the baseline instead of comparing")
+    p.add_argument("--tolerance", type=float, default=0.25,
+                   help="allowed slowdown / memory growth before flagging (0.25 = 25%%)")
+    p = sub.add_parser("search", help="full-text index build time and query latency")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p = sub.add_parser("extract", help="pdfplumber vs fitz: speed and text parity")
+    p.add_argument("--pdfs", default=None, help="folder of PDFs (default data/, "
+                                                "else a synthetic corpus)")
+    p.add_argument("--size", default="10k", help="synthetic corpus size in sentences")
+    p.add_argument("--out", default=None, help="parity report (bench/extract_parity.json)")
+    p = sub.add_parser("imports", help="cold-start import time of the CLI and the web app")
+    p.add_argument("--against", default=None,
+                   help="git ref to compare with, e.g. HEAD~1 or the baseline commit")
+    p.add_argument("--runs", type=int, default=5, help="interpreters per target (median)")
+    args = ap.parse_args()
+
+    if args.bench == "classify":
+        bench_classify(args.rows)
+    elif args.bench == "transforms":
+        bench_transforms(args.rows, args.past_until, args.present_until)
+    elif args.bench == "facts":
+        bench_facts(args.rows)
+    elif args.bench == "layout":
+        bench_layout(args.rows)
+    elif args.bench == "export":
+        bench_export(args.rows)
+    elif args.bench == "prompts":
+        bench_prompts(args.rows)
+    elif args.bench == "suite":
+        sys.exit(suite(args))
+    elif args.bench == "search":
+        bench_search(args.rows)
+    elif args.bench == "extract":
+        bench_extract(args.pdfs, parse_size(args.size), args.out)
+    elif args.bench == "imports":
+        bench_imports(args.against, args.runs)
+
+
+if __name__ == "__main__":
+    main()
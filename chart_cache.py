@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# ---------------------------------------------------------------------------
+#  Chart-asset cache  –  rasterise static/charts/*_charts.pdf → *_page_N.png
+# ---------------------------------------------------------------------------
+#  The web app serves the PNG pages; this module keeps them in sync with the
+#  PDFs.  A small manifest (static/charts/.manifest.json) remembers each PDF's
+#  mtime, size and sha256 so only new or changed PDFs – or pages whose PNG has
+#  gone missing – are handed to poppler.
+#
+#  Usage
+#  -----
+#     python chart_cache.py                 # build once (deploy / cron job)
+#     python chart_cache.py --force         # ignore the manifest
+#     flask --app app build-charts          # same thing through Flask's CLI
+# ---------------------------------------------------------------------------
+
+import os, sys, json, hashlib
+
+CHART_DIR = os.path.join("static", "charts")
+MANIFEST  = ".manifest.json"
+DPI       = 150
+
+
+def page_png(chart_dir, pdf_name, page):
+    """static/charts/story_X_charts.pdf, 2 → static/charts/story_X_charts_page_2.png"""
+    base_name = pdf_name.replace(".pdf", "")
+    return os.path.join(chart_dir, f"{base_name}_page_{page}.png")
+
+
+def file_sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(chart_dir=CHART_DIR):
+    path = os.path.join(chart_dir, MANIFEST)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, chart_dir=CHART_DIR):
+    path = os.path.join(chart_dir, MANIFEST)
+    tmp  = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)                     # never leave a half-written file
+
+
+def record(manifest, chart_dir, pdf_name, pages, sha=None):
+    """Store the current fingerprint of *pdf_name* (rendered to *pages* PNGs)."""
+    pdf_path = os.path.join(chart_dir, pdf_name)
+    st = os.stat(pdf_path)
+    manifest[pdf_name] = {
+        "mtime":  st.st_mtime,
+        "size":   st.st_size,
+        "sha256": sha or file_sha256(pdf_path),
+        "pages":  pages,
+    }
+
+
+def _pdf_changed(entry, pdf_path):
+    """
+    Cheap check first (mtime + size); only hash when those moved, so a
+    `touch` or a fresh checkout doesn't force a re-render.
+    Returns (changed, sha256-or-None).
+    """
+    if not entry:
+        return True, None
+    st = os.stat(pdf_path)
+    if st.st_mtime == entry.get("mtime") and st.st_size == entry.get("size"):
+        return False, entry.get("sha256")
+    sha = file_sha256(pdf_path)
+    return sha != entry.get("sha256"), sha
+
+
+def _adopt_existing(chart_dir, pdf_name, pdfinfo):
+    """
+    First run without a manifest: PNG pages that are already newer than their
+    PDF are trusted (that's what the old per-request converter did), so we
+    just fingerprint the PDF instead of re-rendering it.
+    """
+    pdf_path = os.path.join(chart_dir, pdf_name)
+    pages    = pdfinfo(pdf_path)["Pages"]
+    pngs     = [page_png(chart_dir, pdf_name, n) for n in range(1, pages + 1)]
+    pdf_mtime = os.path.getmtime(pdf_path)
+    if all(os.path.exists(p) and os.path.getmtime(p) >= pdf_mtime for p in pngs):
+        manifest = {}
+        record(manifest, chart_dir, pdf_name, pages)
+        return manifest[pdf_name]
+    return None
+
+
+def build_chart_cache(chart_dir=CHART_DIR, force=False, dpi=DPI):
+    """
+    Render every new/changed *_charts.pdf in *chart_dir* to PNG pages.
+    Returns a dict {'rendered': [...], 'skipped': [...], 'failed': [...]}.
+    """
+    # poppler bindings are only needed when something actually has to render
+    from pdf2image import convert_from_path, pdfinfo_from_path
+
+    os.makedirs(chart_dir, exist_ok=True)
+    manifest = {} if force else load_manifest(chart_dir)
+    report   = {"rendered": [], "skipped": [], "failed": []}
+
+    for file in sorted(os.listdir(chart_dir)):
+        if not file.endswith("_charts.pdf"):
+            continue
+        pdf_path = os.path.join(chart_dir, file)
+        entry    = manifest.get(file)
+        try:
+            if entry is None and not force:
+                entry = _adopt_existing(chart_dir, file, pdfinfo_from_path)
+            changed, sha = _pdf_changed(entry, pdf_path)
+            if changed:
+                images = convert_from_path(pdf_path, dpi=dpi)
+                for i, image in enumerate(images):
+                    image.save(page_png(chart_dir, file, i + 1), "PNG")
+                record(manifest, chart_dir, file, len(images), sha)
+                report["rendered"].append(file)
+                continue
+
+            # PDF unchanged → only fill in pages whose PNG went missing
+            pages = entry.get("pages") or pdfinfo_from_path(pdf_path)["Pages"]
+            missing = [n for n in range(1, pages + 1)
+                       if not os.path.exists(page_png(chart_dir, file, n))]
+            for n in missing:
+                image = convert_from_path(pdf_path, dpi=dpi, first_page=n, last_page=n)[0]
+                image.save(page_png(chart_dir, file, n), "PNG")
+            record(manifest, chart_dir, file, pages, sha)
+            report["rendered" if missing else "skipped"].append(file)
+        except Exception as e:
+            print(f"Error converting {file}: {e}")
+            report["failed"].append(file)
+
+    # forget PDFs that were deleted
+    for gone in set(manifest) - set(os.listdir(chart_dir)):
+        manifest.pop(gone)
+    save_manifest(manifest, chart_dir)
+    return report
+
+
+if __name__ == "__main__":
+    rep = build_chart_cache(force="--force" in sys.argv[1:])
+    print(f"✅ charts: {len(rep['rendered'])} rendered, "
+          f"{len(rep['skipped'])} up to date, {len(rep['failed'])} failed")
@@ -1,17 +1,223 @@
-import pandas as pd
-import os
-
-# Input parquet files
-parquet_files = ["sentences_clean.parquet", "sentences_topic.parquet" , "sentences.parquet" , "sentences_time.parquet"]
-
-# Output folder
-output_dir = "outfolder_csv"
-os.makedirs(output_dir, exist_ok=True)  # Create it if it doesn't exist
-
-# Loop through and convert
-for parquet_file in parquet_files:
-    df = pd.read_parquet(parquet_file)
-    csv_file_name = os.path.splitext(os.path.basename(parquet_file))[0] + ".csv"
-    output_path = os.path.join(output_dir, csv_file_name)
-    df.to_csv(output_path, index=False)
-    print(f"Saved: {output_path}")
+#!/usr/bin/env python
+# ---------------------------------------------------------------------------
+#  Export the pipeline's parquet tables for analysts
+# ---------------------------------------------------------------------------
+#  Each table is streamed in batches of --batch-rows rows through a small read
+#  buffer (no pre-buffering of whole row groups – the staged tables are one
+#  big row group), filtered by topic / time bin, projected to --columns and
+#  written straight to the output file, so memory stays at about a batch per
+#  table whatever the corpus size.  Several tables are converted side by side
+#  in worker processes.  Files are written as <name>.tmp and renamed when
+#  complete.  List columns (the --multi-label topics) become "a;b" strings
+#  in csv / xlsx and stay arrays in jsonl.  A table that fails is reported
+#  and the others are still exported.
+#
+#  Usage
+#  -----
+#     python file_to_csv.py                         # out/*.parquet → outfolder_csv/*.csv
+#     python file_to_csv.py --format csv.gz --workers 4
+#     python file_to_csv.py sentences_time --topic Energy,Climate --columns file,page,text
+#     python file_to_csv.py sentences_time --time-bin Future --format xlsx   # needs openpyxl
+# ---------------------------------------------------------------------------
+
+import os, sys, gzip, argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from importlib.util import find_spec
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+SRC_DIR    = Path(__file__).resolve().parent / "out"
+OUTPUT_DIR = "outfolder_csv"
+TABLES     = ["sentences", "sentences_clean", "sentences_topic", "sentences_time"]
+FORMATS    = ("csv", "csv.gz", "jsonl", "jsonl.gz", "xlsx")
+BATCH_ROWS = 65_536
+READ_BUFFER = 1 << 20                   # bytes read from a column chunk at a time
+XLSX_ROWS  = 1_048_576                  # Excel's row limit per sheet (header included)
+XLSX_ILLEGAL = r"[\x00-\x08\x0b\x0c\x0e-\x1f]"   # control characters openpyxl refuses
+LIST_SEP   = ";"                        # list cells (e.g. --multi-label topics) in csv / xlsx
+FLAT_FORMATS = ("csv", "csv.gz", "xlsx")  # formats without a list type
+
+
+def _is_list(typ) -> bool:
+    return pa.types.is_list(typ) or pa.types.is_large_list(typ)
+
+
+def _plain(batch: pa.RecordBatch, flat: bool = False) -> pa.RecordBatch:
+    """
+    Dictionary columns → their values (CSV / JSON writers want plain types);
+    with *flat*, list columns → "Energy;Climate" strings.
+    """
+    cols = []
+    for c in batch.columns:
+        if pa.types.is_dictionary(c.type):
+            c = c.dictionary_decode()
+        if flat and _is_list(c.type):
+            c = pc.binary_join(c.cast(pa.list_(pa.string())), LIST_SEP)
+        cols.append(c)
+    return pa.RecordBatch.from_arrays(cols, names=batch.schema.names)
+
+
+def _plain_schema(schema: pa.Schema, flat: bool = False) -> pa.Schema:
+    fields = []
+    for f in schema:
+        if pa.types.is_dictionary(f.type):
+            f = pa.field(f.name, f.type.value_type)
+        if flat and _is_list(f.type):
+            f = pa.field(f.name, pa.string())
+        fields.append(f)
+    return pa.schema(fields)
+
+
+def _keep(batch: pa.RecordBatch, filters: dict) -> pa.RecordBatch:
+    """Rows whose filter columns hold one of the wanted values."""
+    mask = None
+    for name, values in filters.items():
+        m = pc.is_in(batch.column(name), value_set=pa.array(values, batch.column(name).type))
+        mask = m if mask is None else pc.and_(mask, m)
+    return batch if mask is None else batch.filter(mask)
+
+
+@contextmanager
+def open_writer(fmt: str, path: Path, schema: pa.Schema):
+    """Yields write(batch) appending plain record batches to one *fmt* file."""
+    if fmt in ("csv", "csv.gz"):
+        sink = pa.CompressedOutputStream(str(path), "gzip") if fmt == "csv.gz" \
+            else pa.OSFile(str(path), "wb")
+        with sink, pacsv.CSVWriter(sink, schema) as writer:
+            yield writer.write_batch
+    elif fmt in ("jsonl", "jsonl.gz"):
+        opener = gzip.open if fmt == "jsonl.gz" else open
+        with opener(path, "wt", encoding="utf-8") as f:
+            yield lambda batch: batch.to_pandas().to_json(
+                f, orient="records", lines=True, force_ascii=False)
+    else:
+        from openpyxl import Workbook          # optional: only for --format xlsx
+        book  = Workbook(write_only=True)
+        title = path.name.split(".")[0][:28]
+        sheet, rows = None, XLSX_ROWS
+
+        def write(batch):
+            nonlocal sheet, rows
+            cols = [pc.replace_substring_regex(c, XLSX_ILLEGAL, "")
+                    if pa.types.is_string(c.type) or pa.types.is_large_string(c.type) else c
+                    for c in batch.columns]
+            for row in zip(*(c.to_pylist() for c in cols)):
+                if rows == XLSX_ROWS:          # sheet full → continue on the next one
+                    n = len(book.worksheets)
+                    sheet = book.create_sheet(f"{title} {n + 1}" if n else title)
+                    sheet.append(schema.names)
+                    rows = 1
+                sheet.append(row)
+                rows += 1
+
+        yield write
+        book.save(path)
+
+
+def export_table(src, dest_dir, fmt: str = "csv", columns=None, topics=None,
+                 time_bins=None, batch_rows: int = BATCH_ROWS) -> dict:
+    """Stream one parquet table to dest_dir/<name>.<fmt>. Returns what was written."""
+    src   = Path(src)
+    name  = src.name[:-len(".parquet")]
+    table = pq.ParquetFile(src, buffer_size=READ_BUFFER, pre_buffer=False)
+    names = table.schema_arrow.names
+    filters = {c: v for c, v in (("topic", topics), ("time_bin", time_bins)) if v}
+    columns = list(columns or names)
+    missing = sorted(set(columns + list(filters)) - set(names))
+    if missing:
+        return {"table": name, "skipped": f"no column(s) {', '.join(missing)}"}
+
+    read   = columns + [c for c in filters if c not in columns]
+    flat   = fmt in FLAT_FORMATS
+    schema = _plain_schema(pa.schema([table.schema_arrow.field(c) for c in columns]), flat)
+    dest = Path(dest_dir) / f"{name}.{fmt}"
+    tmp  = dest.with_name(dest.name + ".tmp")
+    rows = 0
+    try:
+        with open_writer(fmt, tmp, schema) as write:
+            for batch in table.iter_batches(batch_size=batch_rows, columns=read):
+                batch = _keep(_plain(batch, flat), filters).select(columns)
+                if batch.num_rows:
+                    write(batch)
+                    rows += batch.num_rows
+        tmp.replace(dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return {"table": name, "path": str(dest), "rows": rows}
+
+
+def _outcome(src: Path, result) -> dict:
+    """result() of one table's export; a failure is reported, not raised."""
+    try:
+        return result()
+    except Exception as e:              # one bad table mustn't hide the others
+        return {"table": src.name[:-len(".parquet")], "failed": f"{type(e).__name__}: {e}"}
+
+
+def _split(values) -> list:
+    """['Energy,Climate', 'Trade'] → ['Energy', 'Climate', 'Trade']"""
+    return [v.strip() for arg in values or [] for v in arg.split(",") if v.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="file_to_csv.py",
+                                 description="stream pipeline tables to CSV / JSON Lines / Excel")
+    ap.add_argument("tables", nargs="*",
+                    help=f"table names in --src or parquet paths (default: {' '.join(TABLES)})")
+    ap.add_argument("--src", default=str(SRC_DIR), help="folder with the parquet tables")
+    ap.add_argument("--out", default=OUTPUT_DIR, help="output folder")
+    ap.add_argument("--format", choices=FORMATS, default="csv")
+    ap.add_argument("--columns", action="append",
+                    help="only these columns, in this order (comma-separated)")
+    ap.add_argument("--topic", action="append", help="only rows of these topics")
+    ap.add_argument("--time-bin", action="append", help="only rows of these time bins")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="tables converted in parallel (0 = one per table, up to the cores)")
+    ap.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                    help="rows read and written at a time")
+    args = ap.parse_args()
+
+    if args.format == "xlsx" and find_spec("openpyxl") is None:
+        sys.exit("⚠️  --format xlsx needs openpyxl (pip install openpyxl)")
+
+    sources = []
+    for t in args.tables or TABLES:
+        fp = Path(t) if t.endswith(".parquet") else Path(args.src) / f"{t}.parquet"
+        if fp.exists():
+            sources.append(fp)
+        else:
+            print(f"⚠️  {fp} not found – skipped")
+    if not sources:
+        sys.exit("⚠️  nothing to export – run 'python story.py all' first")
+    os.makedirs(args.out, exist_ok=True)
+
+    job = dict(dest_dir=args.out, fmt=args.format, columns=_split(args.columns),
+               topics=_split(args.topic), time_bins=_split(args.time_bin),
+               batch_rows=args.batch_rows)
+    workers = min(args.workers or os.cpu_count() or 1, len(sources))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(export_table, fp, **job) for fp in sources]
+            results = [_outcome(fp, f.result) for fp, f in zip(sources, futures)]
+    else:
+        results = [_outcome(fp, partial(export_table, fp, **job)) for fp in sources]
+
+    for r in results:
+        if "failed" in r:
+            print(f"❌ {r['table']}: {r['failed']}")
+        elif "skipped" in r:
+            print(f"⚠️  {r['table']}: {r['skipped']} – skipped")
+        else:
+            print(f"Saved: {r['path']}  ({r['rows']:,} rows)")
+    if any("failed" in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
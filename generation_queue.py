@@ -0,0 +1,84 @@
+# ---------------------------------------------------------------------------
+#  Bounded, fair request queue in front of the (single) story model
+# ---------------------------------------------------------------------------
+#  One background thread owns the model and works through jobs strictly in
+#  arrival order.  The queue is bounded (callers get QueueFull → HTTP 503
+#  instead of piling up), each client may only have a limited number of jobs
+#  waiting or running, and a job whose browser went away is cancelled
+#  between tokens so it stops holding the model.
+# ---------------------------------------------------------------------------
+
+import queue, threading
+from collections import Counter
+
+
+class QueueFull(Exception):
+    """The queue is at capacity or the client already has jobs waiting."""
+
+
+class Job:
+    def __init__(self, client, produce):
+        self.client    = client
+        self.produce   = produce       # () → iterator of text pieces
+        self.events    = queue.Queue() # ("token", str) / ("done", None) / ("error", str)
+        self.cancelled = threading.Event()
+        self.position  = 0             # jobs ahead of this one when it was queued
+
+    def stream(self):
+        """Yield (kind, payload) events until the job is done; cancels on close."""
+        try:
+            while True:
+                kind, payload = self.events.get()
+                yield kind, payload
+                if kind in ("done", "error"):
+                    return
+        finally:
+            self.cancelled.set()
+
+
+class GenerationQueue:
+    def __init__(self, maxsize=8, per_client=1):
+        self.jobs       = queue.Queue(maxsize)
+        self.per_client = per_client
+        self.active     = Counter()    # client → jobs waiting or running
+        self.lock       = threading.Lock()
+        self.thread     = None
+
+    def submit(self, client, produce) -> Job:
+        job = Job(client, produce)
+        with self.lock:
+            if self.active[client] >= self.per_client:
+                raise QueueFull("a story for this client is already being generated")
+            try:
+                job.position = self.jobs.qsize()
+                self.jobs.put_nowait(job)
+            except queue.Full:
+                raise QueueFull("too many stories are being generated right now")
+            self.active[client] += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._work, name="story-generator",
+                                               daemon=True)
+                self.thread.start()
+        return job
+
+    def _release(self, job):
+        with self.lock:
+            self.active[job.client] -= 1
+            if self.active[job.client] <= 0:
+                del self.active[job.client]
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job.cancelled.is_set():
+                    continue
+                for piece in job.produce():
+                    if job.cancelled.is_set():
+                        break
+                    job.events.put(("token", piece))
+                job.events.put(("done", None))
+            except Exception as e:
+                job.events.put(("error", str(e)))
+            finally:
+                self._release(job)
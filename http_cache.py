@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# ---------------------------------------------------------------------------
+#  HTTP caching for the web app
+# ---------------------------------------------------------------------------
+#  Pages   – rendered HTML is kept in memory, keyed by the route's inputs and
+#            the state of the files behind it, and sent with a weak ETag (hash
+#            of the body) and a Last-Modified taken from the story / chart
+#            files.  A revalidating browser or proxy gets a 304.
+#  Static  – files under static/ are sent with validators and, when the
+#            client accepts it, from a .br / .gz sibling written at build time.
+#  Build   – build_assets() writes those siblings plus chart thumbnails
+#            (static/charts/thumbs/, THUMB_WIDTH px wide) for the page grids.
+#
+#  Usage
+#  -----
+#     python http_cache.py                  # thumbnails + compressed assets
+#     python http_cache.py --force          # rebuild everything
+#     flask --app app build-charts          # charts, then the same build
+# ---------------------------------------------------------------------------
+
+import os, sys, gzip, hashlib, mimetypes, threading
+from collections import OrderedDict
+from importlib.util import find_spec
+
+STATIC_DIR   = "static"
+THUMB_DIR    = "thumbs"                # inside the chart folder
+THUMB_WIDTH  = 720                     # ≥ the 700 px the chart viewer shows
+STATIC_MAX_AGE = 3600                  # s a browser may reuse a static file unasked
+MIN_COMPRESS = 1024                    # bytes – smaller bodies go out as they are
+MIN_SAVING   = 0.10                    # keep a .gz/.br only if ≥10 % smaller
+SUFFIX       = {"br": ".br", "gzip": ".gz"}
+
+
+def brotli_available() -> bool:
+    return find_spec("brotli") is not None
+
+
+def encode(data: bytes, coding: str) -> bytes:
+    if coding == "br":
+        import brotli
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)   # mtime=0 → same bytes every build
+
+
+def accepted_codings(request) -> list:
+    """Content codings to try for this request, best first."""
+    codings = ["br"] if brotli_available() else []
+    return [c for c in codings + ["gzip"] if request.accept_encodings[c]]
+
+
+def newest_mtime(*paths) -> float:
+    """Newest mtime among the paths that exist (a folder's mtime covers adds/deletes)."""
+    stamps = []
+    for p in paths:
+        try:
+            stamps.append(os.path.getmtime(p))
+        except OSError:
+            pass
+    return max(stamps, default=0.0)
+
+
+class FolderStamp:
+    """
+    newest_mtime(*paths), re-read by a daemon thread every *interval* s (and
+    by refresh() after a build), so request handlers read a number instead
+    of statting folders.
+    """
+    def __init__(self, *paths):
+        self.paths   = paths
+        self.value   = newest_mtime(*paths)
+        self._stop   = threading.Event()
+        self._thread = None
+
+    def refresh(self) -> float:
+        self.value = newest_mtime(*self.paths)
+        return self.value
+
+    def start(self, interval=2.0):
+        if self._thread is None and interval:
+            def poll():
+                while not self._stop.wait(interval):
+                    self.refresh()
+
+            self._thread = threading.Thread(target=poll, name="folder-stamp", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+# ---------------------------------------------------------------------------
+#  Rendered pages
+# ---------------------------------------------------------------------------
+class Page:
+    """One rendered body with its ETag; compressed variants made on first use."""
+
+    def __init__(self, body: bytes):
+        self.body     = body
+        self.etag     = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self._encoded = {}
+
+    def encoded(self, coding):
+        if coding is None or len(self.body) < MIN_COMPRESS:
+            return None, self.body
+        if coding not in self._encoded:
+            self._encoded[coding] = encode(self.body, coding)
+        return coding, self._encoded[coding]
+
+
+class PageCache:
+    """
+    get(key, render) → Page, rendering only on a miss.  The key must contain
+    everything the page depends on (selection, StoryStore.version, …);
+    least recently used pages are dropped beyond maxsize.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._pages = OrderedDict()
+        self._lock  = threading.Lock()
+
+    def get(self, key, render) -> Page:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+        page = Page(render().encode("utf-8"))     # render outside the lock
+        with self._lock:
+            self.misses += 1
+            self._pages[key] = page
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+def page_response(request, page: Page, last_modified: float = None):
+    """HTML response with validators; 304 when the client's copy is current."""
+    from flask import Response
+
+    coding, body = page.encoded((accepted_codings(request) or [None])[0])
+    resp = Response(body, mimetype="text/html")
+    if coding:
+        resp.content_encoding = coding
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(page.etag, weak=True)          # same page in every encoding
+    if last_modified:
+        resp.last_modified = last_modified
+    resp.cache_control.public   = True
+    resp.cache_control.no_cache = True           # store, but revalidate each time
+    return resp.make_conditional(request)
+
+
+# ---------------------------------------------------------------------------
+#  Static files
+# ---------------------------------------------------------------------------
+def send_static(request, folder, filename, max_age=STATIC_MAX_AGE):
+    """Like Flask's static view, but prefers an up-to-date .br / .gz sibling."""
+    from flask import send_from_directory
+    from werkzeug.security import safe_join
+
+    path = safe_join(folder, filename)
+    if path and os.path.isfile(path):
+        mtime = os.path.getmtime(path)
+        for coding in accepted_codings(request):
+            variant = path + SUFFIX[coding]
+            if os.path.isfile(variant) and os.path.getmtime(variant) >= mtime:
+                resp = send_from_directory(folder, filename + SUFFIX[coding], max_age=max_age,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+                resp.content_encoding = coding
+                resp.vary.add("Accept-Encoding")
+                return resp
+    resp = send_from_directory(folder, filename, max_age=max_age)   # 404s on its own
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+
+# ---------------------------------------------------------------------------
+#  Build step: chart thumbnails + pre-compressed siblings
+# ---------------------------------------------------------------------------
+def thumb_path(chart_dir, name):
+    """static/charts, story_X_charts_page_1.png → static/charts/thumbs/story_X_charts_page_1.png"""
+    return os.path.join(chart_dir, THUMB_DIR, name)
+
+
+def _stale(src, dest):
+    return not os.path.exists(dest) or os.path.getmtime(dest) < os.path.getmtime(src)
+
+
+def make_thumbnail(src, dest, width=THUMB_WIDTH):
+    from PIL import Image
+
+    with Image.open(src) as img:
+        img = img.convert("RGB")
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)),
+                             Image.Resampling.LANCZOS)
+        # charts are a handful of flat colours: a palette PNG is a third the size
+        img.quantize(256).save(dest, optimize=True)
+
+
+def compress_file(path, codings) -> list:
+    """Write path.gz / path.br where that saves ≥ MIN_SAVING; drop stale ones."""
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    for coding in codings:
+        variant = path + SUFFIX[coding]
+        packed  = encode(data, coding) if len(data) >= MIN_COMPRESS else data
+        if len(packed) <= len(data) * (1 - MIN_SAVING):
+            with open(variant, "wb") as f:
+                f.write(packed)
+            written.append(variant)
+        elif os.path.exists(variant):
+            os.remove(variant)          # not worth it (any more) – serve the original
+    return written
+
+
+def build_assets(static_dir=STATIC_DIR, chart_dir=None, force=False) -> dict:
+    chart_dir = chart_dir or os.path.join(static_dir, "charts")
+    report = {"thumbs": [], "compressed": [], "skipped": 0}
+
+    if os.path.isdir(chart_dir):
+        os.makedirs(os.path.join(chart_dir, THUMB_DIR), exist_ok=True)
+        for name in sorted(os.listdir(chart_dir)):
+            if "_page_" not in name or not name.endswith(".png"):
+                continue
+            src, dest = os.path.join(chart_dir, name), thumb_path(chart_dir, name)
+            if force or _stale(src, dest):
+                make_thumbnail(src, dest)
+                report["thumbs"].append(dest)
+
+    codings = (["br"] if brotli_available() else []) + ["gzip"]
+    for root, _, files in os.walk(static_dir):
+        for name in sorted(files):
+            if name.startswith(".") or name.endswith((".gz", ".br")):
+                continue
+            path = os.path.join(root, name)
+            if not force and not any(_stale(path, path + SUFFIX[c]) for c in codings):
+                report["skipped"] += 1
+                continue
+            report["compressed"] += compress_file(path, codings)
+    return report
+
+
+if __name__ == "__main__":
+    rep = build_assets(force="--force" in sys.argv)
+    print(f"✅ assets: {len(rep['thumbs'])} thumbnails, {len(rep['compressed'])} "
+          f"compressed files written, {rep['skipped']} up to date")
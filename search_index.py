@@ -0,0 +1,207 @@
+# ---------------------------------------------------------------------------
+#  Full-text search over the timeline sentences and the story texts
+# ---------------------------------------------------------------------------
+#  out/search.sqlite holds two SQLite FTS5 tables:
+#     sentences(text, topic, time_bin, file, page)   one row per sentence
+#     stories(title, body, kind, path)               story_*.txt / *_vs_*.txt
+#  topic, time_bin and file are indexed as well, so a facet filter is a
+#  doclist intersection inside FTS5.  Only values that cover a large share
+#  of the corpus (a time bin, a dominant topic) are checked on the matches
+#  instead – decoding their long doclists costs more than the few extra
+#  matches that get skipped.
+#
+#  Sentences are inserted best-first (the snippet order the story prompts
+#  use).  A query takes the first CANDIDATES matches in rowid order – cheap,
+#  FTS5 stops as soon as it has them – and ranks those by bm25: exact for
+#  rarer terms, bounded work for terms that hit a large part of the corpus.
+#
+#  `python story.py index` builds it; the web app's /search only reads it.
+# ---------------------------------------------------------------------------
+
+import os, re, json, html, sqlite3, threading, time
+
+CANDIDATES = 1000          # matches ranked by bm25 per query
+DENSE      = 0.25          # facet values on ≥ 25 % of rows are not put in MATCH
+TOKENIZE   = "unicode61 remove_diacritics 2"
+MARK       = ("\x02", "\x03")            # highlight markers, turned into <mark>
+TERM       = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fts_query(text: str) -> str:
+    """
+    User input → FTS5 expression: words and "quoted phrases" are ANDed, a
+    trailing * is a prefix search; everything else is taken literally.
+    """
+    parts = []
+    for phrase, word in TERM.findall(text or ""):
+        term   = phrase or word
+        prefix = not phrase and term.endswith("*")
+        term   = term.rstrip("*") if prefix else term
+        if re.search(r"\w", term):
+            parts.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(parts)
+
+
+def _phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def highlighter(text: str):
+    """text → function that HTML-escapes a sentence and <mark>s the query's words."""
+    words = [w for phrase, word in TERM.findall(text or "")
+             for w in re.findall(r"\w+\*?", phrase or word)]
+    if not words:
+        return html.escape
+    alts = [rf"\b{re.escape(w.rstrip('*'))}" + (r"\w*" if w.endswith("*") else r"\b")
+            for w in words]
+    pat  = re.compile("|".join(alts), re.I)
+    return lambda s: _marked_html(pat.sub(lambda m: MARK[0] + m.group(0) + MARK[1], s))
+
+
+def _marked_html(text: str) -> str:
+    """Escape text, then turn the highlight markers into <mark> tags."""
+    return html.escape(text).replace(MARK[0], "<mark>").replace(MARK[1], "</mark>")
+
+
+def _create(db):
+    db.executescript(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS sentences USING fts5(
+            text, topic, time_bin, file, page UNINDEXED, tokenize='{TOKENIZE}');
+        CREATE VIRTUAL TABLE IF NOT EXISTS stories USING fts5(
+            title, body, kind UNINDEXED, path UNINDEXED, tokenize='{TOKENIZE}');
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """)
+
+
+def _set_meta(db, **values):
+    db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                   [(k, json.dumps(v)) for k, v in values.items()])
+
+
+def _insert_stories(db, stories):
+    db.execute("DELETE FROM stories")
+    db.executemany("INSERT INTO stories (title, body, kind, path) VALUES (?, ?, ?, ?)", stories)
+
+
+def write_index(path, batches, stories, sources: dict, facets: dict) -> int:
+    """
+    Build a new index next to *path* and swap it in.  batches yields lists of
+    (text, topic, time_bin, file, page) rows, best first; stories is a list of
+    (title, body, kind, path).  Returns the number of sentences indexed.
+    """
+    tmp = f"{path}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db, rows = sqlite3.connect(tmp), 0
+    try:
+        db.execute("PRAGMA journal_mode=OFF")     # a throw-away file until it's complete
+        db.execute("PRAGMA synchronous=OFF")
+        _create(db)
+        with db:
+            for batch in batches:
+                db.executemany("INSERT INTO sentences (text, topic, time_bin, file, page) "
+                               "VALUES (?, ?, ?, ?, ?)", batch)
+                rows += len(batch)
+            _insert_stories(db, stories)
+            _set_meta(db, sources=sources, facets=facets, sentences=rows)
+        db.execute("INSERT INTO sentences (sentences) VALUES ('optimize')")
+        db.execute("INSERT INTO stories (stories) VALUES ('optimize')")
+        db.commit()
+    finally:
+        db.close()
+    os.replace(tmp, path)                         # readers reopen on the new inode
+    return rows
+
+
+def replace_stories(path, stories, sources: dict):
+    """Re-index only the story texts (one transaction; readers keep the old ones)."""
+    db = sqlite3.connect(path, timeout=30)
+    try:
+        with db:
+            _insert_stories(db, stories)
+            _set_meta(db, sources=sources)
+    finally:
+        db.close()
+
+
+class SearchIndex:
+    """
+    search(q, topic=…, time_bin=…, file=…)  → ranked sentence hits + stories
+    facets()                                 → {facet: {value: rows}} for the form
+    Connections are per thread and reopened when the file has been rebuilt.
+    """
+
+    def __init__(self, path):
+        self.path   = str(path)
+        self._local = threading.local()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    @property
+    def db(self):
+        st  = os.stat(self.path)                  # FileNotFoundError → no index yet
+        sig = (st.st_ino, st.st_mtime_ns)
+        if getattr(self._local, "sig", None) != sig:
+            if getattr(self._local, "db", None) is not None:
+                self._local.db.close()
+            self._local.db   = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.sig  = sig
+            self._local.meta = {}
+        return self._local.db
+
+    def meta(self, key, default=None):
+        try:
+            db = self.db
+        except OSError:
+            return default
+        if key not in self._local.meta:         # parsed once per index version
+            row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            self._local.meta[key] = json.loads(row[0]) if row else default
+        return self._local.meta[key]
+
+    def sources(self) -> dict:
+        return self.meta("sources", {})
+
+    def facets(self) -> dict:
+        return self.meta("facets", {})
+
+    def search(self, q: str, topic=None, time_bin=None, file=None,
+               limit: int = 20, story_limit: int = 5) -> dict:
+        t0 = time.perf_counter()
+        query = fts_query(q)
+        chosen = {"topic": topic, "time_bin": time_bin, "file": file}
+        counts, total = self.facets(), self.meta("sentences", 0)
+        where = [f"text : ({query})"] if query else []
+        where += [f"{name} : {_phrase(value)}" for name, value in chosen.items()
+                  if value and counts.get(name, {}).get(value, 0) < DENSE * total]
+        hits, stories, more = [], [], False
+        if query:                                  # facets alone don't make a search
+            exact  = " ".join(f"AND {name} = ?" for name, value in chosen.items() if value)
+            params = [v for v in chosen.values() if v]
+            # first CANDIDATES (+1, to tell whether there were more) matches
+            # in rowid = quality order, ranked here by their bm25 score
+            found = self.db.execute(f"""
+                SELECT rowid, bm25(sentences, 1, 0, 0, 0, 0) FROM sentences
+                WHERE sentences MATCH ? {exact} LIMIT ?""",
+                [" AND ".join(where), *params, CANDIDATES + 1]).fetchall()
+            more  = len(found) > CANDIDATES
+            top   = sorted(found[:CANDIDATES], key=lambda r: (r[1], r[0]))[:limit]
+            # highlight() would re-run the MATCH per row – mark the terms here
+            rows  = {r[0]: r[1:] for r in self.db.execute(f"""
+                SELECT rowid, text, file, page, topic, time_bin FROM sentences
+                WHERE rowid IN ({",".join("?" * len(top))})""", [r for r, _ in top])}
+            terms = highlighter(q)
+            hits  = [{"html": terms(text), "file": f, "page": int(p), "topic": tp,
+                      "time_bin": tb, "cite": f"{f} p.{p}", "score": -score}
+                     for rowid, score in top
+                     for text, f, p, tp, tb in [rows[rowid]]]
+
+            story_where = f"body : ({query})" + (f" AND title : {_phrase(topic)}" if topic else "")
+            stories = [{"title": title, "kind": kind, "path": path, "html": _marked_html(snip)}
+                       for title, kind, path, snip in self.db.execute("""
+                SELECT title, kind, path, snippet(stories, 1, ?, ?, '…', 24)
+                FROM stories WHERE stories MATCH ? ORDER BY rank LIMIT ?""",
+                [*MARK, story_where, story_limit])]
+        return {"query": q, "hits": hits, "stories": stories, "more": more,
+                "ms": 1000 * (time.perf_counter() - t0)}
@@ -6,33 +6,66 @@
 #  2.  clean_text       … basic comma→dot fix for numbers
 #  3.  classify_text    … very small keyword map → high-level topics
 #  4.  tag_timeline     … Past / Present / Future buckets
+#  4b. extract_facts    … numbers + units per topic / time bin → chart_data.parquet
 #  5.  make_story       … Llama-cpp generates Past–Present–Future narrative
 #  6.  write_stories    … one file per topic  (.txt)
+#  7.  build_search_index … SQLite FTS5 over sentences + stories (/search)
 #
 #  Usage examples
 #  --------------
 #     python storylab.py extract      # just text
 #     python storylab.py story        # assumes earlier steps ran
 #     python storylab.py all          # full chain in one go
+#     python storylab.py extract --workers 8   # PDFs sharded over 8 processes
+#     python storylab.py extract --backend fitz   # PyMuPDF instead of pdfplumber
+#     python storylab.py all --full   # ignore manifests, redo every PDF
+#     python storylab.py all --fused  # one streaming pass, final table only
+#     python storylab.py compare-all  # every linked topic pair → out/compare/
+#     python storylab.py story --llm-workers 4 --llm-threads 4   # 4 models × 4 threads
+#     python storylab.py all --llm stub   # no model needed: time the other stages
+#     python storylab.py classify --classifier embed   # MiniLM topic similarity
+#     python storylab.py all --profile cprofile   # + out/profile.pstats
+#     python storylab.py index        # full-text index → out/search.sqlite
+#     python storylab.py facts        # numeric facts → out/chart_data.parquet
+#
+#  Every run writes out/run_report.json: per-stage wall/CPU time, rows and
+#  bytes in/out, and per-call LLM prompt length and tokens/sec (with
+#  --prefix-cache also the net effect of restoring saved prefix state).
+#
+#  Stages are incremental: only PDFs whose content hash changed since the
+#  last run are reprocessed (see out/*.manifest.json).
 #
 #  Requirements (pip install …)
 #  ----------------------------
-#     pdfplumber  pandas  regex  dateparser  llama-cpp-python[all]
-#     fitz==PyMuPDF  tqdm
+#     pdfplumber  pandas  pyarrow  regex  llama-cpp-python[all]
+#     pymupdf (optional: --backend fitz)
+#
+#  Module import is kept light: pdfplumber, regex, llama-cpp and
+#  sentence-transformers are imported by the functions that use them, and
+#  out/ is only created when something is written there.  numpy, pandas and
+#  pyarrow stay module imports: every subcommand (each stage, story,
+#  compare-all, index) and the module's table schemas need them, so
+#  deferring them would only move ~0.6 s from import to the first call.
+#  The web app imports story only inside /stream-story.
 # ---------------------------------------------------------------------------
 
 from pathlib import Path
-import re, sys, json, shutil, subprocess
+import re, os, sys, json, time, random, shutil, subprocess, argparse, hashlib, threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from itertools import islice, combinations
+from urllib.parse import quote, unquote
+import numpy as np
 import pandas as pd
-import pdfplumber, fitz
-import regex as re2
-import dateparser
-from tqdm import tqdm
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 ROOT = Path(__file__).resolve().parent
 DATA = ROOT / "data"            # put PDFs here
 OUT  = ROOT / "out"             # results land here
-OUT.mkdir(exist_ok=True)
 
 
 def with_cite(row):
@@ -40,76 +73,541 @@ def with_cite(row):
     cite = f"{row.file} p.{row.page}"
     return f"{row.text} ({cite})"
 
-def overlap_snippets(topic_a: str, topic_b: str, df: pd.DataFrame):
+class TopicIndex:
     """
-    Return a list of dicts — one per (file, page) where *both* topics occur.
-    Each dict →  {'file':…, 'page':…, 'snippets': [txtA, txtB, …]}
+    Co-occurrence index over the timeline table, built once:
+      pages[topic]        → {(file, page), …} where the topic occurs
+      rows[(file, page)]  → row positions of that page in the table
+    Overlap of two topics is then a set intersection plus a few lookups.
     """
-    # keep only rows we care about
-    sub = df[df.topic.isin([topic_a, topic_b])]
-    # group by file & page
-    both = []
-    for (f, p), grp in sub.groupby(["file", "page"]):
-        if {topic_a, topic_b}.issubset(set(grp.topic)):
+    def __init__(self, df: pd.DataFrame):
+        self.df    = df
+        self.rows  = df.groupby(["file", "page"], sort=False).indices
+        self.pages = {topic: set(zip(g.file, g.page))
+                      for topic, g in df[["file", "page", "topic"]].groupby("topic")}
+
+    def topics(self) -> list:
+        return sorted(self.pages)
+
+    def shared_pages(self, topic_a: str, topic_b: str) -> list:
+        return sorted(self.pages.get(topic_a, set()) & self.pages.get(topic_b, set()))
+
+    def overlap(self, topic_a: str, topic_b: str, limit: int = None) -> list:
+        both = []
+        for f, p in self.shared_pages(topic_a, topic_b)[:limit]:
+            grp = self.df.iloc[self.rows[(f, p)]]
+            grp = grp[grp.topic.isin([topic_a, topic_b])]
             both.append({
                 "file": f, "page": p,
-                "snippets": grp.sort_values("topic")["text"].tolist()
+                "snippets": grp.sort_values("topic", kind="stable")["text"].tolist()
             })
-    return both
+        return both
+
+def overlap_snippets(topic_a: str, topic_b: str, df: pd.DataFrame, limit: int = None):
+    """
+    Return a list of dicts — one per (file, page) where *both* topics occur
+    (the first *limit* pages only, if given).
+    Each dict →  {'file':…, 'page':…, 'snippets': [txtA, txtB, …]}
+    Uses the prebuilt INDEX when *df* is the loaded timeline table.
+    """
+    index = INDEX if (INDEX is not None and df is TEXT) else TopicIndex(df)
+    return index.overlap(topic_a, topic_b, limit)
+
+# ---------------------------------------------------------------------------
+#  RUN REPORT   (out/run_report.json,  --profile cprofile|pyinstrument)
+# ---------------------------------------------------------------------------
+#  Each CLI step runs inside REPORT.stage(name).  For every stage it collects:
+#  wall time and CPU time (this process plus finished worker processes),
+#  rows in/out, and the parquet/PDF/text bytes read and written.  Every model
+#  call adds its prompt length, tokens and tokens/sec.  Outside the CLI
+#  (e.g. in the web app) the report stays disabled and records nothing.
+def _cpu_seconds() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def _size(path: Path) -> int:
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+class RunReport:
+    COUNTERS = ("rows_in", "rows_out", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        self.enabled = False
+        self.stages, self.llm = [], []
+        self.current = None      # record of the stage that is running
+        self.job     = None      # label of the generation job that is running
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name: str):
+        rec = {"stage": name, **dict.fromkeys(self.COUNTERS, 0)}
+        outer, self.current = self.current, rec
+        t0, c0 = time.perf_counter(), _cpu_seconds()
+        try:
+            yield rec
+        finally:
+            rec["wall_seconds"] = round(time.perf_counter() - t0, 4)
+            rec["cpu_seconds"]  = round(_cpu_seconds() - c0, 4)
+            self.current = outer
+            if self.enabled:
+                self.stages.append(rec)
+
+    def note(self, **counts):
+        """Add to the counters of the running stage."""
+        if self.enabled and self.current is not None:
+            for key, n in counts.items():
+                self.current[key] += n
+
+    def llm_call(self, **call):
+        if self.enabled:
+            stage = self.current["stage"] if self.current else call.get("stage")
+            self.llm.append({"job": self.job, **call, "stage": stage})
+
+    def llm_totals(self) -> dict:
+        calls = [c for c in self.llm if not c["cached"]]
+        secs  = sum(c["seconds"] for c in calls)
+        toks  = sum(c["completion_tokens"] or 0 for c in calls)
+        total = lambda key: sum(c.get(key) or 0 for c in calls)
+        return {"calls": len(self.llm), "cached": len(self.llm) - len(calls),
+                "generation_seconds": round(secs, 3),
+                "completion_tokens": toks,
+                "prefix_tokens_reused": total("prefix_tokens"),
+                "prefix_eval_saved_s": round(total("prefix_saved_s"), 3),   # net of loads
+                "prefix_load_s": round(total("prefix_load_s"), 3),
+                "prefix_prime_s": round(total("prefix_prime_s"), 3),
+                "tokens_per_s": round(toks / secs, 2) if secs else None,
+                "mean_prompt_tokens": round(sum(c["prompt_tokens"] for c in self.llm)
+                                            / len(self.llm), 1) if self.llm else None}
+
+    def write(self, fp: Path, **meta):
+        body = {**meta, "started": time.strftime("%Y-%m-%dT%H:%M:%S",
+                                                 time.localtime(self.started)),
+                "wall_seconds": round(time.time() - self.started, 3),
+                "stages": self.stages,
+                "llm": {"totals": self.llm_totals(), "calls": self.llm}}
+        fp.parent.mkdir(exist_ok=True)
+        fp.write_text(json.dumps(body, indent=1, ensure_ascii=False), encoding="utf-8")
+
+    def print_summary(self):
+        mb = lambda n: f"{n / 2**20:,.1f} MB"
+        for r in self.stages:
+            print(f"   ⏱ {r['stage']:<12} {r['wall_seconds']:8.2f} s wall {r['cpu_seconds']:8.2f} s cpu"
+                  f"   rows {r['rows_in']:,} → {r['rows_out']:,}"
+                  f"   read {mb(r['bytes_read'])}  wrote {mb(r['bytes_written'])}")
+        if self.llm:
+            t = self.llm_totals()
+            rate = f"{t['tokens_per_s']} tok/s" if t["tokens_per_s"] else "–"
+            print(f"   ⏱ LLM: {t['calls']} call(s), {t['cached']} from cache, {rate}, "
+                  f"prompts {t['mean_prompt_tokens']} tok on average")
+            if t["prefix_tokens_reused"]:
+                net = t["prefix_eval_saved_s"] - t["prefix_prime_s"]
+                print(f"   ⏱ prefix cache: {t['prefix_tokens_reused']:,} tok restored beyond "
+                      f"llama-cpp's own reuse, net {net:+.2f} s (after "
+                      f"{t['prefix_load_s']:.2f} s loading state, "
+                      f"{t['prefix_prime_s']:.2f} s priming)")
+
+REPORT = RunReport()
+
+def run_profiled(kind: str, fn):
+    """fn() under cProfile (out/profile.pstats) or pyinstrument (out/profile.html)."""
+    if kind == "cprofile":
+        import cProfile, pstats
+        prof = cProfile.Profile()
+        try:
+            prof.runcall(fn)
+        finally:
+            prof.dump_stats(OUT / "profile.pstats")
+            pstats.Stats(prof).sort_stats("cumulative").print_stats(25)
+            print("✅ profile →", OUT / "profile.pstats")
+    elif kind == "pyinstrument":
+        from pyinstrument import Profiler
+        prof = Profiler()
+        prof.start()
+        try:
+            fn()
+        finally:
+            prof.stop()
+            (OUT / "profile.html").write_text(prof.output_html(), encoding="utf-8")
+            print("✅ profile →", OUT / "profile.html")
+    else:
+        fn()
+
+# ---------------------------------------------------------------------------
+# 0 · INCREMENTAL BOOK-KEEPING
+# ---------------------------------------------------------------------------
+#  Every stage output  out/<name>.parquet  has a sibling  <name>.manifest.json
+#  recording, per source PDF, the sha256 of the PDF its rows came from (plus
+#  the stage config).  A stage only recomputes rows of files whose hash moved
+#  and merges them into its existing output; everything else is skipped.
+#  A stage's config includes its input's config, so an upstream setting change
+#  (keyword map, classifier, …) rebuilds every stage below it.
+def _manifest_path(fp: Path) -> Path:
+    return fp.with_name(fp.stem + ".manifest.json")
+
+def load_manifest(fp: Path) -> dict:
+    try:
+        return json.loads(_manifest_path(fp).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"files": {}, "config": None}
+
+def save_manifest(fp: Path, files: dict, config=None, **extra):
+    body = {"files": dict(sorted(files.items())), "config": config, **extra}
+    _manifest_path(fp).write_text(json.dumps(body, indent=1), encoding="utf-8")
+
+def _sha256(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def pdf_fingerprints(pdfs, prev: dict) -> tuple:
+    """
+    {name: sha256} for *pdfs*.  A PDF whose (mtime, size) matches the previous
+    extract manifest keeps its stored hash, so unchanged reports aren't re-read.
+    Returns (hashes, stats) – stats go back into the extract manifest.
+    """
+    hashes, stats = {}, {}
+    for pdf in pdfs:
+        st  = pdf.stat()
+        sig = [st.st_mtime, st.st_size]
+        if prev.get("stat", {}).get(pdf.name) == sig and pdf.name in prev["files"]:
+            hashes[pdf.name] = prev["files"][pdf.name].split("+")[0]   # drop backend tag
+        else:
+            hashes[pdf.name] = _sha256(pdf)
+        stats[pdf.name] = sig
+    return hashes, stats
+
+def _plan(src: dict, fp_out: Path, config=None, full: bool = False):
+    """
+    Decide what a stage has to do.
+    Returns (todo, drop, skipped, rebuild): files to (re)compute, files whose
+    old rows must go, files left untouched, and whether to start from scratch.
+    """
+    own = load_manifest(fp_out)
+    if full or not src or not fp_out.exists() or own.get("config") != config:
+        return sorted(src), set(), [], True
+    todo    = sorted(f for f, h in src.items() if own["files"].get(f) != h)
+    drop    = (set(own["files"]) - set(src)) | set(todo)
+    skipped = sorted(set(src) - set(todo))
+    return todo, drop, skipped, False
+
+def _chain_config(config, input_config):
+    """Manifest config of a stage: its own settings + those of the table it reads."""
+    return {"stage": config, "input": input_config}
+
+def _report_skipped(skipped):
+    if skipped:
+        head = ", ".join(skipped[:5]) + (" …" if len(skipped) > 5 else "")
+        print(f"   ↷ skipped {len(skipped)} unchanged file(s): {head}")
+
+def _narrow(table: pa.Table) -> pa.Table:
+    """Cast the known columns to their dictionary / narrow-int storage types."""
+    for name, typ in COLUMN_TYPES.items():
+        i = table.schema.get_field_index(name)
+        if i >= 0 and table.schema.field(i).type != typ:
+            table = table.set_column(i, name, table.column(i).cast(typ))
+    return table
+
+def _frame_table(df: pd.DataFrame) -> pa.Table:
+    return _narrow(pa.Table.from_pandas(df, preserve_index=False))
+
+def _write_table(table: pa.Table, fp_out: Path):
+    tmp = fp_out.with_suffix(".tmp")
+    pq.write_table(table, tmp)
+    tmp.replace(fp_out)
+    REPORT.note(bytes_written=_size(fp_out))
+
+def _merge_into(fp_out: Path, new: pa.Table, drop: set) -> pa.Table:
+    """
+    Replace the rows of *drop* files in fp_out with *new*.  Rows are re-sorted
+    (stably) by file so the result matches a from-scratch run.
+    """
+    old  = _narrow(pq.read_table(fp_out))         # upgrades tables of older runs too
+    REPORT.note(bytes_read=_size(fp_out))
+    keep = old.filter(pc.invert(pc.is_in(old["file"], pa.array(sorted(drop), pa.string()))))
+    if new is not None and new.num_rows:
+        new  = _narrow(new).select(old.column_names).cast(old.schema)
+        keep = pa.concat_tables([keep, new])
+    # arrow can't sort dictionary columns directly – sort on the decoded names
+    merged = keep.take(pc.sort_indices(keep["file"].cast(pa.string())))
+    _write_table(merged, fp_out)
+    return merged
+
+def _run_stage(fp_in: Path, fp_out: Path, transform, need: str,
+               config=None, full: bool = False):
+    """
+    Shared driver for stages 2-4: read the rows of new/changed files from
+    fp_in, apply *transform* (DataFrame → DataFrame), merge into fp_out.
+    Returns the number of rows recomputed, or None if the input is missing.
+    """
+    if not fp_in.exists():
+        print(f"⚠️  run '{need}' first"); return None
+    inp    = load_manifest(fp_in)
+    src    = inp["files"]
+    config = _chain_config(config, inp.get("config"))
+    todo, drop, skipped, rebuild = _plan(src, fp_out, config, full)
+
+    REPORT.note(bytes_read=_size(fp_in))
+    if rebuild:
+        df = transform(pd.read_parquet(fp_in))
+        _write_table(_frame_table(df), fp_out)
+    else:
+        if not todo and not drop:
+            _report_skipped(skipped)
+            return 0
+        df = pd.read_parquet(fp_in, filters=[("file", "in", todo)]) if todo \
+            else pd.read_parquet(fp_in).iloc[0:0]
+        df = transform(df)
+        _merge_into(fp_out, _frame_table(df), drop)
+    save_manifest(fp_out, src, config)
+    _report_skipped(skipped)
+    REPORT.note(rows_in=len(df), rows_out=len(df))
+    return len(df)
 
 # ---------------------------------------------------------------------------
 # 1 · TEXT EXTRACTION
 # ---------------------------------------------------------------------------
-def extract_text():
-    rows = []
-    for pdf in DATA.glob("*.pdf"):
-        with pdfplumber.open(pdf) as doc:
-            for p in doc.pages:
-                raw = p.extract_text() or ""
-                if not raw:
-                    continue
-
-                # a) join lines → one string
-                # • remove hyphen + LF  (eco-
-                #                         nomic → economic)
-                # • remove LF between two letters (correla\n tion → correlation)
-                text = re.sub(r'-\s*\n\s*', '', raw)        # hyphen-breaks
-                text = re.sub(r'(?<=\w)\n(?=\w)', '', text) # wrap-breaks
-                text = text.replace('\n', ' ')              # keep paragraph spacing
-
-                # b) split into sentences (cheap regex is fine here)
-                sentences = re.split(r'(?<=[.!?])\s{1,}', text)
-                for sent in sentences:
-                    s = sent.strip()
-                    if len(s) > 0:
-                        rows.append({
-                            "file": pdf.name,
-                            "page": p.page_number,
-                            "text": s
-                        })
+#  Work is cut into shards of (pdf, first page, last page).  With --workers N
+#  the shards run in a process pool; results are written in shard order as
+#  parquet row groups, so the file is identical whatever N is and only a
+#  bounded window of shards is ever held in memory.
+#  --backend picks the text extractor: pdfplumber (character layout, the
+#  reference) or fitz (PyMuPDF text blocks, much faster).  Both feed the
+#  same hyphen/wrap joining and sentence splitter.
+#  Repeated labels are stored dictionary-encoded with narrow indices (and come
+#  back from pandas as categoricals): a corpus has at most a few thousand
+#  file names, a dozen topics and three time bins spread over millions of
+#  rows.  Page numbers fit an int16.
+FILE_TYPE  = pa.dictionary(pa.int16(), pa.string())
+LABEL_TYPE = pa.dictionary(pa.int8(), pa.string())
+COLUMN_TYPES = {"file": FILE_TYPE, "page": pa.int16(),
+                "topic": LABEL_TYPE, "time_bin": LABEL_TYPE}
+
+SENTENCE_SCHEMA = pa.schema([("file", FILE_TYPE),
+                             ("page", pa.int16()),
+                             ("text", pa.string())])
+PAGES_PER_SHARD = 25          # pages handed to one worker task
+ROW_GROUP_ROWS  = 64_000      # flush to parquet once this many rows are buffered
+
+def split_sentences(raw: str) -> list:
+    """Join hyphen/wrap breaks of one page's raw text and cut it into sentences."""
+    # a) join lines → one string
+    # • remove hyphen + LF  (eco-
+    #                         nomic → economic)
+    # • remove LF between two letters (correla\n tion → correlation)
+    text = re.sub(r'-\s*\n\s*', '', raw)        # hyphen-breaks
+    text = re.sub(r'(?<=\w)\n(?=\w)', '', text) # wrap-breaks
+    text = text.replace('\n', ' ')              # keep paragraph spacing
+
+    # b) split into sentences (cheap regex is fine here)
+    sentences = re.split(r'(?<=[.!?])\s{1,}', text)
+    return [s for s in (sent.strip() for sent in sentences) if s]
+
+def _pdfplumber_pages(pdf: Path, first: int, last: int):
+    import pdfplumber
+    with pdfplumber.open(pdf) as doc:
+        for p in doc.pages[first - 1:last]:
+            yield p.page_number, p.extract_text() or ""
+
+def _fitz_pages(pdf: Path, first: int, last: int):
+    import pymupdf            # the package behind `import fitz`
+    with pymupdf.open(pdf) as doc:
+        for i in range(first - 1, last):
+            # text blocks (type 0) in reading order, one line per text line
+            blocks = doc[i].get_text("blocks", sort=True)
+            yield i + 1, "\n".join(b[4].rstrip("\n") for b in blocks if b[6] == 0)
+
+def _pdfplumber_count(pdf: Path) -> int:
+    import pdfplumber
+    with pdfplumber.open(pdf) as doc:
+        return len(doc.pages)
+
+def _fitz_count(pdf: Path) -> int:
+    import pymupdf
+    with pymupdf.open(pdf) as doc:
+        return doc.page_count
+
+# backend → (page count, raw page texts of a 1-based inclusive range)
+EXTRACT_BACKENDS = {"pdfplumber": (_pdfplumber_count, _pdfplumber_pages),
+                    "fitz":       (_fitz_count,       _fitz_pages)}
+DEFAULT_BACKEND  = "pdfplumber"
+
+def _backend_hashes(hashes: dict, backend: str) -> dict:
+    """
+    Per-file keys for the extract manifest: the content hash, tagged with a
+    non-default backend so that switching backends looks like a change to
+    every later stage.
+    """
+    if backend == DEFAULT_BACKEND:
+        return hashes
+    return {name: f"{h}+{backend}" for name, h in hashes.items()}
+
+def _page_count(pdf: Path, backend: str = DEFAULT_BACKEND) -> int:
+    return EXTRACT_BACKENDS[backend][0](pdf)
+
+def _shards(pdfs, pages_per_shard=PAGES_PER_SHARD, backend: str = DEFAULT_BACKEND):
+    """(pdf, first, last) page ranges, 1-based and inclusive, in file order."""
+    for pdf in pdfs:
+        n = _page_count(pdf, backend)
+        for first in range(1, n + 1, pages_per_shard):
+            yield pdf, first, min(first + pages_per_shard - 1, n)
+
+def _extract_shard(shard, backend: str = DEFAULT_BACKEND) -> dict:
+    """Worker: sentences of one page range as column lists."""
+    pdf, first, last = shard
+    cols = {"file": [], "page": [], "text": []}
+    for page, raw in EXTRACT_BACKENDS[backend][1](pdf, first, last):
+        if not raw:
+            continue
+        for s in split_sentences(raw):
+            cols["file"].append(pdf.name)
+            cols["page"].append(page)
+            cols["text"].append(s)
+    return cols
+
+def _run_ordered(fn, jobs, workers):
+    """
+    map(fn, jobs) – in a process pool when workers > 1 – yielding results in
+    job order while keeping at most 4×workers tasks in flight.
+    """
+    if workers <= 1:
+        yield from map(fn, jobs)
+        return
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque(pool.submit(fn, j) for j in islice(jobs, 4 * workers))
+        while window:
+            res = window.popleft().result()
+            for j in islice(jobs, 1):
+                window.append(pool.submit(fn, j))
+            yield res
+
+def _write_batches(batches, fp_out: Path, schema) -> int:
+    """Stream column-dict batches into one parquet file (atomic replace)."""
+    tmp = fp_out.with_suffix(".tmp")
+    buf, rows = {name: [] for name in schema.names}, 0
+    with pq.ParquetWriter(tmp, schema) as writer:
+        for cols in batches:
+            for name in schema.names:
+                buf[name].extend(cols[name])
+            if len(buf["text"]) >= ROW_GROUP_ROWS:
+                writer.write_table(pa.table(buf, schema=schema))
+                rows += len(buf["text"])
+                buf = {name: [] for name in schema.names}
+        if buf["text"]:
+            writer.write_table(pa.table(buf, schema=schema))
+            rows += len(buf["text"])
     if rows:
-        pd.DataFrame(rows).to_parquet(OUT / "sentences.parquet")
-        print(f"✅ wrote {len(rows):,} rows to out/sentences.parquet")
+        tmp.replace(fp_out)
+        REPORT.note(bytes_written=_size(fp_out))
     else:
-        print("⚠️  No text extracted — check if PDFs exist in data/")
+        tmp.unlink()
+    return rows
+
+def extract_text(workers: int = 1, pages_per_shard: int = PAGES_PER_SHARD,
+                 full: bool = False, backend: str = DEFAULT_BACKEND):
+    fp_out = OUT / "sentences.parquet"
+    pdfs   = sorted(DATA.glob("*.pdf"))            # sorted → deterministic output
+    if not pdfs:
+        print("⚠️  No text extracted — check if PDFs exist in data/"); return
+    OUT.mkdir(exist_ok=True)
+
+    hashes, stats = pdf_fingerprints(pdfs, load_manifest(fp_out))
+    hashes = _backend_hashes(hashes, backend)
+    todo, drop, skipped, rebuild = _plan(hashes, fp_out, full=full)
+    if not rebuild and not todo and not drop:
+        print("✅ sentences.parquet up to date")
+        _report_skipped(skipped); return
+
+    workers = workers or os.cpu_count()
+    REPORT.note(bytes_read=sum(_size(DATA / name) for name in todo))
+    shards  = _shards([DATA / name for name in todo], pages_per_shard, backend)
+    target  = fp_out if rebuild else fp_out.with_name("sentences.new.parquet")
+    rows    = _write_batches(_run_ordered(partial(_extract_shard, backend=backend),
+                                          shards, workers),
+                             target, SENTENCE_SCHEMA)
+    if not rebuild:
+        new = pq.read_table(target) if rows else None
+        rows_total = _merge_into(fp_out, new, drop).num_rows
+        target.unlink(missing_ok=True)
+    else:
+        rows_total = rows
+    if not rows_total:
+        print("⚠️  No text extracted — check if PDFs exist in data/"); return
+
+    save_manifest(fp_out, hashes, stat=stats)
+    REPORT.note(rows_out=rows)
+    print(f"✅ wrote {rows:,} rows from {len(todo)} file(s) with {backend} → "
+          f"out/sentences.parquet ({rows_total:,} rows)")
+    _report_skipped(skipped)
+
+# ---------------------------------------------------------------------------
+#  VECTORISED STRING HELPERS  (shared by stages 2-4)
+# ---------------------------------------------------------------------------
+#  Patterns run as RE2 kernels over a whole arrow column (pyarrow.compute).
+#  RE2's \b, \s and \d are ASCII-only, so they are spelled out with Unicode
+#  classes to agree with Python's re on umlauts, NBSPs etc.  The word class
+#  follows the regex module's \w (letters, combining marks, digits, connector
+#  punctuation, ZWJ/ZWNJ), so a keyword followed by a combining accent is
+#  not a whole-word hit.  The consuming boundary class is fine for "does it match" tests and
+#  for replacements that don't touch \b.
+_RE2_BOUNDARY = r"(?:^|$|[^\pL\pM\p{Nd}\p{Nl}\p{Pc}\x{200C}\x{200D}])"
+_RE2_SPACE    = r"[\t-\r\x1c-\x1f\x{85}\pZ]"
+
+def _re2_pattern(pat: str) -> str:
+    return (pat.replace(r"\b", _RE2_BOUNDARY)
+               .replace(r"\s", _RE2_SPACE)
+               .replace(r"\d", r"\p{Nd}"))
+
+def _re2_prefilter(pat: str) -> str:
+    # keeps the ASCII \b: a superset of the Unicode boundary for ASCII
+    # keywords, and it keeps RE2 on its fast DFA path for big alternations
+    return pat.replace(r"\s", _RE2_SPACE).replace(r"\d", r"\p{Nd}")
+
+def _as_arrow(texts):
+    if isinstance(texts, (pa.Array, pa.ChunkedArray)):
+        return texts
+    return pa.array(texts, type=pa.large_string())
+
+def _fold_dotted_i(arr):
+    # the one fold of an ASCII letter RE2 lacks: regex matches İ (U+0130) as i
+    return pc.replace_substring(arr, "\u0130", "I")
+
+def _matches(arr, pat: str, ignore_case: bool = True) -> np.ndarray:
+    """Boolean numpy mask: does each string contain *pat* (Python-re semantics)?"""
+    return pc.match_substring_regex(arr, _re2_pattern(pat), ignore_case=ignore_case) \
+             .to_numpy(zero_copy_only=False).astype(bool)
 
 # ---------------------------------------------------------------------------
 # 2 · CLEAN
 # ---------------------------------------------------------------------------
-def clean_text():
-    fp_in  = OUT / "sentences.parquet"
-    fp_out = OUT / "sentences_clean.parquet"
-    if not fp_in.exists():
-        print("⚠️  run 'extract' first"); return
-    df = pd.read_parquet(fp_in)
+def fix_commas(s: str) -> str:
+    """Reference per-sentence cleaner (see clean_series for the fast path)."""
+    s = re.sub(r'(\d),(\d{3})', r'\1\2', s)  # 1,234 → 1234
+    return s.replace(",", ".")               # 18,3 → 18.3
 
-    def fix_commas(s: str) -> str:
-        s = re.sub(r'(\d),(\d{3})', r'\1\2', s)  # 1,234 → 1234
-        return s.replace(",", ".")               # 18,3 → 18.3
+def clean_series(texts: pd.Series) -> pd.Series:
+    """Vectorised fix_commas over a whole column."""
+    arr = _as_arrow(texts)
+    arr = pc.replace_substring_regex(arr, _re2_pattern(r'(\d),(\d{3})'), r'\1\2')
+    arr = pc.replace_substring(arr, ",", ".")
+    out = arr.to_pandas().astype(texts.dtype)
+    out.index, out.name = texts.index, texts.name
+    return out
 
-    df["text"] = df["text"].map(fix_commas)
-    df.to_parquet(fp_out)
-    print("✅ cleaned →", fp_out.name)
+def _clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df["text"] = clean_series(df["text"])
+    return df
+
+def clean_text(full: bool = False):
+    fp_in  = OUT / "sentences.parquet"
+    fp_out = OUT / "sentences_clean.parquet"
+    if _run_stage(fp_in, fp_out, _clean_frame, "extract", full=full) is not None:
+        print("✅ cleaned →", fp_out.name)
 
 # ---------------------------------------------------------------------------
 # 3 · CLASSIFY  (tiny keyword fallback)
@@ -140,197 +638,1493 @@ KEYWORDS = {
     # "Industry": r"\b(industry|industrial|manufacturing|factory|plant|production|industrial output|processing sector)\b",
 }
 
-def classify_text():
+def label(row: str) -> str:
+    """Reference per-sentence classifier (first topic in KEYWORDS order)."""
+    import regex as re2
+    for topic, pat in KEYWORDS.items():
+        if re2.search(pat, row, flags=re2.I):
+            return topic
+    return "Other"
+
+def topic_masks(texts, first_only: bool = False) -> tuple:
+    """
+    → (topics, masks) where masks[i, j] says sentence i mentions topics[j].
+    One fused "any topic" pass throws out the sentences that match nothing,
+    then one pass per topic runs over the survivors.  With first_only=True a
+    sentence also leaves the later passes as soon as it has matched (enough
+    for single-label classification).
+    """
+    arr    = _fold_dotted_i(_as_arrow(texts))
+    topics = list(KEYWORDS)
+    masks  = np.zeros((len(arr), len(topics)), dtype=bool)
+    if not len(arr):
+        return topics, masks
+
+    prefilter = "|".join(f"(?:{_re2_prefilter(p)})" for p in KEYWORDS.values())
+    hit = pc.match_substring_regex(arr, prefilter, ignore_case=True) \
+            .to_numpy(zero_copy_only=False).astype(bool)
+    idx = np.flatnonzero(hit)
+    for j, pat in enumerate(KEYWORDS.values()):
+        if not idx.size:
+            break
+        m = _matches(arr.take(pa.array(idx)), pat)
+        masks[idx, j] = m
+        if first_only:
+            idx = idx[~m]
+    return topics, masks
+
+def classify_series(texts: pd.Series, multi_label: bool = False):
+    """
+    Vectorised label(): first matching topic in KEYWORDS order, else "Other".
+    With multi_label=True also returns every matching topic per sentence.
+    """
+    topics, masks = topic_masks(texts, first_only=not multi_label)
+    first = np.where(masks.any(axis=1), masks.argmax(axis=1), len(topics))
+    return _topic_columns(topics, masks, first, texts.index, multi_label)
+
+def _topic_columns(topics, masks, first, index, multi_label):
+    """topic Series from each row's chosen topic number (len(topics) = Other)."""
+    names = np.array(topics + ["Other"], dtype=object)
+    topic = pd.Series(names[first], index=index, name="topic")
+    if not multi_label:
+        return topic
+    # each row's mask → bit code → list of names (≤ 2^len(topics) combos)
+    codes  = masks.astype(np.int64) @ (1 << np.arange(len(topics), dtype=np.int64))
+    combos = {c: [t for j, t in enumerate(topics) if c >> j & 1] or ["Other"]
+              for c in np.unique(codes).tolist()}
+    all_topics = pd.Series(codes, index=index).map(combos).rename("topics")
+    return topic, all_topics
+
+CLASSIFIERS = ("keywords", "embed")
+
+def _classifier(method: str) -> str:
+    """The classifier that will actually run (embed needs sentence-transformers)."""
+    if method == "embed" and not embed_available():
+        print("⚠️  sentence-transformers not installed – using the keyword classifier")
+        return "keywords"
+    return method
+
+def _classify_config(multi_label: bool = False, method: str = "keywords",
+                     model: str = None):
+    # a new keyword map invalidates every row, not just new files
+    config = {"keywords": KEYWORDS, "multi_label": multi_label}
+    if method == "embed":
+        config.update(method=method, model=model or EMBED_MODEL, min_sim=EMBED_MIN_SIM)
+    return config
+
+def _classify_frame(df: pd.DataFrame, multi_label: bool = False,
+                    method: str = "keywords", model: str = None) -> pd.DataFrame:
+    if method == "embed":
+        series = partial(embed_classify_series, model=model or EMBED_MODEL)
+    else:
+        series = classify_series
+    if multi_label:
+        df["topic"], df["topics"] = series(df["text"], multi_label=True)
+    else:
+        df["topic"] = series(df["text"])
+    return df
+
+def classify_text(full: bool = False, multi_label: bool = False,
+                  method: str = "keywords", model: str = None):
     fp_in  = OUT / "sentences_clean.parquet"
     fp_out = OUT / "sentences_topic.parquet"
-    if not fp_in.exists():
-        print("⚠️  run 'clean' first"); return
-    df = pd.read_parquet(fp_in)
-    def label(row):
-        for topic, pat in KEYWORDS.items():
-            if re2.search(pat, row, flags=re2.I):
-                return topic
-        return "Other"
-    df["topic"] = df["text"].map(label)
-    df.to_parquet(fp_out)
-    print("✅ classified →", fp_out.name)
+    method = _classifier(method)
+    transform = partial(_classify_frame, multi_label=multi_label, method=method, model=model)
+    if _run_stage(fp_in, fp_out, transform, "clean",
+                  _classify_config(multi_label, method, model), full) is not None:
+        print("✅ classified →", fp_out.name)
+
+# ---------------------------------------------------------------------------
+# 3b · CLASSIFY  (sentence embeddings,  --classifier embed)
+# ---------------------------------------------------------------------------
+#  Sentences are encoded on the CPU in large batches and each one goes to
+#  the topic whose centroid – the mean embedding of its seed phrases, i.e.
+#  the topic name plus the terms of its KEYWORDS pattern – is most similar;
+#  below EMBED_MIN_SIM it stays "Other".  Vectors are kept in
+#  out/embeddings/<model>/ as an append-only float16 memmap keyed by a hash
+#  of the sentence, so reruns and new PDFs only encode text never seen before.
+EMBED_MODEL   = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_BATCH   = 256       # sentences per forward pass
+EMBED_CHUNK   = 16_384    # sentences encoded between two appends to the store
+EMBED_MIN_SIM = 0.25
+
+def embed_available() -> bool:
+    import importlib.util
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+def keyword_terms(topic: str) -> list:
+    """The alternatives of a KEYWORDS pattern: ['GW', 'renewable', …] (still regex)."""
+    return re.sub(r"^\\b\(|\)\\b$", "", KEYWORDS[topic]).split("|")
+
+def seed_phrases(topic: str) -> list:
+    """'Energy' → ['Energy', 'GW', 'renewable', …] from its KEYWORDS pattern."""
+    return [topic] + [term.replace(r"\s?", " ") for term in keyword_terms(topic)]
+
+def sentence_keys(texts) -> np.ndarray:
+    """64-bit blake2b hash of every sentence (the store's lookup key)."""
+    return np.frombuffer(b"".join(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest()
+                                  for t in texts), dtype="<u8")
+
+class EmbeddingStore:
+    """
+    vectors.f16  rows × dim float16 (memory-mapped, unit length)
+    keys.u64     sentence hash of each row, in the same order
+    meta.json    model name and dimension
+    Rows are only ever appended, so a row number stays valid for good.
+    """
+    def __init__(self, root: Path, model_name: str = EMBED_MODEL):
+        self.root       = root / re.sub(r"[^\w.-]+", "_", model_name)
+        self.model_name = model_name
+        self._model     = None
+        self._load()
+
+    def _load(self):
+        try:
+            self.dim = json.loads((self.root / "meta.json").read_text(encoding="utf-8"))["dim"]
+        except (OSError, ValueError, KeyError):
+            self.dim = None
+        fp_keys, fp_vecs = self.root / "keys.u64", self.root / "vectors.f16"
+        keys = np.fromfile(fp_keys, dtype="<u8") if fp_keys.exists() else np.zeros(0, "<u8")
+        rows = min(len(keys), fp_vecs.stat().st_size // (2 * self.dim)) if self.dim else 0
+        self.keys    = keys[:rows]                  # a torn append is cut off by _append
+        self._end    = rows                         # rows on disk that the next append follows
+        self.order   = np.argsort(self.keys, kind="stable")
+        self.sorted  = self.keys[self.order]
+        self.vectors = np.memmap(fp_vecs, dtype=np.float16, mode="r",
+                                 shape=(rows, self.dim)) if rows else None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Row of each key in the store, -1 where it isn't stored yet."""
+        if not len(self.sorted):
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sorted, keys), len(self.sorted) - 1)
+        return np.where(self.sorted[pos] == keys, self.order[pos], -1)
+
+    def _append(self, keys: np.ndarray, vectors: np.ndarray):
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            (self.root / "meta.json").write_text(
+                json.dumps({"model": self.model_name, "dim": self.dim}), encoding="utf-8")
+        # vectors first: keys without vectors are dropped again by _load.  Both
+        # files are cut back to the last complete row, so the tail of an
+        # interrupted append can't shift every row written after it.
+        for name, width, data in (
+                ("vectors.f16", 2 * self.dim,
+                 np.ascontiguousarray(vectors, dtype=np.float16).tobytes()),
+                ("keys.u64", 8, keys.astype("<u8").tobytes())):
+            with open(self.root / name, "ab") as f:
+                f.truncate(self._end * width)
+                f.write(data)
+        self._end += len(keys)
+
+    def ensure(self, texts) -> np.ndarray:
+        """Store rows of *texts*, encoding (and appending) only unseen sentences."""
+        texts = list(texts)
+        keys  = sentence_keys(texts)
+        rows  = self.lookup(keys)
+        missing = np.flatnonzero(rows < 0)
+        if not missing.size:
+            return rows
+        _, first = np.unique(keys[missing], return_index=True)
+        todo = np.sort(missing[first])              # each new sentence once
+        for i in range(0, len(todo), EMBED_CHUNK):
+            part = todo[i:i + EMBED_CHUNK]
+            vecs = self.model.encode([texts[j] for j in part], batch_size=EMBED_BATCH,
+                                     normalize_embeddings=True, convert_to_numpy=True)
+            self._append(keys[part], vecs)
+        print(f"   ↳ encoded {len(todo):,} new sentence(s) with {self.model_name}")
+        self._load()
+        return self.lookup(keys)
+
+    def vectors_for(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+_EMBED_STORES = {}
+
+def embedding_store(model: str = EMBED_MODEL) -> EmbeddingStore:
+    key = (OUT, model)
+    if key not in _EMBED_STORES:
+        _EMBED_STORES[key] = EmbeddingStore(OUT / "embeddings", model)
+    return _EMBED_STORES[key]
+
+def topic_centroids(store: EmbeddingStore) -> tuple:
+    """→ (topics, unit centroid per topic) from the seed phrases."""
+    topics = list(KEYWORDS)
+    seeds  = [seed_phrases(t) for t in topics]
+    rows   = store.ensure([phrase for group in seeds for phrase in group])
+    bounds = np.cumsum([0] + [len(group) for group in seeds])
+    centroids = np.stack([store.vectors_for(rows[lo:hi]).mean(axis=0)
+                          for lo, hi in zip(bounds[:-1], bounds[1:])])
+    return topics, centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+def embed_classify_series(texts: pd.Series, multi_label: bool = False,
+                          model: str = EMBED_MODEL, min_sim: float = EMBED_MIN_SIM):
+    """
+    Embedding counterpart of classify_series: most similar topic centroid
+    (cosine ≥ min_sim), else "Other"; multi_label lists every topic ≥ min_sim.
+    """
+    store = embedding_store(model)
+    topics, centroids = topic_centroids(store)
+    rows = store.ensure(texts.tolist())
+    sims = np.empty((len(rows), len(topics)), dtype=np.float32)
+    for i in range(0, len(rows), EMBED_CHUNK):
+        sims[i:i + EMBED_CHUNK] = store.vectors_for(rows[i:i + EMBED_CHUNK]) @ centroids.T
+    masks = sims >= min_sim
+    first = np.where(masks.any(axis=1), sims.argmax(axis=1), len(topics))
+    return _topic_columns(topics, masks, first, texts.index, multi_label)
 
 # ---------------------------------------------------------------------------
 # 4 · TIME-BIN TAGGING
 # ---------------------------------------------------------------------------
-def tag_timeline():
+PAST_UNTIL    = 2022     # latest year still counted as "Past"
+PRESENT_UNTIL = 2024     # latest year still counted as "Present"
+
+YEAR_PAT    = r'\b((?:19|20)\d{2})\b'
+FUTURE_PAT  = r'\bwill\b|\btarget\b|\bby 20\d{2}\b'
+PRESENT_PAT = r'\bhas\b|\bis\b'
+
+def time_bin(sentence: str, past_until: int = PAST_UNTIL,
+             present_until: int = PRESENT_UNTIL) -> str:
+    """Reference per-sentence tagger (see time_bins for the fast path)."""
+    yrs = re.findall(YEAR_PAT, sentence)
+    if yrs:
+        y = max(map(int, yrs))
+        if y <= past_until: return "Past"
+        if y <= present_until: return "Present"
+        return "Future"
+    if re.search(FUTURE_PAT, sentence, re.I):
+        return "Future"
+    if re.search(PRESENT_PAT, sentence, re.I):
+        return "Present"
+    return "Past"
+
+def _years_pattern(lo: int, hi: int):
+    """\b(?:lo|…|hi)\b restricted to the 1900-2099 years YEAR_PAT can see."""
+    years = range(max(lo, 1900), min(hi, 2099) + 1)
+    return r"\b(?:" + "|".join(map(str, years)) + r")\b" if len(years) else None
+
+def time_bins(texts: pd.Series, past_until: int = PAST_UNTIL,
+              present_until: int = PRESENT_UNTIL) -> pd.Series:
+    """
+    Vectorised time_bin over a whole column.  Instead of extracting every
+    year and taking the max per row, each bucket's year range becomes one
+    literal alternation that RE2 checks in a single pass: any Future-range
+    year wins, then any Present-range year, then any year at all → Past.
+    """
+    arr = _as_arrow(texts)
+
+    def mentions(lo, hi):
+        pat = _years_pattern(lo, hi)
+        return _matches(arr, pat, ignore_case=False) if pat \
+            else np.zeros(len(arr), dtype=bool)
+
+    future_year  = mentions(max(past_until, present_until) + 1, 2099)
+    present_year = mentions(past_until + 1, present_until)
+    any_year     = _matches(arr, YEAR_PAT, ignore_case=False)
+    bins = np.select(
+        [future_year, present_year, any_year,
+         _matches(arr, FUTURE_PAT),
+         _matches(arr, PRESENT_PAT)],
+        ["Future", "Present", "Past", "Future", "Present"],
+        default="Past")
+    return pd.Series(bins.astype(object), index=texts.index, name="time_bin")
+
+def _timeline_config(past_until: int = PAST_UNTIL, present_until: int = PRESENT_UNTIL):
+    return {"past_until": past_until, "present_until": present_until}
+
+def _time_frame(df: pd.DataFrame, past_until: int = PAST_UNTIL,
+                present_until: int = PRESENT_UNTIL) -> pd.DataFrame:
+    df["time_bin"] = time_bins(df["text"], past_until, present_until)
+    return df
+
+def tag_timeline(full: bool = False, past_until: int = PAST_UNTIL,
+                 present_until: int = PRESENT_UNTIL):
     fp_in  = OUT / "sentences_topic.parquet"
     fp_out = OUT / "sentences_time.parquet"
+    transform = partial(_time_frame, past_until=past_until, present_until=present_until)
+    if _run_stage(fp_in, fp_out, transform, "classify",
+                  _timeline_config(past_until, present_until), full) is not None:
+        print("✅ timeline tags →", fp_out.name)
+        refresh_partitions()
+
+# ---------------------------------------------------------------------------
+# 4b · NUMERIC FACTS → CHART DATA
+# ---------------------------------------------------------------------------
+#  Every "<number> <unit>" in the timeline table (shares, capacities, euro
+#  amounts) is pulled out in one columnar pass, normalised to one unit per
+#  kind and aggregated per topic × time bin into out/chart_data.parquet – a
+#  few dozen rows the chart build reads instead of parsing each story file.
+#  A fact's year is the latest year its sentence mentions (as in time_bin).
+#  Patterns are ASCII-only on purpose so Python's re (the reference) and
+#  RE2 (the fast path) agree exactly.
+_SP    = "[ \t\u00a0\u202f]*"                  # plain / no-break / thin spaces
+_CUR   = r"€|eur\b|euros?\b"
+_UNIT  = (r"%|per ?cent\b|percent\b|percentage points?\b|gw\b|gigawatts?\b|"
+          r"mw\b|megawatts?\b|bn\b|billion\b|mn\b|million\b")
+FACT_PAT = (f"(?:(?P<pre>{_CUR}){_SP})?(?P<num>[-−]?\\d+(?:\\.\\d+)?){_SP}"
+            f"(?P<unit>{_UNIT})(?:{_SP}(?P<post>{_CUR}))?")
+DOWN_PAT = (r"\b(?:fell|fall(?:s|ing)?|drop(?:s|ped)?|declin(?:e|ed|es|ing)|"
+            r"decreas(?:e|ed|es|ing)|shr[ai]nk(?:s)?|contract(?:ed|ion)|lower|minus)\b")
+
+# spelled unit → (chart unit, factor); money units only count next to a currency
+FACT_UNITS = {"%": ("%", 1.0), "percent": ("%", 1.0), "per cent": ("%", 1.0),
+              "percentage point": ("pp", 1.0), "percentage points": ("pp", 1.0),
+              "gw": ("GW", 1.0), "gigawatt": ("GW", 1.0), "gigawatts": ("GW", 1.0),
+              "mw": ("GW", 1e-3), "megawatt": ("GW", 1e-3), "megawatts": ("GW", 1e-3),
+              "bn": ("bn €", 1.0), "billion": ("bn €", 1.0),
+              "mn": ("bn €", 1e-3), "million": ("bn €", 1e-3)}
+SIGNED_UNITS = ("%", "pp")                     # "fell by 3 %" → -3
+SHARE_LIMIT  = 1000                            # a "2019 %" is a year, not a share
+CHART_DATA   = "chart_data.parquet"
+
+def _fact(pre, num, unit, post, down: bool):
+    unit, factor = FACT_UNITS[unit.lower()]
+    if unit == "bn €" and not (pre or post):
+        return None                            # "2 million people" is no amount
+    value = float(num.replace("−", "-")) * factor
+    if unit in SIGNED_UNITS and abs(value) > SHARE_LIMIT:
+        return None
+    if down and unit in SIGNED_UNITS and value > 0:
+        value = -value
+    return value, unit
+
+def numeric_facts(sentence: str) -> list:
+    """Reference per-sentence extractor → [(value, unit, year), …] (see fact_table)."""
+    yrs  = re.findall(YEAR_PAT, sentence)
+    year = max(map(int, yrs)) if yrs else None
+    down = re.search(DOWN_PAT, sentence, re.I) is not None
+    out  = []
+    for m in re.finditer(r"(?<![\w.])" + FACT_PAT, sentence, re.I | re.A):
+        fact = _fact(*m.group("pre", "num", "unit", "post"), down)
+        if fact:
+            out.append((*fact, year))
+    return out
+
+def _sentence_years(arr) -> np.ndarray:
+    """Latest YEAR_PAT year per string (0 = none), from its word tokens."""
+    words  = pc.split_pattern_regex(arr, r"[^\pL\pN_]+")
+    parent = pc.list_parent_indices(words).to_numpy()
+    tokens = pc.list_flatten(words)
+    keep   = pc.match_substring_regex(tokens, r"^(?:19|20)[0-9]{2}$").to_numpy(zero_copy_only=False)
+    years  = np.zeros(len(arr), dtype=np.int64)
+    np.maximum.at(years, parent[keep], pc.cast(tokens.filter(keep), pa.int64()).to_numpy())
+    return years
+
+def fact_table(texts) -> pd.DataFrame:
+    """
+    Vectorised numeric_facts over a whole column → one row per fact with the
+    position of its sentence (row), value, unit and year (<NA> = no year).
+    Each fact is marked with \\x1f in place, the strings are split there and
+    every piece is parsed from its start – all RE2 kernels, no Python loop.
+    """
+    arr  = _as_arrow(texts)
+    arr  = arr.combine_chunks() if isinstance(arr, pa.ChunkedArray) else arr
+    cols = {"row": np.zeros(0, np.int64), "value": np.zeros(0), "unit": [], "year": []}
+    if not len(arr):
+        return pd.DataFrame(cols).astype({"year": "Int16"})
+    has  = pc.match_substring_regex(arr, f"[0-9]{_SP}(?:{_UNIT})", ignore_case=True)
+    rows = np.flatnonzero(has.to_numpy(zero_copy_only=False))
+    sub  = arr.take(pa.array(rows))
+    plain  = re.sub(r"\(\?P<\w+>", "(?:", FACT_PAT)
+    marked = pc.replace_substring_regex(sub, f"(?i)(^|[^0-9A-Za-z_.])({plain})", "\\1\x1f\\2")
+    pieces = pc.list_slice(pc.split_pattern(marked, "\x1f"), 1)
+    parent = pc.list_parent_indices(pieces).to_numpy()
+    found  = pc.extract_regex(pc.list_flatten(pieces), f"(?i)^{FACT_PAT}")
+    pre, num, unit, post = (found.field(k) for k in ("pre", "num", "unit", "post"))
+
+    spelled = pc.dictionary_encode(pc.utf8_lower(unit))      # a handful of spellings
+    codes   = spelled.indices.to_numpy()
+    kinds   = [FACT_UNITS[u] for u in spelled.dictionary.to_pylist()]
+    chart   = np.array([k[0] for k in kinds], dtype=object)[codes]
+    factor  = np.array([k[1] for k in kinds], dtype=np.float64)[codes]
+    value   = pc.cast(pc.replace_substring(num, "−", "-"), pa.float64()).to_numpy() * factor
+    signed  = np.isin(chart, SIGNED_UNITS)
+    flip    = _matches(sub, DOWN_PAT)[parent] & signed & (value > 0)
+    value[flip] = -value[flip]
+    curr    = (pc.utf8_length(pre).to_numpy() > 0) | (pc.utf8_length(post).to_numpy() > 0)
+    ok      = ((chart != "bn €") | curr) & ~(signed & (np.abs(value) > SHARE_LIMIT))
+    years   = _sentence_years(sub)[parent[ok]]
+    return pd.DataFrame({"row": rows[parent[ok]], "value": value[ok], "unit": chart[ok],
+                         "year": pd.Series(years, dtype="Int16").mask(years == 0)})
+
+def chart_rows(facts: pd.DataFrame, topics: np.ndarray, bins: np.ndarray) -> pd.DataFrame:
+    """Facts → one row per topic × time bin × unit with count, spread and median year."""
+    df = facts.assign(topic=topics[facts["row"]], time_bin=bins[facts["row"]])
+    g  = df.groupby(["topic", "time_bin", "unit"], sort=True)
+    out = g["value"].agg(facts="size", value="median", mean="mean", low="min", high="max")
+    out["sentences"] = g["row"].nunique()
+    out["year"]      = g["year"].median().round().astype("Int16")
+    return out.reset_index()
+
+def _chart_data_source() -> str:
+    fp = OUT / "sentences_time.parquet"
+    return json.dumps({"mtime": fp.stat().st_mtime, "size": fp.stat().st_size,
+                       "facts": {"pattern": FACT_PAT, "down": DOWN_PAT, "units": FACT_UNITS,
+                                 "share_limit": SHARE_LIMIT}},
+                      sort_keys=True)
+
+def chart_data_fresh() -> bool:
+    try:
+        meta = pq.read_schema(OUT / CHART_DATA).metadata or {}
+    except OSError:
+        return False
+    return meta.get(b"storylab_source") == _chart_data_source().encode()
+
+def extract_facts(full: bool = False):
+    fp_in, fp_out = OUT / "sentences_time.parquet", OUT / CHART_DATA
     if not fp_in.exists():
-        print("⚠️  run 'classify' first"); return
-    df = pd.read_parquet(fp_in)
-
-    def time_bin(sentence: str) -> str:
-        yrs = re.findall(r'\b(19|20)\d{2}\b', sentence)
-        if yrs:
-            y = max(map(int, yrs))
-            if y <= 2022: return "Past"
-            if y in (2023, 2024): return "Present"
-            return "Future"
-        if re.search(r'\bwill\b|\btarget\b|\bby 20\d{2}\b', sentence, re.I):
-            return "Future"
-        if re.search(r'\bhas\b|\bis\b', sentence, re.I):
-            return "Present"
-        return "Past"
-
-    df["time_bin"] = df["text"].map(time_bin)
-    df.to_parquet(fp_out)
-    print("✅ timeline tags →", fp_out.name)
-
-# load TEXT lazily when story step runs
-TEXT = None
+        print("⚠️  run 'timeline' first"); return
+    if not full and chart_data_fresh():
+        print(f"✅ {CHART_DATA} up to date"); return
+    table = pq.read_table(fp_in, columns=["text", "topic", "time_bin"])
+    REPORT.note(bytes_read=_size(fp_in), rows_in=table.num_rows)
+    facts = fact_table(table["text"])
+    data  = chart_rows(facts, *(table[c].cast(pa.string()).to_numpy(zero_copy_only=False)
+                                for c in ("topic", "time_bin")))
+    out = pa.Table.from_pandas(data, preserve_index=False)
+    out = out.replace_schema_metadata({**out.schema.metadata,
+                                       b"storylab_source": _chart_data_source()})
+    pq.write_table(out, fp_out)
+    REPORT.note(rows_out=len(data), bytes_written=_size(fp_out))
+    print(f"✅ {len(facts):,} numeric facts → {len(data)} chart rows → {fp_out.name}")
+
+# ---------------------------------------------------------------------------
+# 1-4 · FUSED STREAMING RUN   (python story.py all --fused)
+# ---------------------------------------------------------------------------
+#  Extraction shards are re-batched into ≤ FUSED_BATCH_ROWS rows and pushed
+#  through clean → classify → time-bin in memory; only sentences_time.parquet
+#  is written, one row group per batch.  --keep-intermediate also streams the
+#  three intermediate tables out (debugging only).
+FUSED_BATCH_ROWS = 50_000
+
+TOPIC_SCHEMA = SENTENCE_SCHEMA.append(pa.field("topic", LABEL_TYPE))
+TIME_SCHEMA  = TOPIC_SCHEMA.append(pa.field("time_bin", LABEL_TYPE))
+TOPICS_FIELD = pa.field("topics", pa.list_(pa.string()))   # --multi-label only
+
+def _fused_schemas(multi_label: bool = False) -> tuple:
+    """(topic, time) table schemas, with the topics list column if multi-label."""
+    if not multi_label:
+        return TOPIC_SCHEMA, TIME_SCHEMA
+    topic = TOPIC_SCHEMA.append(TOPICS_FIELD)
+    return topic, topic.append(pa.field("time_bin", LABEL_TYPE))
+
+def _fused_config(past_until: int = PAST_UNTIL, present_until: int = PRESENT_UNTIL,
+                  method: str = "keywords", model: str = None, multi_label: bool = False):
+    """Manifest configs of the chain, the same ones the staged run writes."""
+    clean = _chain_config(None, None)
+    topic = _chain_config(_classify_config(multi_label, method, model), clean)
+    return {"sentences": None, "clean": clean, "topic": topic,
+            "time": _chain_config(_timeline_config(past_until, present_until), topic)}
+
+def _rebatch(batches, size=FUSED_BATCH_ROWS):
+    """Merge small column-dict batches into ones of at least *size* rows."""
+    buf = None
+    for cols in batches:
+        if buf is None:
+            buf = {k: [] for k in cols}
+        for k, v in cols.items():
+            buf[k].extend(v)
+        if len(buf["text"]) >= size:
+            yield buf
+            buf = None
+    if buf and buf["text"]:
+        yield buf
+
+def run_fused(workers: int = 1, pages_per_shard: int = PAGES_PER_SHARD,
+              full: bool = False, keep_intermediate: bool = False,
+              past_until: int = PAST_UNTIL, present_until: int = PRESENT_UNTIL,
+              method: str = "keywords", model: str = None,
+              backend: str = DEFAULT_BACKEND, multi_label: bool = False):
+    fp_final = OUT / "sentences_time.parquet"
+    pdfs     = sorted(DATA.glob("*.pdf"))
+    if not pdfs:
+        print("⚠️  No text extracted — check if PDFs exist in data/"); return
+    OUT.mkdir(exist_ok=True)
+
+    method = _classifier(method)
+    hashes, stats = pdf_fingerprints(pdfs, load_manifest(fp_final))
+    hashes = _backend_hashes(hashes, backend)
+    config = _fused_config(past_until, present_until, method, model, multi_label)
+    topic_schema, time_schema = _fused_schemas(multi_label)
+    todo, drop, skipped, rebuild = _plan(hashes, fp_final, config["time"], full)
+    if not rebuild and not todo and not drop:
+        print("✅ sentences_time.parquet up to date")
+        _report_skipped(skipped)
+        refresh_partitions(); return
+
+    # (key, output, schema, manifest config, transform applied before writing)
+    chain = [
+        ("sentences", OUT / "sentences.parquet",       SENTENCE_SCHEMA, config["sentences"], None),
+        ("clean",     OUT / "sentences_clean.parquet", SENTENCE_SCHEMA, config["clean"],     _clean_frame),
+        ("topic",     OUT / "sentences_topic.parquet", topic_schema,    config["topic"],
+         partial(_classify_frame, multi_label=multi_label, method=method, model=model)),
+        ("time",      fp_final,                        time_schema,     config["time"],
+         partial(_time_frame, past_until=past_until, present_until=present_until)),
+    ]
+    keep = {"time"} | ({"sentences", "clean", "topic"} if keep_intermediate else set())
+    targets = {key: fp if rebuild else fp.with_name(fp.stem + ".new.parquet")
+               for key, fp, *_ in chain if key in keep}
+    tmp     = {key: path.with_suffix(".tmp") for key, path in targets.items()}
+    writers = {key: pq.ParquetWriter(tmp[key], schema)
+               for key, _, schema, *_ in chain if key in keep}
+    rows = 0
+    REPORT.note(bytes_read=sum(_size(DATA / name) for name in todo))
+    try:
+        workers = workers or os.cpu_count()
+        shards  = _shards([DATA / name for name in todo], pages_per_shard, backend)
+        extract = partial(_extract_shard, backend=backend)
+        for cols in _rebatch(_run_ordered(extract, shards, workers)):
+            df = pd.DataFrame(cols)
+            for key, _, schema, _, transform in chain:
+                if transform is not None:
+                    df = transform(df)
+                if key in writers:
+                    writers[key].write_table(
+                        pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            rows += len(df)
+    finally:
+        for w in writers.values():
+            w.close()
+
+    for key, fp, _, config, _ in chain:
+        if key not in keep:
+            continue
+        tmp[key].replace(targets[key])
+        REPORT.note(bytes_written=_size(targets[key]))
+        if rebuild:
+            save_manifest(fp, hashes, config, stat=stats)
+        elif fp.exists():
+            _merge_into(fp, pq.read_table(targets[key]) if rows else None, drop)
+            targets[key].unlink()
+            save_manifest(fp, hashes, config, stat=stats)
+        else:
+            # an intermediate that was never materialised can't be patched
+            targets[key].unlink()
+            print(f"   ⚠️  {fp.name} not written – rerun with --full to materialise it")
+
+    REPORT.note(rows_out=rows)
+    print(f"✅ fused run: {rows:,} rows from {len(todo)} file(s) → {fp_final.name}")
+    _report_skipped(skipped)
+    refresh_partitions()
+
+# ---------------------------------------------------------------------------
+#  TOPIC PARTITIONS + SNIPPET RANKING
+# ---------------------------------------------------------------------------
+#  sentences_time.parquet is mirrored as a hive-style tree
+#     out/sentences_time_by_topic/topic=<T>/time_bin=<B>/part-0.parquet
+#  so a story only opens the files of its own topic.  _source.json records
+#  which version of the table (and ranking) the tree was cut from; a stale
+#  tree is ignored.
+#
+#  Each partition is stored best snippet first, so picking the snippets for
+#  a prompt reads the first row batch or two of a file and stops.  A
+#  sentence's score is BM25 against its topic's keyword terms (document
+#  frequencies counted within the topic) plus a bonus for the numbers it
+#  quotes, which the story prompt asks the model to use.
+BM25_K1, BM25_B = 1.5, 0.75
+NUMBER_WEIGHT   = 1.0
+NUMBER_PAT      = r"\d+(?:[.,]\d+)?"
+
+def _rank_config():
+    return {"keywords": KEYWORDS, "k1": BM25_K1, "b": BM25_B,
+            "number_weight": NUMBER_WEIGHT}
+
+def snippet_scores(texts, topics: np.ndarray) -> np.ndarray:
+    """Relevance of every sentence to its own topic (higher = better snippet)."""
+    arr   = _as_arrow(texts)
+    count = lambda a, pat, **kw: np.asarray(pc.count_substring_regex(a, pat, **kw),
+                                            dtype=np.float64)
+    if not len(arr):
+        return np.zeros(0)
+    words = np.maximum(count(arr, r"\S+"), 1)
+    score = NUMBER_WEIGHT * np.log1p(count(arr, _re2_pattern(NUMBER_PAT)))
+    for topic in KEYWORDS:
+        idx = np.flatnonzero(topics == topic)
+        if not idx.size:
+            continue
+        sub, dl = arr.take(pa.array(idx)), words[idx]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / dl.mean())
+        for term in keyword_terms(topic):
+            tf = count(sub, _re2_prefilter(rf"\b(?:{term})\b"), ignore_case=True)
+            n  = np.count_nonzero(tf)
+            if n:
+                idf = np.log(1 + (len(idx) - n + 0.5) / (n + 0.5))
+                score[idx] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return score
+
+def rank_order(score: np.ndarray, page: np.ndarray) -> np.ndarray:
+    """Row positions best first; ties → higher page first, then table order."""
+    return np.lexsort((np.arange(len(score)), -page.astype(np.int64), -score))
+
+def _partition_dir() -> Path:
+    return OUT / "sentences_time_by_topic"
+
+def _partition_source() -> dict:
+    fp = OUT / "sentences_time.parquet"
+    return {"mtime": fp.stat().st_mtime, "size": fp.stat().st_size,
+            "ranking": _rank_config()}
+
+def _partition_file(topic: str, bucket: str) -> Path:
+    return (_partition_dir() / f"topic={quote(topic, safe='')}"
+            / f"time_bin={quote(bucket, safe='')}" / "part-0.parquet")
+
+def partitions_fresh() -> bool:
+    try:
+        meta = json.loads((_partition_dir() / "_source.json").read_text(encoding="utf-8"))
+        return meta == _partition_source()
+    except (OSError, ValueError):
+        return False
+
+def write_partitions() -> int:
+    """Rewrite the ranked topic/time_bin tree from sentences_time.parquet. Returns #parts."""
+    root  = _partition_dir()
+    tmp   = root.with_name(root.name + ".tmp")
+    table = _narrow(pq.read_table(OUT / "sentences_time.parquet"))
+    REPORT.note(bytes_read=_size(OUT / "sentences_time.parquet"))
+    score = snippet_scores(table["text"], table["topic"].cast(pa.string()).to_numpy())
+    order = rank_order(score, table["page"].to_numpy())
+    table = table.take(order).append_column("score", pa.array(score[order], pa.float32()))
+    topic, tbin = table["topic"].cast(pa.string()), table["time_bin"].cast(pa.string())
+    combos = pa.table({"topic": topic, "time_bin": tbin}) \
+               .group_by(["topic", "time_bin"]).aggregate([]).to_pylist()
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    for c in sorted(combos, key=lambda c: (c["topic"], c["time_bin"])):
+        part = table.filter(pc.and_(pc.equal(topic, c["topic"]), pc.equal(tbin, c["time_bin"])))
+        d = tmp / f"topic={quote(c['topic'], safe='')}" / f"time_bin={quote(c['time_bin'], safe='')}"
+        d.mkdir(parents=True)
+        pq.write_table(part.drop_columns(["topic", "time_bin"]), d / "part-0.parquet",
+                       row_group_size=RANKED_ROW_GROUP)
+    tmp.mkdir(exist_ok=True)
+    (tmp / "_source.json").write_text(json.dumps(_partition_source()), encoding="utf-8")
+    shutil.rmtree(root, ignore_errors=True)
+    tmp.rename(root)
+    REPORT.note(bytes_written=_size(root))
+    return len(combos)
+
+def refresh_partitions():
+    if (OUT / "sentences_time.parquet").exists() and not partitions_fresh():
+        n = write_partitions()
+        print(f"✅ {n} topic/time-bin partitions →", _partition_dir().name)
+
+def _sorted_categories(df: pd.DataFrame) -> pd.DataFrame:
+    # dictionary order is first-seen order; sort so categoricals sort like strings
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.set_categories(sorted(df[col].cat.categories))
+    return df
+
+# load TEXT (and its co-occurrence INDEX) lazily when the story step runs
+TEXT   = None
+INDEX  = None
+RANKED = None   # (topic, time_bin) → TEXT row positions, best snippet first
+
+def load_timeline() -> pd.DataFrame:
+    global TEXT, INDEX, RANKED
+    if TEXT is None:
+        TEXT   = _sorted_categories(pd.read_parquet(OUT / "sentences_time.parquet"))
+        REPORT.note(bytes_read=_size(OUT / "sentences_time.parquet"))
+        INDEX  = TopicIndex(TEXT)
+        RANKED = None
+    return TEXT
+
+def _ranked_positions() -> dict:
+    """In-memory ranking of TEXT, used when the partition tree is stale."""
+    global RANKED
+    text = load_timeline()                   # (re)loading TEXT resets RANKED
+    if RANKED is None:
+        score = snippet_scores(text["text"], text["topic"].astype(str).to_numpy())
+        order = rank_order(score, text["page"].to_numpy())
+        groups = text.iloc[order].groupby(["topic", "time_bin"], observed=True, sort=False)
+        RANKED = {key: order[pos] for key, pos in groups.indices.items()}
+    return RANKED
+
+RANKED_ROW_GROUP = 4096   # partition row groups: the top snippets are one small read
+SNIPPET_BATCH    = 16
+
+def ranked_snippets(topic: str, bucket: str):
+    """Yield (text, file, page) of one topic/time bin, best first, lazily."""
+    if TEXT is None and partitions_fresh():
+        fp = _partition_file(topic, bucket)
+        if fp.exists():
+            for b in pq.ParquetFile(fp).iter_batches(batch_size=SNIPPET_BATCH,
+                                                      columns=["text", "file", "page"]):
+                yield from zip(*(b.column(c).to_pylist() for c in ("text", "file", "page")))
+        return
+    pos, text = _ranked_positions().get((topic, bucket), []), TEXT
+    for i in range(0, len(pos), SNIPPET_BATCH):
+        chunk = text.iloc[pos[i:i + SNIPPET_BATCH]]
+        yield from zip(chunk["text"], chunk["file"], chunk["page"])
+
+def warm_ranking():
+    """Have the snippet ranking ready before the first story is asked for."""
+    if not (OUT / "sentences_time.parquet").exists():
+        return
+    refresh_partitions()
+    if not partitions_fresh():
+        _ranked_positions()
+
+def topic_rows(topic: str) -> pd.DataFrame:
+    """Timeline rows of one topic – from TEXT if it is loaded, else its partition."""
+    if TEXT is None and partitions_fresh():
+        return _sorted_categories(
+            pd.read_parquet(_partition_dir(), filters=[("topic", "==", topic)]))
+    text = load_timeline()
+    return text[text.topic == topic]
+
+def timeline_topics() -> list:
+    if TEXT is None and partitions_fresh():
+        return sorted(unquote(d.name.split("=", 1)[1])
+                      for d in _partition_dir().glob("topic=*"))
+    return list(load_timeline().topic.unique())
 
 # ---------------------------------------------------------------------------
 # 5 · Llama-cpp SETUP + make_story()
 # ---------------------------------------------------------------------------
+#  The model sits behind a small backend interface: a backend is a callable
+#  taking (prompt, **sampling) and returning a llama-cpp style completion
+#  dict.  "llama-cpp" is the real thing; "stub" returns deterministic text
+#  instantly so the rest of the pipeline can be run, profiled and tested
+#  without the 4 GB model.  Pick one with --llm / STORYLAB_LLM.
+#
+#  Story and comparison prompts open with a fixed instruction block
+#  (PROMPT_PREFIXES).  llama-cpp itself keeps the KV entries a prompt shares
+#  with the previous one, so consecutive prompts of the same kind already
+#  skip the block.  With --prefix-cache (off by default) the backend also
+#  evaluates each block once, keeps its state (Llama.save_state) and loads
+#  it when a prompt would share less with the cached tokens – e.g. a story
+#  after a comparison.  The block is ~55 tokens of a prompt of hundreds to
+#  thousands, so the gain is small; each call reports only the tokens the
+#  restore added beyond llama-cpp's own reuse, their eval time at the rate
+#  measured when priming, and the time load_state took.
+MODEL_PATH = "models/mistral-7b-instruct-v0.2.Q4_K_M.gguf"
+
+LLM_CONFIG = {
+    "backend":      os.environ.get("STORYLAB_LLM", "llama-cpp"),
+    "model_path":   os.environ.get("STORYLAB_MODEL", MODEL_PATH),
+    "n_ctx":        int(os.environ.get("STORYLAB_N_CTX", 8192)),
+    "n_gpu_layers": int(os.environ.get("STORYLAB_N_GPU_LAYERS", 10)),
+    "n_threads":    int(os.environ.get("STORYLAB_THREADS", 8)),   # per model instance
+    "prefix_cache": os.environ.get("STORYLAB_PREFIX_CACHE", "") == "1",  # --prefix-cache
+    # share of the free context spent on snippets; 0 = SNIPPETS_PER_BUCKET each
+    "snippet_share": float(os.environ.get("STORYLAB_SNIPPET_SHARE", 0)),
+}
+
+def _shared_tokens(a, b) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+class LlamaCppBackend:
+    def __init__(self, model_path=MODEL_PATH, n_ctx=8192, n_gpu_layers=10, n_threads=8,
+                 prefix_cache=False):
+        from llama_cpp import Llama
+        self.model_path = model_path
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_gpu_layers=n_gpu_layers,
+            n_threads=n_threads,
+            verbose=False
+        )
+        self.prefix_cache = prefix_cache
+        self.prefixes   = {}       # instruction block → (tokens, LlamaState, eval seconds)
+        self.last_reuse = None     # prefix stats of the latest call, for the run report
+
+    def _tokens(self, text: str) -> list:
+        # exactly how create_completion tokenizes a prompt (BOS + special tokens)
+        return self.llm.tokenize(text.encode("utf-8"), special=True)
+
+    def _prefix_state(self, prefix: str):
+        """(tokens, state, seconds, primed now?) for an instruction block."""
+        if prefix in self.prefixes:
+            return (*self.prefixes[prefix], False)
+        tokens = self._tokens(prefix)
+        self.llm.reset()
+        t0 = time.perf_counter()
+        self.llm.eval(tokens)
+        self.prefixes[prefix] = (tokens, self.llm.save_state(), time.perf_counter() - t0)
+        return (*self.prefixes[prefix], True)
+
+    def __call__(self, prompt: str, **params):
+        self.last_reuse = None
+        prefix = next((p for p in PROMPT_PREFIXES if prompt.startswith(p)), None) \
+            if self.prefix_cache else None
+        if prefix:
+            wanted = self._tokens(prompt)
+            # what llama-cpp would reuse anyway: the tokens in its KV cache
+            kept = _shared_tokens(self.llm.input_ids[:self.llm.n_tokens].tolist(), wanted)
+            tokens, state, secs, primed = self._prefix_state(prefix)
+            shared = _shared_tokens(tokens, wanted)
+            # priming reset the model, so the block's tokens are all new ones
+            gained = shared if primed else max(shared - kept, 0)
+            load_s = 0.0
+            if gained and not primed:
+                t0 = time.perf_counter()
+                self.llm.load_state(state)
+                load_s = time.perf_counter() - t0
+            self.last_reuse = {"prefix_tokens": gained,
+                               "prefix_saved_s": round(secs * gained / len(tokens) - load_s, 4),
+                               "prefix_load_s": round(load_s, 4),
+                               "prefix_prime_s": round(secs, 4) if primed else 0.0}
+        # stream=True → iterator of completion chunks
+        return self.llm(prompt, **params)
+
+class StubBackend:
+    """
+    Deterministic stand-in: the same prompt always yields the same text.
+    Story prompts get the "Paragraph N (…)" layout the web app splits on.
+    """
+    WORDS = ("output growth rose fell percent demand prices investment energy "
+             "policy exports households firms sector forecast year").split()
+
+    def __init__(self, **_):
+        self.model_path = "stub"
+
+    def complete(self, prompt: str, max_tokens: int = 16) -> str:
+        seed  = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        rnd   = random.Random(seed)
+        words = [rnd.choice(self.WORDS) for _ in range(max(max_tokens, 3))]
+        if "(Past, Present, Future)" in prompt:
+            third = len(words) // 3
+            return "\n\n".join(
+                f"Paragraph {i + 1} ({label}): " + " ".join(words[i * third:(i + 1) * third]) + "."
+                for i, label in enumerate(("Past", "Present", "Future")))
+        return " ".join(words).capitalize() + "."
+
+    def __call__(self, prompt: str, max_tokens: int = 16, stream: bool = False, **params):
+        text = self.complete(prompt, max_tokens)
+        if stream:
+            return ({"choices": [{"text": piece, "finish_reason": None}]}
+                    for piece in re.findall(r"\S+\s*", text))
+        return {"choices": [{"text": text, "finish_reason": "length"}],
+                "usage": {"prompt_tokens": len(prompt.split()),
+                          "completion_tokens": len(text.split())}}
+
+BACKENDS = {"llama-cpp": LlamaCppBackend, "stub": StubBackend}
+
+def model_id() -> str:
+    """What the generation cache keys on: backend + model file."""
+    if LLM_CONFIG["backend"] == "llama-cpp":
+        return LLM_CONFIG["model_path"]            # keeps keys of earlier runs valid
+    return f"{LLM_CONFIG['backend']}:{LLM_CONFIG['model_path']}"
+
 def load_llm():
-    from llama_cpp import Llama
-    return Llama(
-        model_path="models/mistral-7b-instruct-v0.2.Q4_K_M.gguf",
-        n_ctx=8192,
-        n_gpu_layers=10,
-        n_threads=8,
-        verbose=False
-    )
+    cfg = dict(LLM_CONFIG)
+    backend = cfg.pop("backend")
+    if backend not in BACKENDS:
+        sys.exit(f"unknown LLM backend {backend!r} – choose from {', '.join(BACKENDS)}")
+    return BACKENDS[backend](**cfg)
 
 LLM = None  # will be initialised on first call
 
-def make_story(topic: str) -> str:
+# ---------------------------------------------------------------------------
+# 5b · GENERATION CACHE
+# ---------------------------------------------------------------------------
+#  Byte-identical prompts with identical sampling settings are answered from
+#  out/llm_cache.sqlite instead of the model.  Entries expire after
+#  CACHE_MAX_AGE_DAYS and the least recently used ones are evicted once the
+#  cache grows past CACHE_MAX_MB.
+CACHE_MAX_MB       = 256
+CACHE_MAX_AGE_DAYS = 30
+
+# llama-cpp's own defaults, so LLM(p) and LLM(p, top_p=0.95) share a key
+SAMPLING_DEFAULTS = {"max_tokens": 16, "temperature": 0.8, "top_p": 0.95, "stop": []}
+
+class GenerationCache:
+    def __init__(self, path: Path, max_mb: float = CACHE_MAX_MB,
+                 max_age_days: float = CACHE_MAX_AGE_DAYS):
+        self.path, self.max_bytes = path, int(max_mb * 2**20)
+        self.max_age = max_age_days * 86400
+        self.hits = self.misses = 0
+        self._db = None
+        self.lock = threading.RLock()
+
+    @property
+    def db(self):
+        if self._db is None:
+            import sqlite3
+            self.path.parent.mkdir(exist_ok=True)
+            # the web app reads in request threads and writes from its
+            # generation thread, hence check_same_thread=False + self.lock
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS generations (
+                                  key TEXT PRIMARY KEY, text TEXT NOT NULL,
+                                  created REAL NOT NULL, used REAL NOT NULL,
+                                  size INTEGER NOT NULL)""")
+            self.evict()
+        return self._db
+
+    @staticmethod
+    def key(model: str, prompt: str, params: dict) -> str:
+        params = {**SAMPLING_DEFAULTS, **params}
+        params["stop"] = list(params["stop"] or [])
+        blob = json.dumps({"model": model, "prompt": prompt, "params": params},
+                          sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.db.execute("SELECT text, created FROM generations WHERE key = ?",
+                                  (key,)).fetchone()
+            if row is None or time.time() - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            with self.db:
+                self.db.execute("UPDATE generations SET used = ? WHERE key = ?",
+                                (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, text: str):
+        now = time.time()
+        with self.lock:
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?)",
+                                (key, text, now, now, len(text.encode("utf-8"))))
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones above the size cap."""
+        db = self._db
+        with db:
+            db.execute("DELETE FROM generations WHERE created < ?", (time.time() - self.max_age,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in db.execute(
+                        "SELECT key, size FROM generations ORDER BY used").fetchall():
+                    db.execute("DELETE FROM generations WHERE key = ?", (key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate  = f"{100 * self.hits / total:.0f}%" if total else "–"
+        return f"LLM cache: {self.hits} hit(s), {self.misses} miss(es) ({rate} hit rate)"
+
+CACHE = GenerationCache(OUT / "llm_cache.sqlite")
+
+def generate(prompt: str, **params) -> str:
+    """LLM completion text for *prompt*, served from CACHE when possible."""
+    global LLM
+    key = CACHE.key(model_id(), prompt, params) if CACHE is not None else None
+    if key is not None:
+        text = CACHE.get(key)
+        if text is not None:
+            REPORT.llm_call(prompt_chars=len(prompt), prompt_tokens=approx_tokens(prompt),
+                            completion_tokens=None, seconds=0.0, tokens_per_s=None,
+                            cached=True)
+            return text
+    if LLM is None:
+        LLM = load_llm()
+    t0   = time.perf_counter()
+    out  = LLM(prompt, **params)
+    secs = time.perf_counter() - t0
+    text = out["choices"][0]["text"]
+    usage = out.get("usage") or {}
+    done  = usage.get("completion_tokens") or approx_tokens(text)
+    REPORT.llm_call(prompt_chars=len(prompt),
+                    prompt_tokens=usage.get("prompt_tokens") or approx_tokens(prompt),
+                    completion_tokens=done, seconds=round(secs, 4),
+                    tokens_per_s=round(done / secs, 2) if secs else None, cached=False,
+                    **(getattr(LLM, "last_reuse", None) or {}))
+    if key is not None:
+        CACHE.put(key, text)
+    return text
+
+def cached_generation(prompt: str, **params):
+    """The cached completion for this prompt/sampling, or None."""
+    if CACHE is None:
+        return None
+    return CACHE.get(CACHE.key(model_id(), prompt, params))
+
+def generate_stream(prompt: str, **params):
     """
-    Return a Past-Present-Future story on *topic* plus a reference list
-    (file name + page) built from the same snippets fed to the LLM.
+    Like generate(), but yields the completion piece by piece as the model
+    produces it (a cache hit comes out as one piece).  The finished text is
+    cached once the stream has been consumed to the end.
     """
-    global LLM, TEXT
+    global LLM
+    key = CACHE.key(model_id(), prompt, params) if CACHE is not None else None
+    if key is not None:
+        text = CACHE.get(key)
+        if text is not None:
+            yield text
+            return
     if LLM is None:
         LLM = load_llm()
-    if TEXT is None:
-        TEXT = pd.read_parquet(OUT / "sentences_time.parquet")
+    pieces = []
+    for chunk in LLM(prompt, stream=True, **params):
+        piece = chunk["choices"][0]["text"]
+        pieces.append(piece)
+        yield piece
+    if key is not None:
+        CACHE.put(key, "".join(pieces))
+
+STORY_SAMPLING   = {"max_tokens": 380, "temperature": 0.2, "top_p": 0.9,
+                    "stop": ["</s>", "Snippets:"]}
+COMPARE_SAMPLING = {"max_tokens": 220, "temperature": 0.25}
+
+# Fixed instruction blocks the prompts start with – the topic comes after
+# them, so every story (and every comparison) shares this prefix verbatim
+# and the backend can reuse its evaluated state.
+STORY_INSTRUCTIONS = """
+You are an economic analyst. Write a concise story on the topic below
+in three paragraphs (Past, Present, Future). Quote numbers from the
+snippets. ≤120 words per paragraph. Return plain text.
+""".strip()
+COMPARE_INSTRUCTIONS = """
+You are a policy analyst.  Write one cohesive paragraph (≤180 words)
+that explains how the two topics below are connected in the report.
+Base yourself only on the snippets; quote at least one number.
+Return plain text.
+""".strip()
+PROMPT_PREFIXES = (STORY_INSTRUCTIONS, COMPARE_INSTRUCTIONS)
+
+def reference_list(refs) -> str:
+    return "\n\n**References**\n" + "\n".join(f"– {c}" for c in sorted(refs))
 
-    sub     = TEXT[TEXT.topic == topic]
+# Each bucket gets its best SNIPPETS_PER_BUCKET snippets.  With a snippet
+# share (--snippet-share / STORYLAB_SNIPPET_SHARE, e.g. 0.5) snippets instead
+# fill that share of the context left once the instructions and the answer
+# are accounted for, split evenly over the buckets – longer prompts, slower
+# generation.
+SNIPPETS_PER_BUCKET = 3
+PROMPT_OVERHEAD     = 150  # tokens of instructions around the snippets
+
+def approx_tokens(s: str) -> int:
+    return len(s) // 4 + 1           # ~4 characters per token for English text
+
+def snippet_budget(share: float = None, n_ctx: int = None, max_tokens: int = None,
+                   buckets: int = 3):
+    """Prompt tokens each bucket may spend on snippets, or None for a fixed count."""
+    share = LLM_CONFIG["snippet_share"] if share is None else share
+    if not share:
+        return None
+    n_ctx      = n_ctx or LLM_CONFIG["n_ctx"]
+    max_tokens = max_tokens or STORY_SAMPLING["max_tokens"]
+    return max(0, int((n_ctx - max_tokens - PROMPT_OVERHEAD) * share)) // buckets
+
+def fill_budget(snippets, budget: int = None, limit: int = SNIPPETS_PER_BUCKET) -> list:
+    """
+    (line, cite) for the best snippets: the first *limit* (None = all), or
+    with a *budget* as many as fit that many tokens (at least one).
+    """
+    picked, used = [], 0
+    for text, file, page in snippets:
+        cite = f"{file} p.{page}"
+        line = f"{text} ({cite})"              # inline citation
+        cost = approx_tokens(line) + 1         # + the " | " separator
+        if budget is None and limit is not None and len(picked) == limit:
+            break
+        if budget is not None and picked and used + cost > budget:
+            break
+        picked.append((line, cite))
+        used += cost
+    return picked
+
+def story_prompt(topic: str, share: float = None) -> tuple:
+    """(prompt, sampling params, citation set) for the story on *topic*."""
     buckets = {"Past": [], "Present": [], "Future": []}
     refs    = set()                       # ← stash citation strings here
+    budget  = snippet_budget(share)
 
     for t in buckets:
-        rows = sub[sub.time_bin == t].nlargest(3, "page")
-        lines = []
-        for _, r in rows.iterrows():
-            cite  = f"{r.file} p.{r.page}"
-            lines.append(f"{r.text} ({cite})")  # inline citation
-            refs.add(cite)
-        buckets[t] = lines or ["**No data found**"]
+        picked = fill_budget(ranked_snippets(topic, t), budget)
+        refs.update(cite for _, cite in picked)
+        buckets[t] = [line for line, _ in picked] or ["**No data found**"]
 
     prompt = f"""
-You are an economic analyst. Write a concise story on **{topic}**
-in three paragraphs (Past, Present, Future). Quote numbers from the
-snippets. ≤120 words per paragraph. Return plain text.
+{STORY_INSTRUCTIONS}
+
+Topic: **{topic}**
 
 Snippets:
 Past: { ' | '.join(buckets['Past']) }
 Present: { ' | '.join(buckets['Present']) }
 Future: { ' | '.join(buckets['Future']) }
 """.strip()
+    return prompt, STORY_SAMPLING, refs
 
-    rsp = LLM(
-        prompt,
-        max_tokens=380,
-        temperature=0.2,
-        top_p=0.9,
-        stop=["</s>", "Snippets:"]
-    )
-    story = rsp["choices"][0]["text"].strip()
+def make_story(topic: str) -> str:
+    """
+    Return a Past-Present-Future story on *topic* plus a reference list
+    (file name + page) built from the same snippets fed to the LLM.
+    """
+    prompt, params, refs = story_prompt(topic)
+    story = generate(prompt, **params).strip()
 
     # ---------- tack on a tidy reference list ----------
     if refs:
-        story += "\n\n**References**\n" + "\n".join(f"– {c}" for c in sorted(refs))
+        story += reference_list(refs)
 
     return story
 
 # ---------------------------------------------------------------------------
 # 6 · WRITE STORIES
 # ---------------------------------------------------------------------------
-def write_stories():
-    global TEXT
-    if TEXT is None:
-        TEXT = pd.read_parquet(OUT / "sentences_time.parquet")
+#  Topic stories and pairwise comparisons are jobs:  ("story", topic)  or
+#  ("compare", topic_a, topic_b).  With --llm-workers N they are spread over
+#  N processes, each holding its own model instance with --llm-threads
+#  threads (default: cores // N); finished files land in out/ as they come.
+def _job_path(job) -> Path:
+    if job[0] == "story":
+        return OUT / f"story_{job[1]}.txt"
+    return OUT / "compare" / f"{job[1]}_vs_{job[2]}.txt".replace(" ", "_")
+
+def _job_label(job) -> str:
+    return job[1] if job[0] == "story" else f"{job[1]} × {job[2]}"
+
+def _run_job(job):
+    """Generate one job. Returns (job, text, cache hits, cache misses, LLM call records)."""
+    h0, m0 = (CACHE.hits, CACHE.misses) if CACHE is not None else (0, 0)
+    REPORT.job, n0 = _job_label(job), len(REPORT.llm)
+    text = make_story(job[1]) if job[0] == "story" else compare_topics(job[1], job[2])
+    REPORT.job = None
+    h1, m1 = (CACHE.hits, CACHE.misses) if CACHE is not None else (0, 0)
+    return job, text, h1 - h0, m1 - m0, REPORT.llm[n0:]
+
+def _llm_worker_init(out: Path, llm_config: dict, cache_cfg, report: bool = False):
+    """Pool initializer: own output dir, model config, cache connection, report."""
+    global OUT, CACHE
+    OUT = out
+    LLM_CONFIG.update(llm_config)
+    CACHE = GenerationCache(*cache_cfg) if cache_cfg else None
+    REPORT.enabled = report
+
+def run_jobs(jobs, workers: int = 1, threads: int = None):
+    """Run generation jobs, writing each result as soon as it is done."""
+    def save(job, text):
+        path = _job_path(job)
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        REPORT.note(rows_out=1, bytes_written=_size(path))
+        print(f"   ✔ {_job_label(job)}: {len(text)} chars → {path.name}")
 
-    topics = TEXT.topic.unique()
+    if workers <= 1:
+        if threads:
+            LLM_CONFIG["n_threads"] = threads
+        for job in jobs:
+            print(">> generating", _job_label(job))
+            save(job, _run_job(job)[1])
+        return
+
+    threads   = threads or max(1, (os.cpu_count() or 1) // workers)
+    cache_cfg = (CACHE.path, CACHE.max_bytes / 2**20, CACHE.max_age / 86400) \
+        if CACHE is not None else None
+    print(f">> {len(jobs)} job(s) on {workers} model worker(s) × {threads} thread(s)")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_llm_worker_init,
+                             initargs=(OUT, {**LLM_CONFIG, "n_threads": threads},
+                                       cache_cfg, REPORT.enabled)) as pool:
+        futures = [pool.submit(_run_job, job) for job in jobs]
+        for fut in as_completed(futures):
+            job, text, hits, misses, calls = fut.result()
+            save(job, text)
+            for call in calls:
+                REPORT.llm_call(**call)
+            if CACHE is not None:
+                CACHE.hits += hits; CACHE.misses += misses
+
+def write_stories(workers: int = 1, threads: int = None, with_pairs: bool = False):
+    refresh_partitions()
+    topics = timeline_topics()
     if len(topics) == 0:
         print("⚠️  No topics found – run previous steps first"); return
 
-    for topic in topics:
-        print(">> generating", topic)
-        story = make_story(topic)
-        print("   ✔ got", len(story), "chars")
-        (OUT / f"story_{topic}.txt").write_text(story, encoding="utf-8")
+    jobs = [("story", t) for t in topics]
+    if with_pairs:
+        jobs += [("compare", a, b) for a, b in linked_pairs()]
+    REPORT.note(rows_in=len(jobs))
+    run_jobs(jobs, workers, threads)
 
     print(f"✅ {len(topics)} stories written to {OUT.resolve()}\\")
+    if CACHE is not None:
+        print("  ", CACHE.stats())
 
 
-def compare_topics(topic_a: str, topic_b: str) -> str:
-    """
-    If pages exist that link *topic_a* and *topic_b*, return a connected
-    story + reference list. Otherwise return 'Nothing to match'.
-    """
-    global LLM, TEXT
-    if LLM is None:
-        LLM = load_llm()
-    if TEXT is None:
-        TEXT = pd.read_parquet(OUT / "sentences_time.parquet")
-
-    overlaps = overlap_snippets(topic_a, topic_b, TEXT)
+def compare_prompt(topic_a: str, topic_b: str, share: float = None):
+    """(prompt, sampling params, citation set), or None if nothing links them."""
+    TEXT = load_timeline()
 
-    # 1. No connection? -------------
+    overlaps = overlap_snippets(topic_a, topic_b, TEXT, limit=5)
     if not overlaps:
-        return f"Nothing to match between **{topic_a}** and **{topic_b}**."
+        return None
 
-    # 2. Build prompt ---------------
-    refs = set()
-    joined = []
-    for item in overlaps[:5]:                # pass at most 5 pages to keep prompt short
-        cite = f"{item['file']} p.{item['page']}"
-        refs.add(cite)
-        for line in item["snippets"]:
-            joined.append(f"{line} ({cite})")
+    # every line of the (at most 5) pages; with a snippet share, one budget
+    budget = snippet_budget(share, max_tokens=COMPARE_SAMPLING["max_tokens"], buckets=1)
+    lines  = ((line, item["file"], item["page"]) for item in overlaps
+              for line in item["snippets"])
+    picked = fill_budget(lines, budget, limit=None)
+    refs   = {cite for _, cite in picked}
+    joined = [line for line, _ in picked]
 
     prompt = f"""
-You are a policy analyst.  Write one cohesive paragraph (≤180 words)
-that explains how **{topic_a}** and **{topic_b}** are connected in the
-report.  Base yourself only on the snippets; quote at least one number.
-Return plain text.
+{COMPARE_INSTRUCTIONS}
+
+Topics: **{topic_a}** and **{topic_b}**
 
 Snippets:
 { " | ".join(joined) }
 """.strip()
+    return prompt, COMPARE_SAMPLING, refs
 
-    rsp = LLM(prompt, max_tokens=220, temperature=0.25)
-    story = rsp["choices"][0]["text"].strip()
+def nothing_to_match(topic_a: str, topic_b: str) -> str:
+    return f"Nothing to match between **{topic_a}** and **{topic_b}**."
 
-    story += "\n\n**References**\n" + "\n".join(f"– {r}" for r in sorted(refs))
+def compare_topics(topic_a: str, topic_b: str) -> str:
+    """
+    If pages exist that link *topic_a* and *topic_b*, return a connected
+    story + reference list. Otherwise return 'Nothing to match'.
+    """
+    built = compare_prompt(topic_a, topic_b)
+
+    # 1. No connection? -------------
+    if built is None:
+        return nothing_to_match(topic_a, topic_b)
+
+    # 2. Generate -------------------
+    prompt, params, refs = built
+    story = generate(prompt, **params).strip()
+
+    story += reference_list(refs)
     return story
 
 # >>> cohesive paragraph or “Nothing to match …”
 
 
+def linked_pairs(skip=("Other",)) -> list:
+    """Every topic pair (minus *skip*) that shares at least one page."""
+    load_timeline()
+    topics = [t for t in INDEX.topics() if t not in skip]
+    return [(a, b) for a, b in combinations(topics, 2) if INDEX.shared_pages(a, b)]
+
+def compare_all(workers: int = 1, threads: int = None, skip=("Other",)):
+    """
+    Write out/compare/<A>_vs_<B>.txt for every topic pair that shares at
+    least one page.  Pairs are found from the index in one pass; the LLM is
+    only called for pairs that actually overlap.
+    """
+    load_timeline()
+    n_topics = len([t for t in INDEX.topics() if t not in skip])
+    n_pairs  = n_topics * (n_topics - 1) // 2
+    linked   = linked_pairs(skip)
+    if not linked:
+        print("⚠️  No topic pairs share a page – nothing to compare"); return
+
+    REPORT.note(rows_in=len(linked))
+    run_jobs([("compare", a, b) for a, b in linked], workers, threads)
+
+    print(f"✅ {len(linked)} comparisons written to {(OUT / 'compare').resolve()} "
+          f"({n_pairs - len(linked)} pair(s) without shared pages skipped)")
+    if CACHE is not None:
+        print("  ", CACHE.stats())
+
+# ---------------------------------------------------------------------------
+# 7 · SEARCH INDEX
+# ---------------------------------------------------------------------------
+#  out/search.sqlite: SQLite FTS5 over every timeline sentence (best-first,
+#  see search_index.py) and over the story / comparison texts, for the web
+#  app's /search.  The sentence part is rebuilt when sentences_time.parquet
+#  changes, the story part when any story file does.
+SEARCH_DB    = "search.sqlite"
+INDEX_BATCH  = 50_000
+
+def search_db_path() -> Path:
+    return OUT / SEARCH_DB
+
+def _story_files() -> list:
+    """Story and comparison texts the pipeline wrote (out/) or the app serves (data/)."""
+    found = [*OUT.glob("story_*.txt"), *OUT.glob("compare/*_vs_*.txt"),
+             *DATA.glob("story_*.txt"), *DATA.rglob("compare/*_vs_*.txt")]
+    return sorted(set(found))
+
+def _story_docs(paths) -> list:
+    docs = []
+    for p in paths:
+        if p.name.startswith("story_"):
+            kind, title = "story", p.stem[len("story_"):]
+        else:
+            kind, title = "compare", " vs ".join(p.stem.replace("_", " ").split(" vs ", 1))
+        docs.append((title, p.read_text(encoding="utf-8"), kind, str(p.relative_to(ROOT))))
+    return docs
+
+def _index_sources(paths) -> dict:
+    return {"sentences": _partition_source(),
+            "stories": {str(p.relative_to(ROOT)): p.stat().st_mtime for p in paths}}
+
+def _index_batches(table: pa.Table):
+    for start in range(0, table.num_rows, INDEX_BATCH):
+        part = table.slice(start, INDEX_BATCH)
+        yield list(zip(*(part[c].to_pylist() for c in ("text", "topic", "time_bin",
+                                                          "file", "page"))))
+
+def build_search_index(full: bool = False):
+    import search_index
+    fp = OUT / "sentences_time.parquet"
+    if not fp.exists():
+        print("⚠️  run 'timeline' first"); return
+    paths   = _story_files()
+    sources = _index_sources(paths)
+    old     = search_index.SearchIndex(search_db_path()).sources()
+
+    if not full and old == sources:
+        print(f"✅ {SEARCH_DB} up to date"); return
+    if not full and old.get("sentences") == sources["sentences"]:
+        search_index.replace_stories(search_db_path(), _story_docs(paths), sources)
+        print(f"✅ {len(paths)} story file(s) re-indexed → {SEARCH_DB}"); return
+
+    table = _narrow(pq.read_table(fp))
+    REPORT.note(bytes_read=_size(fp), rows_in=table.num_rows)
+    score = snippet_scores(table["text"], table["topic"].cast(pa.string()).to_numpy())
+    table = table.take(rank_order(score, table["page"].to_numpy()))
+    table = table.select(["text", "topic", "time_bin", "file", "page"]) \
+                 .cast(pa.schema([("text", pa.string()), ("topic", pa.string()),
+                                  ("time_bin", pa.string()), ("file", pa.string()),
+                                  ("page", pa.int16())]))
+    facets = {c: dict(sorted((v["values"], v["counts"])
+                             for v in pc.value_counts(table[c]).to_pylist()))
+              for c in ("topic", "time_bin", "file")}
+    rows = search_index.write_index(search_db_path(), _index_batches(table),
+                                    _story_docs(paths), sources, facets)
+    REPORT.note(rows_out=rows, bytes_written=_size(search_db_path()))
+    print(f"✅ indexed {rows:,} sentences + {len(paths)} story file(s) → {SEARCH_DB}")
+
+
 # ---------------------------------------------------------------------------
 #  CLI DISPATCHER
 # ---------------------------------------------------------------------------
+STEPS = ("extract", "clean", "classify", "timeline", "facts", "story", "compare-all",
+         "index", "all")
+
 def main():
-    cmd = sys.argv[1] if len(sys.argv) > 1 else "all"
+    ap = argparse.ArgumentParser(prog="story.py", description="DIW-StoryLab pipeline")
+    ap.add_argument("cmd", nargs="?", default="all", choices=STEPS)
+    ap.add_argument("--workers", type=int, default=1,
+                    help="extract: worker processes (0 = one per core)")
+    ap.add_argument("--backend", choices=sorted(EXTRACT_BACKENDS), default=DEFAULT_BACKEND,
+                    help="extract: PDF text extractor (fitz = PyMuPDF, fastest)")
+    ap.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD,
+                    help="extract: pages per worker task")
+    ap.add_argument("--multi-label", action="store_true",
+                    help="classify: also store every matching topic in a 'topics' column")
+    ap.add_argument("--classifier", choices=CLASSIFIERS, default="keywords",
+                    help="classify: keyword regexes (fast) or sentence-embedding "
+                         "similarity to topic seed phrases")
+    ap.add_argument("--embed-model", default=EMBED_MODEL,
+                    help="classify: sentence-transformers model for --classifier embed")
+    ap.add_argument("--past-until", type=int, default=PAST_UNTIL,
+                    help="timeline: latest year tagged Past")
+    ap.add_argument("--present-until", type=int, default=PRESENT_UNTIL,
+                    help="timeline: latest year tagged Present (later → Future)")
+    ap.add_argument("--llm", choices=sorted(BACKENDS), default=LLM_CONFIG["backend"],
+                    help="story/compare-all: generation backend (env STORYLAB_LLM); "
+                         "'stub' is instant and deterministic")
+    ap.add_argument("--model", default=LLM_CONFIG["model_path"],
+                    help="llama-cpp: GGUF model file (env STORYLAB_MODEL)")
+    ap.add_argument("--n-ctx", type=int, default=LLM_CONFIG["n_ctx"],
+                    help="llama-cpp: context size (env STORYLAB_N_CTX)")
+    ap.add_argument("--n-gpu-layers", type=int, default=LLM_CONFIG["n_gpu_layers"],
+                    help="llama-cpp: layers offloaded to the GPU (env STORYLAB_N_GPU_LAYERS)")
+    ap.add_argument("--llm-workers", type=int, default=1,
+                    help="story/compare-all: model instances run in parallel processes")
+    ap.add_argument("--llm-threads", type=int, default=None,
+                    help="story/compare-all: threads per model instance "
+                         "(default: STORYLAB_THREADS or 8, or cores // llm-workers)")
+    ap.add_argument("--with-pairs", action="store_true",
+                    help="story: also generate every linked topic-pair comparison")
+    ap.add_argument("--snippet-share", type=float, default=LLM_CONFIG["snippet_share"],
+                    help="story: share of the free context filled with snippets, e.g. 0.5 "
+                         f"(env STORYLAB_SNIPPET_SHARE; 0 = best {SNIPPETS_PER_BUCKET} per bucket)")
+    ap.add_argument("--prefix-cache", action="store_true", default=LLM_CONFIG["prefix_cache"],
+                    help="llama-cpp: also keep the instruction blocks' evaluated state "
+                         "(env STORYLAB_PREFIX_CACHE=1); llama-cpp already reuses what a "
+                         "prompt shares with the previous one, so this rarely pays")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="story: always call the model, bypass out/llm_cache.sqlite")
+    ap.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_MB,
+                    help="story: evict least recently used generations above this size")
+    ap.add_argument("--cache-max-age-days", type=float, default=CACHE_MAX_AGE_DAYS,
+                    help="story: drop cached generations older than this")
+    ap.add_argument("--full", action="store_true",
+                    help="ignore manifests and reprocess every PDF")
+    ap.add_argument("--fused", action="store_true",
+                    help="all: stream extract→clean→classify→timeline in batches, "
+                         "writing only sentences_time.parquet")
+    ap.add_argument("--keep-intermediate", action="store_true",
+                    help="with --fused: also write the intermediate tables")
+    ap.add_argument("--profile", choices=("cprofile", "pyinstrument"), default=None,
+                    help="profile the run → out/profile.pstats / out/profile.html")
+    args = ap.parse_args()
+    cmd  = args.cmd
+    OUT.mkdir(exist_ok=True)
+
+    LLM_CONFIG.update(backend=args.llm, model_path=args.model,
+                      n_ctx=args.n_ctx, n_gpu_layers=args.n_gpu_layers,
+                      prefix_cache=args.prefix_cache, snippet_share=args.snippet_share)
+
+    global CACHE
+    CACHE = None if args.no_cache else \
+        GenerationCache(OUT / "llm_cache.sqlite", args.cache_max_mb, args.cache_max_age_days)
+
+    def run():
+        if cmd == "all" and args.fused:
+            with REPORT.stage("fused"):
+                run_fused(args.workers, args.pages_per_shard, args.full, args.keep_intermediate,
+                          args.past_until, args.present_until, args.classifier, args.embed_model,
+                          args.backend, args.multi_label)
+            with REPORT.stage("facts"):
+                extract_facts(args.full)
+            with REPORT.stage("story"):
+                write_stories(args.llm_workers, args.llm_threads, args.with_pairs)
+            with REPORT.stage("index"):
+                build_search_index(args.full)
+            return
 
-    if cmd in ("extract", "all"):   extract_text()
-    if cmd in ("clean",   "all"):   clean_text()
-    if cmd in ("classify","all"):   classify_text()
-    if cmd in ("timeline","all"):   tag_timeline()
-    if cmd in ("story",   "all"):   write_stories()
+        if cmd in ("extract", "all"):
+            with REPORT.stage("extract"):  extract_text(args.workers, args.pages_per_shard, args.full,
+                                                        args.backend)
+        if cmd in ("clean",   "all"):
+            with REPORT.stage("clean"):    clean_text(args.full)
+        if cmd in ("classify","all"):
+            with REPORT.stage("classify"): classify_text(args.full, args.multi_label,
+                                                         args.classifier, args.embed_model)
+        if cmd in ("timeline","all"):
+            with REPORT.stage("timeline"): tag_timeline(args.full, args.past_until,
+                                                        args.present_until)
+        if cmd in ("facts",   "all"):
+            with REPORT.stage("facts"):    extract_facts(args.full)
+        if cmd in ("story",   "all"):
+            with REPORT.stage("story"):    write_stories(args.llm_workers, args.llm_threads,
+                                                         args.with_pairs)
+        if cmd == "compare-all":
+            with REPORT.stage("compare-all"): compare_all(args.llm_workers, args.llm_threads)
+        if cmd in ("index", "story", "all"):   # new stories → re-index them
+            with REPORT.stage("index"):    build_search_index(args.full)
 
-    if cmd not in ("extract","clean","classify","timeline","story","all"):
-        print("Usage: python storylab.py "
-              "[extract|clean|classify|timeline|story|all]")
+    REPORT.enabled = True
+    try:
+        run_profiled(args.profile, run)
+    finally:
+        REPORT.write(OUT / "run_report.json", command=cmd, argv=sys.argv[1:],
+                     llm_backend=LLM_CONFIG["backend"], model=model_id())
+        REPORT.print_summary()
+        print("✅ run report →", OUT / "run_report.json")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,152 @@
+# ---------------------------------------------------------------------------
+#  In-memory story repository for the Flask app
+# ---------------------------------------------------------------------------
+#  Loads every data/story_*.txt and every compare/*_vs_*.txt once, splits the
+#  single-topic stories into Past / Present / Future up front and keeps the
+#  result in memory.  A background thread polls the files' mtimes and reloads
+#  only the entries that changed, so request handlers never touch the disk.
+# ---------------------------------------------------------------------------
+
+import os, re, time, threading
+
+P2   = re.compile(r'(?i)paragraph\s*2')
+P3   = re.compile(r'(?i)paragraph\s*3')
+REFS = re.compile(r"\*\*References", flags=re.IGNORECASE)
+
+
+# Robust story splitter (patterns compiled once, each split done once)
+def split_story(story):
+    try:
+        parts2  = P2.split(story)
+        past    = parts2[0]
+        present = P3.split(parts2[1])[0]
+        future  = P3.split(story)[1].split("**References")[0]
+        return past.strip(), present.strip(), future.strip()
+    except Exception:
+        return "Could not split story", "Could not split story", "Could not split story"
+
+
+def _key(kind, name):
+    """story_Energy.txt → 'Energy';  Economic_Recovery_vs_Trade.txt → ('Economic Recovery', 'Trade')"""
+    if kind == "story":
+        return name.replace("story_", "").replace(".txt", "").strip()
+    return tuple(part.replace("_", " ") for part in name[:-len(".txt")].split("_vs_", 1))
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class StoryStore:
+    """
+    stories()          → {category: {'past':…, 'present':…, 'future':…}}
+    combined(a, b)     → comparison text (without references) or None
+    mtimes()           → {path: mtime} of every loaded file
+    modified           → newest loaded mtime (or the time a deletion was seen)
+    """
+
+    def __init__(self, story_dir="data", compare_dir=None):
+        self.story_dir   = story_dir
+        self.compare_dir = compare_dir
+        self._lock       = threading.Lock()
+        self._refreshing = threading.Lock()   # one refresh at a time (poller vs requests)
+        self._mtimes     = {}      # path → mtime of the loaded version
+        self._known      = {}      # path → (kind, file name)
+        self._stories    = {}      # category → split sections
+        self._compare    = {}      # (cat1, cat2) → text
+        self._thread     = None
+        self._stop       = threading.Event()
+        self.version     = 0       # bumped whenever anything is (re)loaded
+        self.modified    = 0.0     # Last-Modified of the pages built from the store
+
+    # ---------- disk side ----------
+    def _scan(self):
+        found = {}
+        if os.path.isdir(self.story_dir):
+            for name in os.listdir(self.story_dir):
+                if name.startswith("story_") and name.endswith(".txt"):
+                    found[os.path.join(self.story_dir, name)] = ("story", name)
+        if self.compare_dir and os.path.isdir(self.compare_dir):
+            for name in os.listdir(self.compare_dir):
+                if "_vs_" in name and name.endswith(".txt"):
+                    found[os.path.join(self.compare_dir, name)] = ("compare", name)
+        return found
+
+    def refresh(self):
+        """Reload new/changed files, drop deleted ones. Returns #changes."""
+        with self._refreshing:
+            return self._refresh()
+
+    def _refresh(self):
+        found   = self._scan()
+        with self._lock:
+            mtimes  = dict(self._mtimes)
+            known   = dict(self._known)
+            stories = dict(self._stories)
+            compare = dict(self._compare)
+        changes = 0
+
+        for path, (kind, name) in found.items():
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if mtimes.get(path) == mtime:
+                continue
+            text = _read(path)
+            if kind == "story":
+                past, present, future = split_story(text)
+                stories[_key(kind, name)] = {"past": past, "present": present, "future": future}
+            else:
+                # Remove everything after **References
+                compare[_key(kind, name)] = REFS.split(text)[0].strip()
+            mtimes[path] = mtime
+            changes += 1
+
+        modified = max([self.modified, *mtimes.values()])
+        for path in set(mtimes) - set(found):
+            kind, name = known.pop(path)
+            (stories if kind == "story" else compare).pop(_key(kind, name), None)
+            mtimes.pop(path)
+            modified = time.time()
+            changes += 1
+
+        if changes:
+            known.update({p: found[p] for p in mtimes if p in found})
+            # swap in whole new dicts so readers never see a half-updated state
+            with self._lock:
+                self._mtimes, self._compare, self._known = mtimes, compare, known
+                self._stories = dict(sorted(stories.items()))
+                self.modified = modified
+                self.version += 1
+        return changes
+
+    def start(self, interval=2.0):
+        """Initial load + daemon thread that re-checks mtimes every *interval* s."""
+        self.refresh()
+        if self._thread is None and interval:
+            def poll():
+                while not self._stop.wait(interval):
+                    try:
+                        self.refresh()
+                    except Exception as e:          # keep serving the old copy
+                        print(f"story store refresh failed: {e}")
+
+            self._thread = threading.Thread(target=poll, name="story-store", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- request side (memory only) ----------
+    def stories(self):
+        return self._stories
+
+    def combined(self, cat1, cat2):
+        compare = self._compare
+        return compare.get((cat1, cat2)) or compare.get((cat2, cat1))
+
+    def mtimes(self):
+        return self._mtimes
@@ -0,0 +1,63 @@
+# ---------------------------------------------------------------------------
+#  Shared fixtures: a tiny PDF corpus and a pipeline pointed at tmp folders
+# ---------------------------------------------------------------------------
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import story  # noqa: E402
+
+PAGES = {
+    "report_a.pdf": [
+        "Solar GW capacity rose 5 % in 2019. Wind power output doubled since 2010.",
+        "CO2 emission targets are set for 2030. Unemployment fell to 3 % in 2021.",
+    ],
+    "report_b.pdf": [
+        "Export volumes grew in 2018. The budget deficit will narrow by 2035.",
+        "Industrial production recovered in 2022. Housing construction slowed in 2023.",
+        "Solar power export volumes rose by 2 %.",
+    ],
+}
+
+
+def write_corpus(data: Path, pages: dict = PAGES) -> Path:
+    import pymupdf as fitz
+    data.mkdir(parents=True, exist_ok=True)
+    for name, texts in pages.items():
+        doc = fitz.open()
+        for text in texts:
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=10)
+        doc.save(data / name)
+        doc.close()
+    return data
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """story with DATA/OUT in tmp_path, the stub LLM and no generation cache."""
+    monkeypatch.setattr(story, "DATA", write_corpus(tmp_path / "data"))
+    monkeypatch.setattr(story, "OUT", tmp_path / "out")
+    monkeypatch.setattr(story, "CACHE", None)
+    monkeypatch.setitem(story.LLM_CONFIG, "backend", "stub")
+    for name in ("TEXT", "INDEX", "RANKED"):
+        monkeypatch.setattr(story, name, None)
+    return story
+
+
+def read_table(path: Path):
+    import pandas as pd
+    df = pd.read_parquet(path)
+    return df.astype({c: str for c in df.columns if c != "page"}) \
+             .sort_values(["file", "page", "text"]).reset_index(drop=True)
+
+
+def run_staged(story, **classify):
+    """extract → clean → classify → timeline; returns the timeline table."""
+    story.extract_text()
+    story.clean_text()
+    story.classify_text(**classify)
+    story.tag_timeline()
+    return read_table(story.OUT / "sentences_time.parquet")
@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+import app
+from conftest import run_staged
+from generation_queue import GenerationQueue
+
+
+@pytest.fixture
+def generator(pipeline, monkeypatch):
+    """A timeline in tmp, and a model that holds each job until released."""
+    run_staged(pipeline)
+    release = threading.Event()
+
+    def generate_stream(prompt, **params):
+        release.wait(5)
+        yield "story"
+
+    monkeypatch.setattr(pipeline, "generate_stream", generate_stream)
+    monkeypatch.setattr(app, "GENERATOR", GenerationQueue(maxsize=8))
+    yield release
+    release.set()
+
+
+def test_one_live_story_per_browser_not_per_address(generator):
+    alice, bob = app.app.test_client(), app.app.test_client()
+    for client in (alice, bob):          # the page hands out the client cookie
+        assert client.get("/live-story").status_code == 200
+        assert client.get_cookie(app.CLIENT_COOKIE) is not None
+
+    first = alice.get("/stream-story?topic=Energy")
+    assert first.status_code == 200
+    assert alice.get("/stream-story?topic=Climate").status_code == 503
+    other = bob.get("/stream-story?topic=Climate")   # same remote_addr, other browser
+    assert other.status_code == 200
+
+    generator.set()                      # streams hold request contexts: close LIFO
+    assert b"event: done" in other.get_data()
+    assert b"event: done" in first.get_data()
+
+
+def test_warm_ranking_cuts_partitions(pipeline):
+    run_staged(pipeline)
+    (pipeline._partition_dir() / "_source.json").unlink()
+    assert not pipeline.partitions_fresh()
+    pipeline.warm_ranking()
+    assert pipeline.partitions_fresh()
+
+
+@pytest.mark.parametrize("limit, hits", [(-3, 1), (0, 1), (2, 2), (500, 5)])
+def test_search_limit_is_clamped(pipeline, monkeypatch, limit, hits):
+    run_staged(pipeline)
+    pipeline.build_search_index()
+    monkeypatch.setattr(app, "SEARCH", app.SearchIndex(str(pipeline.search_db_path())))
+    got = app.app.test_client().get(f"/search?q=in&limit={limit}&format=json")
+    assert got.status_code == 200
+    assert len(got.get_json()["hits"]) == hits
+
+
+def test_clients_without_cookie_are_limited_per_address(generator):
+    first = app.app.test_client().get("/stream-story?topic=Energy")
+    assert first.status_code == 200
+    assert app.app.test_client().get("/stream-story?topic=Climate").status_code == 503
+    generator.set()
+    assert b"event: done" in first.get_data()
+
+
+@pytest.mark.parametrize("query", ["topic=Anything", "category1=Energy&category2=Nope"])
+def test_unknown_category_is_refused(generator, query):
+    got = app.app.test_client().get(f"/stream-story?{query}")
+    assert b"event: failed" in got.get_data()
+    assert app.GENERATOR.jobs.qsize() == 0 and not app.GENERATOR.active
+
+
+def test_page_requests_do_not_stat_story_or_chart_folders(monkeypatch):
+    calls, newest_mtime = [], app.http_cache.newest_mtime
+
+    def spy(*paths):                     # the pollers may stat; requests may not
+        if threading.current_thread() is threading.main_thread():
+            calls.append(paths)
+        return newest_mtime(*paths)
+
+    monkeypatch.setattr(app.http_cache, "newest_mtime", spy)
+    client = app.app.test_client()
+    for url in ("/complete-stories", "/compare-stories?category1=Energy&category2=Trade",
+                "/view-chart?topic=Energy&chart=All"):
+        assert client.get(url).status_code == 200
+    assert calls == []
+
+
+def test_story_store_modified_moves_on_deletion(tmp_path):
+    from story_store import StoryStore
+    (tmp_path / "story_Energy.txt").write_text("Paragraph 1 a Paragraph 2 b Paragraph 3 c")
+    store = StoryStore(str(tmp_path)).start(interval=0)
+    assert store.modified == (tmp_path / "story_Energy.txt").stat().st_mtime
+    (tmp_path / "story_Energy.txt").unlink()
+    before = store.modified
+    store.refresh()
+    assert store.modified > before and not store.stories()
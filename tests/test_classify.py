@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import story
+
+# combining marks (U+0301, U+0303), dotted capital I, ZWJ, connector punctuation
+TRICKY = [
+    "CO2 emissioń rules", "emissioń", "İndustry output",
+    "İNDUSTRIAL output", "wind̃ farms", "PV́ modules", "renewable‍",
+    "solar‿panels", "GW²", "Paris Agreemenţ", "tariff̀s",
+    "émission", "ḱ wage", "plain solar GW text",
+]
+
+
+@pytest.mark.parametrize("multi_label", [False, True])
+def test_classify_series_matches_label(multi_label):
+    texts = pd.Series(TRICKY)
+    got = story.classify_series(texts, multi_label=multi_label)
+    topic = got[0] if multi_label else got
+    assert topic.tolist() == [story.label(t) for t in TRICKY]
+
+
+def test_embedding_store_recovers_from_a_torn_append(tmp_path):
+    store = story.EmbeddingStore(tmp_path, "test-model")
+    store._append(np.array([7], "<u8"), np.array([[1, 2, 3, 4]], np.float16))
+    with open(store.root / "vectors.f16", "ab") as f:   # crash mid-append:
+        f.write(np.array([9, 9], np.float16).tobytes())  # half a vector, no key
+    with open(store.root / "keys.u64", "ab") as f:
+        f.write(np.array([8], "<u8").tobytes()[:5])
+
+    store = story.EmbeddingStore(tmp_path, "test-model")
+    assert len(store) == 1
+    store._append(np.array([11], "<u8"), np.array([[51, 3, 1, 2]], np.float16))
+    store._load()
+    rows = store.lookup(np.array([7, 11], "<u8"))
+    assert store.vectors_for(rows).tolist() == [[1, 2, 3, 4], [51, 3, 1, 2]]
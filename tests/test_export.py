@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+import file_to_csv
+from conftest import run_staged
+
+
+def read_back(path, fmt) -> pd.DataFrame:
+    if fmt.startswith("csv"):
+        return pd.read_csv(path)
+    if fmt.startswith("jsonl"):
+        return pd.read_json(path, lines=True)
+    return pd.read_excel(path)
+
+
+@pytest.mark.parametrize("fmt", file_to_csv.FORMATS)
+def test_export_multi_label_table(pipeline, tmp_path, fmt):
+    if fmt == "xlsx":
+        pytest.importorskip("openpyxl")
+    table = run_staged(pipeline, multi_label=True)
+    got = file_to_csv.export_table(pipeline.OUT / "sentences_time.parquet", tmp_path, fmt)
+    assert got["rows"] == len(table)
+
+    df = read_back(got["path"], fmt)
+    topics = df.loc[df["text"].str.startswith("Solar power export"), "topics"].iloc[0]
+    want = ["Energy", "Trade"]
+    assert (topics if fmt.startswith("jsonl") else topics.split(file_to_csv.LIST_SEP)) == want
+    assert df["topic"].tolist() == pd.read_parquet(
+        pipeline.OUT / "sentences_time.parquet")["topic"].astype(str).tolist()
+
+
+def test_a_failing_table_does_not_stop_the_others(pipeline, tmp_path, monkeypatch, capsys):
+    run_staged(pipeline)
+    broken = tmp_path / "broken.parquet"
+    broken.write_bytes(b"not parquet")
+    monkeypatch.setattr("sys.argv", ["file_to_csv.py", str(broken),
+                                     str(pipeline.OUT / "sentences_time.parquet"),
+                                     "--out", str(tmp_path / "csv"), "--workers", "2"])
+    with pytest.raises(SystemExit) as exit:
+        file_to_csv.main()
+    assert exit.value.code == 1
+    assert "❌ broken" in capsys.readouterr().out
+    assert (tmp_path / "csv" / "sentences_time.csv").exists()
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from conftest import read_table, run_staged
+
+
+def test_keyword_change_reaches_timeline(pipeline, monkeypatch):
+    before = run_staged(pipeline)
+    assert "Energy" in set(before["topic"])
+
+    keywords = {t: p for t, p in pipeline.KEYWORDS.items() if t != "Energy"}
+    monkeypatch.setattr(pipeline, "KEYWORDS", keywords)
+    after = run_staged(pipeline)
+    assert "Energy" not in set(after["topic"])
+    topics = read_table(pipeline.OUT / "sentences_topic.parquet")["topic"]
+    assert after["topic"].tolist() == topics.tolist()
+
+
+def stories(story) -> dict:
+    story.TEXT = None                      # drop the timeline of the other run
+    story.write_stories()
+    return {p.name: p.read_text(encoding="utf-8") for p in story.OUT.glob("story_*.txt")}
+
+
+@pytest.mark.parametrize("multi_label", [False, True])
+def test_fused_run_matches_staged_run(pipeline, monkeypatch, tmp_path, multi_label):
+    staged = run_staged(pipeline, multi_label=multi_label)
+    staged_manifest = pipeline.load_manifest(pipeline.OUT / "sentences_time.parquet")
+    staged_stories = stories(pipeline)
+
+    monkeypatch.setattr(pipeline, "OUT", tmp_path / "fused")
+    pipeline.run_fused(workers=2, pages_per_shard=1, multi_label=multi_label)
+    fused = read_table(pipeline.OUT / "sentences_time.parquet")
+    pd.testing.assert_frame_equal(fused, staged)
+    assert ("topics" in fused) == multi_label
+    fused_manifest = pipeline.load_manifest(pipeline.OUT / "sentences_time.parquet")
+    assert fused_manifest["config"] == staged_manifest["config"]
+    assert len(staged_stories) == staged["topic"].nunique()
+    assert stories(pipeline) == staged_stories
+
+
+def partition_topics(story) -> set:
+    return {p.name.split("=", 1)[1] for p in story._partition_dir().glob("topic=*")}
+
+
+def test_classifier_switch_reaches_timeline_and_partitions(pipeline, monkeypatch):
+    def embed_classify_series(texts, multi_label=False, model=None):
+        topic = pd.Series("Policy", index=texts.index, name="topic")
+        return (topic, topic.map(lambda t: [t]).rename("topics")) if multi_label else topic
+
+    monkeypatch.setattr(pipeline, "embed_available", lambda: True)
+    monkeypatch.setattr(pipeline, "embed_classify_series", embed_classify_series)
+
+    keywords = run_staged(pipeline)
+    embedded = run_staged(pipeline, method="embed")
+    assert set(embedded["topic"]) == {"Policy"}
+    assert partition_topics(pipeline) == {"Policy"}
+
+    again = run_staged(pipeline)
+    pd.testing.assert_frame_equal(again, keywords)
+    assert partition_topics(pipeline) == set(keywords["topic"])
@@ -0,0 +1,79 @@
+import numpy as np
+
+import story
+
+SNIPPETS = [(f"Sentence {i} about solar power in 2019.", "a.pdf", i) for i in range(200)]
+
+
+def test_fixed_snippet_count_by_default():
+    assert story.snippet_budget() is None
+    assert len(story.fill_budget(iter(SNIPPETS))) == story.SNIPPETS_PER_BUCKET
+
+
+def test_snippet_share_fills_a_token_budget():
+    budget = story.snippet_budget(0.5, n_ctx=4096, max_tokens=380)
+    picked = story.fill_budget(iter(SNIPPETS), budget)
+    assert len(picked) > story.SNIPPETS_PER_BUCKET
+    assert sum(story.approx_tokens(line) + 1 for line, _ in picked) <= budget
+
+
+def test_story_prompt_share_is_opt_in(pipeline):
+    from conftest import run_staged
+    run_staged(pipeline)
+    short, _, _ = pipeline.story_prompt("Energy")
+    assert pipeline.story_prompt("Energy", share=0)[0] == short
+    assert short.count(".pdf p.") <= 3 * pipeline.SNIPPETS_PER_BUCKET
+
+
+class FakeLlama:
+    """Word-per-token stand-in that keeps a prompt's common prefix like llama-cpp."""
+
+    def __init__(self):
+        self.input_ids, self.n_tokens, self.loads = np.array([], dtype=object), 0, 0
+
+    def tokenize(self, text, special=True):
+        return [0] + text.decode().split()
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        self.input_ids = np.array(list(self.input_ids[:self.n_tokens]) + list(tokens), dtype=object)
+        self.n_tokens = len(self.input_ids)
+
+    def save_state(self):
+        return self.input_ids[:self.n_tokens].copy()
+
+    def load_state(self, state):
+        self.loads += 1
+        self.input_ids, self.n_tokens = state.copy(), len(state)
+
+    def __call__(self, prompt, **params):
+        tokens = self.tokenize(prompt.encode())
+        kept = story._shared_tokens(self.input_ids[:self.n_tokens].tolist(), tokens)
+        self.n_tokens = kept
+        self.eval(tokens[kept:])
+        return "ok"
+
+
+def test_prefix_cache_credits_only_tokens_llama_cpp_would_not_keep():
+    backend = object.__new__(story.LlamaCppBackend)
+    backend.llm, backend.prefix_cache, backend.prefixes = FakeLlama(), True, {}
+    story_a, story_b = (story.STORY_INSTRUCTIONS + t for t in ("Energy", "Climate"))
+    compare = story.COMPARE_INSTRUCTIONS + "Energy vs Climate"
+
+    backend(story_a)                                     # primes the story block
+    assert list(backend.prefixes) == [story.STORY_INSTRUCTIONS]
+    backend(story_b)                                     # llama-cpp keeps the block itself
+    assert backend.last_reuse["prefix_tokens"] == 0
+    assert backend.last_reuse["prefix_saved_s"] == 0 and backend.llm.loads == 0
+    backend(compare)                                     # primes the compare block
+    backend(story_a)                                     # only now does restoring help
+    assert backend.llm.loads == 1
+    assert backend.last_reuse["prefix_tokens"] > 0
+    assert backend.last_reuse["prefix_load_s"] >= 0
+
+
+def test_prefix_cache_is_opt_in():
+    import inspect
+    assert inspect.signature(story.LlamaCppBackend).parameters["prefix_cache"].default is False
@@ -1,9 +1,59 @@
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 import os
 import re
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# Object-oriented Figure API only – no pyplot state machine, so figures can
+# be built side by side in worker processes.  PNGs are written by Agg.
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+
+# --- CHART DATA (python story.py facts) ---
+# Per topic × time bin × unit aggregates of the numbers quoted in the
+# timeline sentences.  A topic's charts show its most quoted unit; topics
+# without any numeric facts fall back to interpret_generic_file below.
+CHART_DATA = os.path.join("out", "chart_data.parquet")
+TIME_BINS  = [("Past", 2020), ("Present", 2024), ("Future", 2040)]   # default years
+
+def load_chart_data(path=CHART_DATA):
+    """chart_data.parquet → {topic: [row, …]}; {} if the facts step hasn't run."""
+    if not path or not os.path.exists(path):
+        return {}
+    import pyarrow.parquet as pq
+    data = {}
+    for row in pq.read_table(path).to_pylist():
+        data.setdefault(row["topic"], []).append(row)
+    return data
+
+def story_topic(path):
+    """data/story_Economic Recovery.txt → Economic Recovery"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[len("story_"):].replace("_", " ") if stem.startswith("story_") else stem
+
+def chart_values(topic_name, rows):
+    """One topic's chart_data rows → labels, values, abs values and axis options."""
+    totals = {}
+    for r in rows:
+        totals[r["unit"]] = totals.get(r["unit"], 0) + r["facts"]
+    unit = max(totals, key=totals.get)
+    by_bin = {r["time_bin"]: r for r in rows if r["unit"] == unit}
+    labels, values, years = [], [], []
+    for name, default_year in TIME_BINS:
+        r = by_bin.get(name)
+        year = r["year"] if r and r["year"] is not None else default_year
+        labels.append(f"{name} ({year})")
+        values.append(round(r["value"], 2) if r else 0.0)
+        years.append(year)
+    abs_values = [abs(v) for v in values]
+    return labels, values, abs_values, {"ylabel": f"Median ({unit})", "years": years}
+
+def _data_hash(rows):
+    return hashlib.sha256(json.dumps(rows, sort_keys=True).encode()).hexdigest() if rows else None
 
-# --- INTERPRETATION LOGIC ---
+# --- INTERPRETATION LOGIC (fallback: fixed scores per topic) ---
 def interpret_generic_file(text, topic_name):
     paragraphs = re.findall(r"Paragraph \d+ \((.*?)\):", text)
     if len(paragraphs) >= 3:
@@ -49,61 +99,185 @@ def interpret_generic_file(text, topic_name):
     abs_values = [abs(v) for v in values]
     return labels, values, abs_values
 
+# --- CHART PAGES (page 1 = bar, 2 = pie, 3 = line) ---
+def bar_chart(topic_name, labels, values, abs_values, ylabel="Impact Score", years=None):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    bars = ax.bar(labels, values)
+    for bar, value in zip(bars, values):
+        bar.set_color('green' if value > 0 else 'red' if value < 0 else 'gray')
+        y_offset = -0.1 if value < 0 else 0.1
+        ax.text(bar.get_x() + bar.get_width() / 2, value + y_offset,
+                f"{value}", ha='center', va='bottom' if value < 0 else 'top')
+    ax.set_title(f"{topic_name} Impact Interpretation (Bar Chart)")
+    ax.set_ylabel(ylabel)
+    ax.axhline(0, color='black')
+    ax.grid(axis='y', linestyle='--', alpha=0.6)
+    fig.tight_layout()
+    return fig
+
+def pie_chart(topic_name, labels, values, abs_values, ylabel=None, years=None):
+    fig = Figure(figsize=(7, 7))
+    ax = fig.add_subplot()
+    pie_labels = [f"{label}: {abs(val)}" for label, val in zip(labels, values)]
+    colors = ['blue', 'gray', 'orange']
+    if sum(abs_values):
+        ax.pie(abs_values, labels=pie_labels, autopct='%1.1f%%', startangle=140, colors=colors[:len(labels)])
+    else:   # nothing to share out (e.g. no figures found in the story)
+        ax.text(0.5, 0.5, "No impact figures found", ha='center', va='center')
+        ax.set_axis_off()
+    ax.set_title(f"{topic_name} Share of Impact (Pie Chart)")
+    fig.tight_layout()
+    return fig
+
+def line_chart(topic_name, labels, values, abs_values, ylabel="Impact Score", years=None):
+    years = years or list(range(2020, 2020 + 4 * len(values), 4))
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.plot(years, values, marker='o', linestyle='-', color='black')
+    for x, y, label in zip(years, values, labels):
+        ax.text(x, y + 0.05, f"{label}\n{y}", ha='center', va='bottom', fontsize=9)
+    ax.set_title(f"{topic_name} Timeline of Impact (Line Chart)")
+    ax.set_xlabel("Year")
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    fig.tight_layout()
+    return fig
+
+CHART_PAGES = [bar_chart, pie_chart, line_chart]
+
+def topic_figures(path, rows=None):
+    """Figures for one story file: from its chart_data rows, else from the text."""
+    topic_name = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+    if rows:
+        *chart_data, options = chart_values(topic_name, rows)
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+        chart_data, options = interpret_generic_file(text, topic_name), {}
+    return topic_name, [page(topic_name, *chart_data, **options) for page in CHART_PAGES]
+
 # --- PDF CHART EXPORT ---
-def generate_individual_pdfs(file_paths, output_dir):
+def generate_individual_pdfs(file_paths, output_dir, chart_data=CHART_DATA):
+    data = load_chart_data(chart_data)
     for path in file_paths:
-        topic_name = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+        topic_name, figures = topic_figures(path, data.get(story_topic(path)))
         output_pdf = os.path.join(output_dir, f"{topic_name}_charts.pdf")
+        with PdfPages(output_pdf) as pdf:
+            for fig in figures:
+                pdf.savefig(fig)
 
-        with open(path, "r") as file:
-            text = file.read()
+# --- PNG CHART BUILD (what the web app serves) ---
+# static/charts/story_<Topic_Name>_charts_page_N.png straight from the chart
+# data (optionally plus the PDF), read once for all topics, which are spread
+# over a process pool; topics whose story text and chart data haven't
+# changed are skipped.
+BUILD_MANIFEST = ".build_manifest.json"
+PNG_DPI = 150          # same resolution the PDF → PNG rasterisation used
 
-        labels, values, abs_values = interpret_generic_file(text, topic_name)
+def chart_base(path):
+    """data/story_Economic Recovery.txt → story_Economic_Recovery_charts"""
+    return os.path.splitext(os.path.basename(path))[0].replace(" ", "_") + "_charts"
 
-        with PdfPages(output_pdf) as pdf:
-            # Bar Chart
-            plt.figure(figsize=(10, 6))
-            bars = plt.bar(labels, values)
-            for bar, value in zip(bars, values):
-                bar.set_color('green' if value > 0 else 'red' if value < 0 else 'gray')
-                y_offset = -0.1 if value < 0 else 0.1
-                plt.text(bar.get_x() + bar.get_width() / 2, value + y_offset,
-                         f"{value}", ha='center', va='bottom' if value < 0 else 'top')
-            plt.title(f"{topic_name} Impact Interpretation (Bar Chart)")
-            plt.ylabel("Impact Score")
-            plt.axhline(0, color='black')
-            plt.grid(axis='y', linestyle='--', alpha=0.6)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
-
-            # Pie Chart
-            plt.figure(figsize=(7, 7))
-            pie_labels = [f"{label}: {abs(val)}" for label, val in zip(labels, values)]
-            colors = ['blue', 'gray', 'orange']
-            plt.pie(abs_values, labels=pie_labels, autopct='%1.1f%%', startangle=140, colors=colors[:len(labels)])
-            plt.title(f"{topic_name} Share of Impact (Pie Chart)")
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
-
-            # Line Chart
-            years = list(range(2020, 2020 + 4 * len(values), 4))
-            plt.figure(figsize=(10, 6))
-            plt.plot(years, values, marker='o', linestyle='-', color='black')
-            for x, y, label in zip(years, values, labels):
-                plt.text(x, y + 0.05, f"{label}\n{y}", ha='center', va='bottom', fontsize=9)
-            plt.title(f"{topic_name} Timeline of Impact (Line Chart)")
-            plt.xlabel("Year")
-            plt.ylabel("Impact Score")
-            plt.grid(True)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+def render_topic(path, output_dir, pdf=False, rows=None):
+    """Write one topic's PNG pages (and PDF). Returns the file names written."""
+    _, figures = topic_figures(path, rows)
+    base = chart_base(path)
+    written = []
+    for n, fig in enumerate(figures, 1):
+        name = f"{base}_page_{n}.png"
+        fig.savefig(os.path.join(output_dir, name), dpi=PNG_DPI)
+        written.append(name)
+    if pdf:
+        with PdfPages(os.path.join(output_dir, f"{base}.pdf")) as doc:
+            for fig in figures:
+                doc.savefig(fig)
+        written.append(f"{base}.pdf")
+    return written
+
+def _source_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def build_charts(file_paths, output_dir, workers=1, pdf=False, force=False,
+                 chart_data=CHART_DATA):
+    os.makedirs(output_dir, exist_ok=True)
+    data = load_chart_data(chart_data)
+    manifest_path = os.path.join(output_dir, BUILD_MANIFEST)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    todo, skipped = [], []
+    for path in sorted(file_paths):
+        base = chart_base(path)
+        pages = [os.path.join(output_dir, f"{base}_page_{n}.png")
+                 for n in range(1, len(CHART_PAGES) + 1)]
+        if pdf:
+            pages.append(os.path.join(output_dir, f"{base}.pdf"))
+        entry = manifest.get(base, {})
+        if not force and entry.get("sha256") == _source_hash(path) \
+                and entry.get("data") == _data_hash(data.get(story_topic(path))) \
+                and all(os.path.exists(p) for p in pages):
+            skipped.append(base)
+        else:
+            todo.append(path)
+
+    rows = [data.get(story_topic(path)) for path in todo]
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_topic, todo, [output_dir] * len(todo),
+                                    [pdf] * len(todo), rows))
+    else:
+        results = [render_topic(path, output_dir, pdf, r) for path, r in zip(todo, rows)]
+
+    for path, r in zip(todo, rows):
+        manifest[chart_base(path)] = {"source": os.path.basename(path),
+                                      "sha256": _source_hash(path), "data": _data_hash(r)}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    if pdf and todo:
+        # the PNGs already match the new PDFs – tell the app's chart cache
+        # so it doesn't rasterise them a second time
+        import chart_cache
+        cache = chart_cache.load_manifest(output_dir)
+        for path in todo:
+            chart_cache.record(cache, output_dir, f"{chart_base(path)}.pdf", len(CHART_PAGES))
+        chart_cache.save_manifest(cache, output_dir)
+
+    return {"rendered": [chart_base(p) for p in todo], "skipped": skipped,
+            "from_data": [chart_base(p) for p, r in zip(todo, rows) if r],
+            "files": sum(len(r) for r in results)}
 
 # --- RUN ---
 if __name__ == "__main__":
-    input_dir = "./out"
-    file_paths = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".txt")]
-    generate_individual_pdfs(file_paths, input_dir)
-    print("✅ All chart PDFs generated in ./out/")
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        ap = argparse.ArgumentParser(prog="visulazation.py build",
+                                     description="render story charts straight to PNG")
+        ap.add_argument("--src", default="data", help="folder with story_*.txt")
+        ap.add_argument("--out", default=os.path.join("static", "charts"))
+        ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        ap.add_argument("--pdf", action="store_true", help="also write *_charts.pdf")
+        ap.add_argument("--force", action="store_true", help="ignore the build manifest")
+        ap.add_argument("--data", default=CHART_DATA,
+                        help="chart_data.parquet from 'python story.py facts'")
+        args = ap.parse_args(sys.argv[2:])
+        sources = [os.path.join(args.src, f) for f in os.listdir(args.src)
+                   if f.startswith("story_") and f.endswith(".txt")]
+        rep = build_charts(sources, args.out, args.workers, args.pdf, args.force, args.data)
+        print(f"✅ charts: {len(rep['rendered'])} topic(s) rendered ({rep['files']} files, "
+              f"{len(rep['from_data'])} from chart data), "
+              f"{len(rep['skipped'])} unchanged → {args.out}")
+        # thumbnails + .gz/.br copies the web app serves (see http_cache.py)
+        import http_cache
+        assets = http_cache.build_assets(os.path.dirname(args.out) or ".", args.out, args.force)
+        print(f"✅ assets: {len(assets['thumbs'])} thumbnails, "
+              f"{len(assets['compressed'])} compressed files written")
+    else:
+        input_dir = "./out"
+        file_paths = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".txt")]
+        generate_individual_pdfs(file_paths, input_dir)
+        print("✅ All chart PDFs generated in ./out/")